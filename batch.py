@@ -0,0 +1,464 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from datetime import datetime
+from scrape import (
+    scrape_many,
+    read_url_list,
+    normalize_url,
+    clean_text_content,
+    split_content,
+    configure_session,
+    SESSION_CONFIG
+)
+from parser import (
+    parse_with_gemini_structured,
+    parse_with_gemini_map_reduce,
+    parse_documents_packed,
+    try_local_extraction,
+    PACK_TOKEN_BUDGET,
+    PACK_MAX_DOCUMENTS
+)
+from chunking import estimate_tokens
+from dedup import DuplicateIndex
+from json_output import check_json
+from metrics import get_metrics, observe
+from routing import get_route_stats
+from result_store import ResultStore, LIST_FIELDS
+
+ERROR_PREFIX = "Error occurred while parsing:"
+
+# Output files with these extensions are written to a ResultStore instead of JSONL
+STORE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+def load_checkpoint(output_path, retry_failed=False):
+    """
+    Read an existing results file and return the URLs that need no more work
+    
+    Args:
+        output_path (str): JSONL results file written by a previous run
+        retry_failed (bool): Treat failed URLs as not done so they are retried
+    
+    Returns:
+        set: Normalized URLs already processed
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash; that URL will be processed again
+                continue
+            if record.get('status') == 'ok' or not retry_failed:
+                done.add(normalize_url(record['url']))
+    return done
+
+def prepare_page(text, headings=None, parse_description=None, output_format="text"):
+    """
+    Clean and chunk page text and try local extraction: the CPU-bound part of
+    process_page, which run_job runs in worker processes when cpu_workers is set
+    
+    Only the text and headings go to the worker and only the chunks come back,
+    not the whole scraped page or the cleaned text.
+    
+    Args:
+        text (str): Raw page text
+        headings (list): Heading texts to prefer as chunk starts
+        parse_description (str): Request to try local extractors on; None to skip
+        output_format (str): Output format of a local result
+    
+    Returns:
+        tuple: (cleaned text length, content chunks, local result or None,
+            seconds spent per metrics stage)
+    """
+    timings = {}
+    started = time.perf_counter()
+    text_content = clean_text_content(text)
+    timings['clean'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    content_chunks = split_content(text_content, headings=headings)
+    timings['chunk'] = time.perf_counter() - started
+    
+    local_result = None
+    if parse_description:
+        local_result = try_local_extraction(content_chunks, parse_description, output_format)
+    return len(text_content), content_chunks, local_result, timings
+
+def prepare_streamed_page(scraped_data, parse_description=None, output_format="text"):
+    """
+    Take the chunks off a page scraped with return_format 'chunks', which was
+    cleaned and chunked while it downloaded, and try local extraction
+    
+    Returns:
+        tuple: Same as prepare_page
+    """
+    content_chunks = scraped_data.pop('chunks')
+    local_result = None
+    if parse_description:
+        local_result = try_local_extraction(content_chunks, parse_description, output_format)
+    return scraped_data['text_stats']['characters'], content_chunks, local_result, {}
+
+def process_page(url, scraped_data, spec, dedup_index=None, prepared=None):
+    """
+    Clean, chunk and parse one scraped page
+    
+    Args:
+        url (str): Page URL
+        scraped_data (dict): Output of extract_content_from_json
+        spec (dict): Extraction spec with description, output_format, mode
+            ("structured", "map_reduce" or "packed") and optional token_budget,
+            backend ("serper" or "local"), stream (clean and chunk pages while
+            they download, see scrape.stream_chunks) and schema (a JSON
+            Schema the json output must follow)
+        dedup_index (DuplicateIndex): Index of pages and chunks already parsed
+            in this job, whose results are reused for duplicates
+        prepared (tuple): Output of prepare_page if the page was already
+            cleaned and chunked (and local extraction tried) elsewhere
+    
+    Returns:
+        dict: Result record
+    """
+    started = time.time()
+    if prepared is None:
+        text_content = clean_text_content(scraped_data.get('text', ''))
+        content_chunks = split_content(text_content, headings=scraped_data.get('headings'))
+        text_length, local_result, allow_local = len(text_content), None, True
+    else:
+        text_length, content_chunks, local_result = prepared[:3]
+        allow_local = False
+    
+    if local_result is not None:
+        result = local_result
+    elif spec.get('mode') == 'map_reduce':
+        result = parse_with_gemini_map_reduce(
+            content_chunks,
+            spec['description'],
+            output_format=spec['output_format'],
+            token_budget=spec.get('token_budget'),
+            allow_local=allow_local,
+            dedup_index=dedup_index,
+            schema=spec.get('schema')
+        )
+    else:
+        result = parse_with_gemini_structured(
+            content_chunks,
+            spec['description'],
+            output_format=spec['output_format'],
+            token_budget=spec.get('token_budget'),
+            allow_local=allow_local,
+            dedup_index=dedup_index,
+            schema=spec.get('schema')
+        )
+    
+    return _page_record(url, scraped_data, spec, text_length, content_chunks, result, started)
+
+def _page_record(url, scraped_data, spec, text_length, content_chunks, result, started):
+    failed = result.startswith(ERROR_PREFIX)
+    record = {
+        'url': url,
+        'status': 'parse_failed' if failed else 'ok',
+        'title': scraped_data.get('title', ''),
+        'text_length': text_length,
+        'chunks': len(content_chunks),
+        'parse_description': spec['description'],
+        'output_format': spec['output_format'],
+        'result': result,
+        'elapsed': round(time.time() - started, 3),
+        'processed_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    for name in LIST_FIELDS:
+        record[name] = scraped_data.get(name) or []
+    if spec.get('schema') and not failed:
+        record['schema_errors'] = check_json(result, spec['schema'])[1]
+    return record
+
+def process_pages_packed(pages, spec, dedup_index=None, prepared=None):
+    """
+    Clean and chunk several scraped pages and parse the small ones together
+    in shared prompts (see parser.parse_documents_packed)
+    
+    Args:
+        pages (list): (url, scraped_data) pairs
+        spec (dict): Extraction spec, see process_page
+        dedup_index (DuplicateIndex): Index of pages already parsed in this job
+        prepared (list): Output of prepare_page for each page, if the pages
+            were already cleaned and chunked elsewhere
+    
+    Returns:
+        list: Result records, one per page
+    """
+    started = time.time()
+    allow_local = prepared is None
+    if prepared is None:
+        prepared = []
+        for _, scraped_data in pages:
+            text_content = clean_text_content(scraped_data.get('text', ''))
+            content_chunks = split_content(text_content, headings=scraped_data.get('headings'))
+            prepared.append((len(text_content), content_chunks, None))
+    
+    # Pages already answered by local extraction need no prompt
+    results = {url: page[2] for (url, _), page in zip(pages, prepared) if page[2] is not None}
+    documents = [(url, page[1]) for (url, _), page in zip(pages, prepared) if url not in results]
+    if documents:
+        results.update(parse_documents_packed(
+            documents,
+            spec['description'],
+            output_format=spec['output_format'],
+            allow_local=allow_local,
+            max_workers=1,
+            dedup_index=dedup_index
+        ))
+    return [
+        _page_record(url, scraped_data, spec, page[0], page[1], results[url], started)
+        for (url, scraped_data), page in zip(pages, prepared)
+    ]
+
+def run_job(url_file, output_path, spec, scrape_workers=8, per_host_limit=2, parse_workers=4, retry_failed=False, dedup=True, cpu_workers=0):
+    """
+    Run scrape -> clean -> chunk -> parse over a URL list, appending one JSON
+    line per URL to `output_path` as soon as it finishes
+    
+    The results file doubles as the checkpoint: rerunning the same job skips
+    every URL already recorded, so a crashed run resumes where it stopped.
+    An output path ending in .db, .sqlite or .sqlite3 is a ResultStore
+    instead, which also keeps each page's link, image and heading lists and
+    only skips URLs already done for the same extraction request and schema.
+    
+    Args:
+        url_file (str): Text file with one URL per line
+        output_path (str): JSONL file or result store to append results to
+        spec (dict): Extraction spec, see process_page
+        scrape_workers (int): Concurrent scrape requests
+        per_host_limit (int): Concurrent scrape requests per host
+        parse_workers (int): Pages cleaned, chunked and parsed at once
+        retry_failed (bool): Process URLs that failed in a previous run again
+        dedup (bool): Reuse results for pages and chunks that duplicate ones
+            already parsed in this run instead of sending them to Gemini
+        cpu_workers (int): Worker processes for cleaning, chunking and local
+            extraction (see prepare_page); 0 runs them in the parse threads
+    
+    Each stage holds at most twice its worker count of pages in flight; when
+    a stage is full, the stage before it waits, down to scraping, which
+    stops pulling new URLs.
+    
+    With mode "packed", scraped pages are buffered until about
+    PACK_TOKEN_BUDGET tokens or PACK_MAX_DOCUMENTS pages are waiting, and
+    each buffer is parsed as one unit by process_pages_packed. A schema in
+    the spec turns packing off, since each page must be validated alone.
+    
+    With "stream" set in the spec, the scrape threads clean and chunk each
+    page while it downloads (see scrape.stream_chunks), so neither the raw
+    page nor its full text is kept and cpu_workers is not used.
+    
+    Returns:
+        dict: Counts of ok, failed and skipped URLs, and of results reused
+            for duplicates
+    """
+    use_store = output_path.endswith(STORE_EXTENSIONS)
+    if use_store:
+        output = ResultStore(output_path)
+        done = output.done_urls(spec['description'], spec['output_format'], retry_failed, spec.get('schema'))
+    else:
+        done = load_checkpoint(output_path, retry_failed)
+    counts = {'ok': 0, 'failed': 0, 'skipped': 0, 'reused': 0}
+    dedup_index = DuplicateIndex() if dedup else None
+    
+    def pending_urls():
+        for url in read_url_list(url_file):
+            if normalize_url(url) in done:
+                counts['skipped'] += 1
+            else:
+                yield url
+    
+    # Start on a fresh line if the previous run died mid-write
+    if not use_store and os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+        if needs_newline:
+            with open(output_path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+    
+    configure_session(pool_size=max(scrape_workers, SESSION_CONFIG['pool_size']))
+    
+    if not use_store:
+        output = open(output_path, 'a', encoding='utf-8')
+    cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers) if cpu_workers and not spec.get('stream') else None
+    
+    with output, ThreadPoolExecutor(max_workers=parse_workers) as pool, cpu_pool or nullcontext():
+        def write(record):
+            counts['ok' if record['status'] == 'ok' else 'failed'] += 1
+            if use_store:
+                output.add(record, spec['description'], spec['output_format'], spec.get('schema'))
+                return
+            record = {name: value for name, value in record.items() if name not in LIST_FIELDS}
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output.flush()
+        
+        def collect(futures, block_until):
+            # Write finished pages; block while more than `block_until` are in flight
+            while futures:
+                finished, _ = wait(futures, timeout=None if len(futures) > block_until else 0, return_when=FIRST_COMPLETED)
+                if not finished:
+                    return
+                for future in finished:
+                    futures.remove(future)
+                    urls = futures_urls.pop(future)
+                    try:
+                        records = future.result()
+                        for record in records if isinstance(records, list) else [records]:
+                            write(record)
+                    except Exception as e:
+                        for url in urls:
+                            write({'url': url, 'status': 'parse_failed', 'error': str(e)})
+        
+        def submit(fn, urls, *args):
+            future = pool.submit(fn, *args)
+            futures.add(future)
+            futures_urls[future] = urls
+            # Backpressure: stop pulling scrape results while the parse stage is full
+            collect(futures, block_until=parse_workers * 2)
+        
+        def prepare(url, scraped_data):
+            future = cpu_pool.submit(
+                prepare_page, scraped_data.get('text', ''), scraped_data.get('headings'), description, spec['output_format']
+            )
+            preparing[future] = (url, scraped_data)
+            collect_prepared(block_until=cpu_workers * 2)
+        
+        def collect_prepared(block_until):
+            # Hand cleaned and chunked pages on to the parse stage
+            while preparing:
+                finished, _ = wait(preparing, timeout=None if len(preparing) > block_until else 0, return_when=FIRST_COMPLETED)
+                if not finished:
+                    return
+                for future in finished:
+                    url, scraped_data = preparing.pop(future)
+                    try:
+                        prepared = future.result()
+                    except Exception as e:
+                        write({'url': url, 'status': 'parse_failed', 'error': str(e)})
+                        continue
+                    # The worker's own metrics stay in its process
+                    for stage, seconds in prepared[3].items():
+                        observe(stage, seconds)
+                    parse(url, scraped_data, prepared)
+        
+        def parse(url, scraped_data, prepared=None):
+            nonlocal pack_buffer, pack_prepared, pack_tokens
+            if not packed:
+                submit(process_page, [url], url, scraped_data, spec, dedup_index, prepared)
+                return
+            pack_buffer.append((url, scraped_data))
+            pack_prepared.append(prepared)
+            if prepared is None:
+                pack_tokens += estimate_tokens(scraped_data.get('text', ''))
+            else:
+                pack_tokens += sum(estimate_tokens(chunk) for chunk in prepared[1])
+            if pack_tokens >= PACK_TOKEN_BUDGET or len(pack_buffer) >= PACK_MAX_DOCUMENTS:
+                flush_pack()
+        
+        def flush_pack():
+            nonlocal pack_buffer, pack_prepared, pack_tokens
+            if pack_buffer:
+                submit(process_pages_packed, [u for u, _ in pack_buffer], pack_buffer, spec, dedup_index,
+                       pack_prepared if cpu_pool is not None or streamed else None)
+            pack_buffer, pack_prepared, pack_tokens = [], [], 0
+        
+        futures = set()
+        futures_urls = {}
+        preparing = {}
+        # Local extractors know nothing about the caller's schema
+        description = None if spec.get('schema') else spec['description']
+        packed = spec.get('mode') == 'packed' and not spec.get('schema')
+        streamed = bool(spec.get('stream'))
+        pack_buffer = []
+        pack_prepared = []
+        pack_tokens = 0
+        for url, scraped_data in scrape_many(
+            pending_urls(),
+            return_format='chunks' if streamed else 'json',
+            max_workers=scrape_workers,
+            per_host_limit=per_host_limit,
+            backend=spec.get('backend')
+        ):
+            if scraped_data is None:
+                write({'url': url, 'status': 'scrape_failed'})
+            elif streamed:
+                parse(url, scraped_data, prepare_streamed_page(scraped_data, description, spec['output_format']))
+            elif cpu_pool is not None:
+                prepare(url, scraped_data)
+            else:
+                parse(url, scraped_data)
+            
+        collect_prepared(block_until=0)
+        flush_pack()
+        collect(futures, block_until=0)
+    
+    if dedup_index is not None:
+        dedup_stats = dedup_index.stats()
+        counts['reused'] = dedup_stats['exact_hits'] + dedup_stats['near_hits']
+    return counts
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Scrape a list of URLs and extract information from each with Gemini")
+    arg_parser.add_argument("url_file", help="Text file with one URL per line")
+    arg_parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL results file, or a .db result store (also used to resume)")
+    arg_parser.add_argument("-s", "--spec", help="JSON file with description, output_format, mode, token_budget and schema")
+    arg_parser.add_argument("-d", "--description", help="What to extract from each page")
+    arg_parser.add_argument("-f", "--format", choices=["text", "json", "markdown", "list"], help="Output format (default: json)")
+    arg_parser.add_argument("-m", "--mode", choices=["structured", "map_reduce", "packed"], help="Single prompt, per-chunk parsing, or small pages packed into shared prompts (default: structured)")
+    arg_parser.add_argument("--token-budget", type=int, help="Send only the most relevant chunks up to this many tokens")
+    arg_parser.add_argument("-b", "--backend", choices=["serper", "local"], help="Serper API or direct download (default: SCRAPE_BACKEND)")
+    arg_parser.add_argument("--scrape-workers", type=int, default=8, help="Concurrent scrape requests")
+    arg_parser.add_argument("--per-host", type=int, default=2, help="Concurrent scrape requests per host")
+    arg_parser.add_argument("--parse-workers", type=int, default=4, help="Pages parsed at once")
+    arg_parser.add_argument("--stream", action="store_true", default=None, help="Clean and chunk pages while they download instead of after (lower memory on large pages)")
+    arg_parser.add_argument("--cpu-workers", type=int, default=0, help="Worker processes for cleaning and chunking (default: run them in the parse threads)")
+    arg_parser.add_argument("--retry-failed", action="store_true", help="Retry URLs that failed in a previous run")
+    arg_parser.add_argument("--no-dedup", action="store_true", help="Send duplicate pages and chunks to Gemini again")
+    arg_parser.add_argument("--metrics", help="Write stage timings and counters here when done (.prom for Prometheus text, otherwise JSON)")
+    args = arg_parser.parse_args()
+    
+    spec = {'output_format': 'json', 'mode': 'structured'}
+    if args.spec:
+        with open(args.spec, 'r', encoding='utf-8') as f:
+            spec.update(json.load(f))
+    for key, value in (('description', args.description), ('output_format', args.format),
+                       ('mode', args.mode), ('token_budget', args.token_budget),
+                       ('backend', args.backend), ('stream', args.stream)):
+        if value is not None:
+            spec[key] = value
+    if not spec.get('description'):
+        arg_parser.error("an extraction description is required (--description or a spec file)")
+    
+    counts = run_job(
+        args.url_file,
+        args.output,
+        spec,
+        scrape_workers=args.scrape_workers,
+        per_host_limit=args.per_host,
+        parse_workers=args.parse_workers,
+        retry_failed=args.retry_failed,
+        dedup=not args.no_dedup,
+        cpu_workers=args.cpu_workers
+    )
+    print(f"Done: {counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} already done. Results in {args.output}")
+    if counts['reused']:
+        print(f"Reused results for {counts['reused']} duplicate pages or chunks")
+    for route, entry in get_route_stats().snapshot().items():
+        print(f"Route {route} ({entry['model']}): {entry['calls']} calls, {entry['mean_ms']:.0f} ms mean, "
+              f"{entry['p95_ms']:.0f} ms p95, ~${entry['cost_usd']:.4f}, {entry['escalations']} hit the output cap")
+    if args.metrics:
+        metrics = get_metrics()
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(metrics.to_prometheus() if args.metrics.endswith('.prom') else metrics.to_json())
+        print(f"Metrics written to {args.metrics}")
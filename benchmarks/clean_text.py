@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for text cleaning
+
+Compares the single-pass cleaning.clean_text with the previous approach
+(strip every line twice, join, then split the whole text again to count
+words) on synthetic page text, and times scrape.clean_text_content, the
+entry point the scrape and batch flows use.
+    
+    python -m benchmarks.clean_text --size 20 --repeat 5
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from cleaning import clean_text
+from scrape import clean_text_content
+
+_WORDS = (
+    "the of and to in a is for on with product price contact email support "
+    "shipping returns $19.99 info@example.com +1 555 010 2030 pricing plans"
+).split()
+
+_CHROME = ["Skip to content", "Accept all cookies", "Back to top", "Share on Facebook"]
+
+def make_page_text(size_mb, seed=0):
+    """
+    Build roughly `size_mb` megabytes of page-like text: indented lines,
+    blank lines, runs of spaces and tabs, non-breaking spaces and
+    boilerplate lines
+    """
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < size_mb * 1_000_000:
+        kind = rng.random()
+        if kind < 0.15:
+            line = ''
+        elif kind < 0.2:
+            line = rng.choice(_CHROME)
+        else:
+            words = [rng.choice(_WORDS) for _ in range(rng.randint(1, 25))]
+            line = ' ' * rng.randint(0, 12) + ' '.join(words)
+            if kind > 0.9:
+                line = line.replace(' ', '\t', 2).replace(' ', '\u00a0', 1) + '   '
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)
+
+def legacy_clean(text):
+    cleaned_lines = [line.strip() for line in text.split('\n') if line.strip()]
+    cleaned = '\n'.join(cleaned_lines)
+    return cleaned, {'characters': len(cleaned), 'words': len(cleaned.split())}
+
+def measure(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - started)
+    
+    tracemalloc.start()
+    fn(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark text cleaning")
+    arg_parser.add_argument("--size", type=float, default=10, help="Input size in MB")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Timed runs per variant (best is reported)")
+    args = arg_parser.parse_args()
+    
+    text = make_page_text(args.size)
+    print(f"Input: {len(text) / 1e6:.1f} MB, {text.count(chr(10)) + 1:,} lines")
+    
+    variants = (
+        ("legacy strip/join + split()", legacy_clean),
+        ("clean_text", clean_text),
+        ("clean_text, keep boilerplate", lambda text: clean_text(text, remove_boilerplate=False)),
+        ("clean_text_content", lambda text: (clean_text_content(text), None)),
+    )
+    for name, fn in variants:
+        best, peak = measure(fn, text, args.repeat)
+        stats = fn(text)[1]
+        words = f"  words {stats['words']:,}" if stats else ""
+        print(f"{name:30} {best * 1000:8.1f} ms  {len(text) / 1e6 / best:7.1f} MB/s  "
+              f"peak {peak / 1e6:6.1f} MB{words}")
@@ -0,0 +1,176 @@
+"""
+Local stand-ins for the Serper API and Gemini, so benchmarks run offline
+and reproducibly
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from gemini_client import FakeModel, register_model
+from routing import routed_models
+from benchmarks.clean_text import make_page_text
+
+class FakeSerperServer:
+    """
+    HTTP server answering like the Serper scrape API
+    
+    POST requests get a Serper-style JSON response for the requested URL and
+    GET requests an HTML page, so both scrape backends can be benchmarked.
+    Page text is generated from the URL, so it differs between URLs and is
+    the same on every run.
+    
+    Args:
+        latency (float): Seconds each request takes
+        error_rate (float): Fraction of requests answered with a 503
+        page_kb (float): Approximate page text size in kilobytes
+        seed (int): Seed for the error decisions and page text
+    """
+    
+    def __init__(self, latency=0.05, error_rate=0.0, page_kb=20, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_kb = page_kb
+        self.seed = seed
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def page(self, url):
+        """
+        Return the Serper-style response for a URL
+        """
+        seed = zlib.crc32(f"{self.seed}:{url}".encode('utf-8'))
+        text = f"Page {url}\n" + make_page_text(self.page_kb / 1000, seed=seed)
+        return {
+            'url': url,
+            'title': f"Page {url}",
+            'text': text,
+            'links': [f"{url}/link-{i}" for i in range(20)],
+            'images': [f"{url}/image-{i}.png" for i in range(5)],
+            'headings': [line for line in text.splitlines()[:200] if 0 < len(line) < 40][:10],
+            'meta': {'description': f"Description of {url}"},
+        }
+    
+    def _next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self._random.random() < self.error_rate
+    
+    def _make_handler(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _answer(self, url, render):
+                fail = fake._next_request()
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fail:
+                    self._reply(503, b'{"message": "Fake overload"}', 'application/json')
+                else:
+                    self._reply(200, *render(fake.page(url)))
+            
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                self._answer(body.get('url', ''), lambda page: (json.dumps(page).encode('utf-8'), 'application/json'))
+            
+            def do_GET(self):
+                def render(page):
+                    paragraphs = ''.join(f"<p>{line}</p>\n" for line in page['text'].splitlines() if line)
+                    links = ''.join(f'<a href="{link}">{link}</a>\n' for link in page['links'])
+                    html = f"<html><head><title>{page['title']}</title></head><body>{paragraphs}{links}</body></html>"
+                    return html.encode('utf-8'), 'text/html; charset=utf-8'
+                self._answer(fake.url + self.path, render)
+            
+            def log_message(self, *args):
+                pass
+        
+        return Handler
+    
+    def start(self):
+        """
+        Start serving on a free local port in a background thread
+        """
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        """
+        Shut the server down
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+def sized_responder(response_words=200):
+    """
+    Return a FakeModel responder producing about `response_words` words,
+    as a JSON object when the prompt asks for JSON
+    """
+    def respond_one(prompt):
+        if "OUTPUT FORMAT: JSON" in prompt:
+            items = [{'name': f"item {i}", 'price': round(i * 1.5, 2)} for i in range(max(1, response_words // 4))]
+            return {'items': items}
+        return ' '.join(f"word{i % 50}" for i in range(response_words))
+    
+    def respond(prompt):
+        # Packed prompts (parser.parse_documents_packed) get one result per document
+        documents = prompt.count("=== END DOCUMENT ")
+        # Several questions about one page (parser.DocumentContext.ask_many)
+        questions = re.search(r"USER REQUESTS \((\d+)\)", prompt)
+        if questions:
+            documents = int(questions.group(1))
+        if documents:
+            return json.dumps({str(i): respond_one(prompt) for i in range(1, documents + 1)})
+        result = respond_one(prompt)
+        return result if isinstance(result, str) else json.dumps(result)
+    return respond
+
+def install_fake_gemini(latency=0.2, error_rate=0.0, response_words=200, seed=0):
+    """
+    Route every Gemini call in this process to a FakeModel, whichever model
+    the routing policy picks
+    
+    Returns:
+        FakeModel: The installed model; its `calls` attribute counts requests
+    """
+    model = FakeModel(responder=sized_responder(response_words), latency=latency, error_rate=error_rate, seed=seed)
+    for model_name in routed_models():
+        register_model(model_name, model)
+    return model
+
+def percentile(values, pct):
+    """
+    Return the pct-th percentile of values (nearest rank), 0.0 if empty
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
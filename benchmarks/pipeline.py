@@ -0,0 +1,138 @@
+"""
+End-to-end benchmark of the scrape -> clean -> chunk -> parse pipeline
+
+Runs against a local fake Serper server and a fake Gemini model (see
+benchmarks.fakes), so results are reproducible offline. Reports throughput,
+p50/p99 latency, peak Python heap (tracemalloc) and time per pipeline stage.
+    
+    python -m benchmarks.pipeline --flow single --urls 20
+    python -m benchmarks.pipeline --flow batch --urls 200 --model-latency 0.5 --error-rate 0.02
+    python -m benchmarks.pipeline --flow batch --urls 200 --page-kb 2 --mode packed
+    python -m benchmarks.pipeline --flow batch --urls 100 --page-kb 500 --model-latency 0.05 --cpu-workers 4
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+import scrape
+import parser
+import batch
+from cleaning import clean_text
+from metrics import get_metrics
+from routing import get_route_stats
+from benchmarks.fakes import FakeSerperServer, install_fake_gemini, percentile
+
+def run_single(urls, spec):
+    """
+    Process URLs one after another the way the web app does
+    
+    Returns:
+        tuple: (per-URL latencies in seconds, number of failed URLs)
+    """
+    latencies = []
+    failed = 0
+    for url in urls:
+        started = time.perf_counter()
+        scraped_data = scrape.scrape_and_process(url, backend=spec.get('backend'))
+        if scraped_data:
+            text_content, _ = clean_text(scraped_data.get('text', ''))
+            content_chunks = scrape.split_content(text_content, headings=scraped_data.get('headings'))
+            result = parser.parse_with_gemini_structured(
+                content_chunks,
+                spec['description'],
+                output_format=spec['output_format'],
+                allow_local=False
+            )
+        if not scraped_data or result.startswith(batch.ERROR_PREFIX):
+            failed += 1
+        latencies.append(time.perf_counter() - started)
+    return latencies, failed
+
+def run_batch(urls, spec, workers, dedup, cpu_workers=0):
+    """
+    Process URLs with batch.run_job
+    
+    Returns:
+        tuple: (per-URL parse latencies in seconds, number of failed URLs)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        url_file = os.path.join(tmp, 'urls.txt')
+        output_path = os.path.join(tmp, 'results.jsonl')
+        with open(url_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(urls))
+        counts = batch.run_job(
+            url_file, output_path, spec,
+            scrape_workers=workers, per_host_limit=workers, parse_workers=workers, dedup=dedup, cpu_workers=cpu_workers
+        )
+        with open(output_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    return [record['elapsed'] for record in records if 'elapsed' in record], counts['failed']
+
+def report(name, elapsed, latencies, failed, total, peak, snapshot, routes):
+    print(f"\n{name}: {total} URLs in {elapsed:.2f}s, {total / elapsed:.1f} URLs/s, {failed} failed")
+    print(f"  latency p50 {percentile(latencies, 50) * 1000:.0f} ms  p99 {percentile(latencies, 99) * 1000:.0f} ms"
+          f"  max {max(latencies, default=0) * 1000:.0f} ms")
+    print(f"  peak Python heap {peak / 1e6:.1f} MB")
+    for stage, entry in snapshot['stages'].items():
+        print(f"  {stage:8} {entry['count']:6} runs  {entry['total_ms']:10.1f} ms total  {entry['mean_ms']:8.2f} ms mean")
+    counters = snapshot['counters']
+    print(f"  {counters.get('bytes_fetched', 0) / 1e6:.1f} MB fetched, {counters.get('model_calls', 0)} model calls, "
+          f"{counters.get('prompt_tokens', 0):,} prompt / {counters.get('response_tokens', 0):,} response tokens")
+    for route, entry in routes.items():
+        print(f"  route {route:20} {entry['calls']:6} calls  {entry['mean_ms']:8.1f} ms mean  {entry['p95_ms']:8.1f} ms p95"
+              f"  ${entry['cost_usd']:.4f}  {entry['escalations']} over the output cap")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the scraping and parsing pipeline offline")
+    arg_parser.add_argument("--flow", choices=["single", "batch", "both"], default="both", help="Which flow to run")
+    arg_parser.add_argument("--urls", type=int, default=50, help="Number of URLs")
+    arg_parser.add_argument("--page-kb", type=float, default=20, help="Page text size in KB")
+    arg_parser.add_argument("--serper-latency", type=float, default=0.05, help="Seconds per fake Serper request")
+    arg_parser.add_argument("--model-latency", type=float, default=0.2, help="Seconds per fake Gemini call")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake Gemini calls that fail")
+    arg_parser.add_argument("--serper-error-rate", type=float, default=0.0, help="Fraction of fake Serper requests that fail")
+    arg_parser.add_argument("--response-words", type=int, default=200, help="Words per fake Gemini response")
+    arg_parser.add_argument("--format", choices=["text", "json", "markdown", "list"], default="json", help="Output format")
+    arg_parser.add_argument("--mode", choices=["structured", "map_reduce", "packed"], default="structured", help="Batch parse mode")
+    arg_parser.add_argument("--backend", choices=["serper", "local"], default="serper", help="Scrape backend")
+    arg_parser.add_argument("--workers", type=int, default=8, help="Batch scrape and parse workers")
+    arg_parser.add_argument("--dedup", action="store_true", help="Let batch jobs reuse results for duplicate pages")
+    arg_parser.add_argument("--cpu-workers", type=int, default=0, help="Batch worker processes for cleaning and chunking")
+    args = arg_parser.parse_args()
+    
+    # Every URL must go through the whole pipeline
+    scrape.configure_scrape_cache(path=None)
+    parser.set_result_cache(None)
+    install_fake_gemini(args.model_latency, args.error_rate, args.response_words)
+    spec = {
+        'description': "Extract all product names with prices",
+        'output_format': args.format,
+        'backend': args.backend,
+        'mode': args.mode
+    }
+    
+    with FakeSerperServer(args.serper_latency, args.serper_error_rate, args.page_kb) as server:
+        scrape.SERPER_SCRAPE_URL = server.url
+        # The local backend downloads the pages themselves from the fake server
+        urls = [f"{server.url}/page-{i}" for i in range(args.urls)]
+        flows = ["single", "batch"] if args.flow == "both" else [args.flow]
+        for flow in flows:
+            # Batch jobs record from worker threads, so use the global registry
+            get_metrics().reset()
+            get_route_stats().reset()
+            tracemalloc.start()
+            started = time.perf_counter()
+            # Keep the per-URL status lines out of the report
+            with redirect_stdout(io.StringIO()):
+                if flow == "single":
+                    latencies, failed = run_single(urls, spec)
+                else:
+                    latencies, failed = run_batch(urls, spec, args.workers, args.dedup, args.cpu_workers)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            report(flow, elapsed, latencies, failed, len(urls), peak, get_metrics().snapshot(), get_route_stats().snapshot())
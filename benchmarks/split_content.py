@@ -0,0 +1,34 @@
+"""
+Micro-benchmark for content chunking
+
+Times scrape.split_content on cleaned synthetic page text, both as plain
+text and as a structured page dict, for a few chunk sizes.
+    
+    python -m benchmarks.split_content --size 10 --repeat 5
+"""
+import argparse
+from scrape import clean_text_content, split_content
+from benchmarks.clean_text import make_page_text, measure
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark content chunking")
+    arg_parser.add_argument("--size", type=float, default=10, help="Input size in MB")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Timed runs per variant (best is reported)")
+    args = arg_parser.parse_args()
+    
+    text = clean_text_content(make_page_text(args.size))
+    headings = [line for line in text.splitlines()[:5000] if len(line) < 40][:200]
+    page = {'title': "Benchmark page", 'text': text, 'links': [], 'images': [], 'headings': headings}
+    print(f"Input: {len(text) / 1e6:.1f} MB of cleaned text, {len(headings)} headings")
+    
+    variants = (
+        ("text, 1500 tokens", lambda: split_content(text, max_tokens=1500, headings=headings)),
+        ("text, 1500 tokens, 100 overlap", lambda: split_content(text, max_tokens=1500, overlap_tokens=100, headings=headings)),
+        ("text, 500 tokens", lambda: split_content(text, max_tokens=500, headings=headings)),
+        ("page dict, 1500 tokens", lambda: split_content(page, max_tokens=1500)),
+    )
+    for name, fn in variants:
+        best, peak = measure(lambda _: fn(), None, args.repeat)
+        chunks = fn()
+        print(f"{name:32} {best * 1000:8.1f} ms  {len(text) / 1e6 / best:7.1f} MB/s  "
+              f"peak {peak / 1e6:6.1f} MB  chunks {len(chunks):,}")
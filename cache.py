@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+class DiskCache:
+    """
+    Persistent key-value cache stored in a single SQLite file
+    
+    Values must be JSON-serializable and are stored zlib-compressed. Each entry
+    has a time-to-live; once the total stored size exceeds `max_bytes`, expired
+    entries are dropped first and then the least recently used ones.
+    Safe to share between threads.
+    
+    Args:
+        path (str): SQLite file to store entries in (directories are created)
+        ttl (float): Default time-to-live in seconds, None to never expire
+        max_bytes (int): Size bound for stored values, None for no bound
+    """
+    
+    def __init__(self, path, ttl=None, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'sets': 0, 'evictions': 0}
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    
+    def get(self, key, allow_expired=False):
+        """
+        Look up a cached value
+        
+        Args:
+            key (str): Cache key
+            allow_expired (bool): Return the value even if its TTL has passed
+        
+        Returns:
+            The cached value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            
+            value, expires_at = row
+            expired = expires_at is not None and expires_at <= now
+            if expired and not allow_expired:
+                self._stats['misses'] += 1
+                return None
+            
+            self._stats['stale_hits' if expired else 'hits'] += 1
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        
+        return json.loads(zlib.decompress(value))
+    
+    def set(self, key, value, ttl=None):
+        """
+        Store a value, replacing any existing entry for the key
+        
+        Args:
+            key (str): Cache key
+            value: JSON-serializable value
+            ttl (float): Time-to-live in seconds, defaults to the cache TTL
+        """
+        ttl = self.ttl if ttl is None else ttl
+        blob = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, expires_at, now)
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            self._stats['sets'] += 1
+            
+            if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+                self._evict(now)
+    
+    def delete(self, key):
+        """
+        Remove an entry if present
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+    
+    def clear(self):
+        """
+        Remove all entries
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._total_bytes = 0
+    
+    def _evict(self, now):
+        # Other processes may share the file, so start from the real total
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        
+        removed = self._conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        if removed:
+            self._stats['evictions'] += removed
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        
+        # Evict down to 90% so we are not evicting again on every set
+        target = int(self.max_bytes * 0.9)
+        if self._total_bytes <= target:
+            return
+        
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self._stats['evictions'] += 1
+    
+    def stats(self):
+        """
+        Return hit/miss counters along with entry count and stored size
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            stats = dict(self._stats)
+        
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['entries'] = entries
+        stats['bytes'] = self._total_bytes
+        stats['hit_rate'] = (stats['hits'] / lookups) if lookups else 0.0
+        return stats
+    
+    def close(self):
+        """
+        Close the underlying database connection
+        """
+        with self._lock:
+            self._conn.close()
+
+class MemoryCache:
+    """
+    In-process LRU cache with the same interface as DiskCache
+    
+    Args:
+        max_entries (int): Number of entries kept before the least recently used is evicted
+        ttl (float): Default time-to-live in seconds, None to never expire
+    """
+    
+    def __init__(self, max_entries=256, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'sets': 0, 'evictions': 0}
+    
+    def get(self, key, allow_expired=False):
+        """
+        Look up a cached value, returning None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            
+            value, expires_at = entry
+            expired = expires_at is not None and expires_at <= now
+            if expired and not allow_expired:
+                self._stats['misses'] += 1
+                return None
+            
+            self._stats['stale_hits' if expired else 'hits'] += 1
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """
+        Store a value, evicting the least recently used entry if full
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def delete(self, key):
+        """
+        Remove an entry if present
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        """
+        Remove all entries
+        """
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """
+        Return hit/miss counters along with the entry count
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] / lookups) if lookups else 0.0
+        return stats
+    
+    def close(self):
+        """
+        Nothing to release for an in-memory cache
+        """
+        pass
+
+def make_cache_key(*parts):
+    """
+    Build a stable cache key by hashing the JSON encoding of the given parts
+    """
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
@@ -0,0 +1,125 @@
+import re
+from cleaning import iter_lines
+
+# Rough average for English web text; used to size chunks without a tokenizer
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+# ATX heading line ("## Title"); "#1 seller" or "#hashtag" is not one
+MARKDOWN_HEADING = re.compile(r'^#{1,6}\s')
+
+def estimate_tokens(text):
+    """
+    Rough token count for budgeting (about 4 characters per token)
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _split_oversized(text, max_tokens):
+    """
+    Break a block that is larger than one chunk at sentence boundaries,
+    falling back to word boundaries and finally to a hard character cut
+    """
+    # Largest piece whose estimate still fits in max_tokens
+    max_chars = max(1, max_tokens - 1) * CHARS_PER_TOKEN
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            yield sentence
+            continue
+        
+        piece = ''
+        for word in sentence.split(' '):
+            while len(word) > max_chars:
+                if piece:
+                    yield piece
+                    piece = ''
+                yield word[:max_chars]
+                word = word[max_chars:]
+            candidate = f"{piece} {word}" if piece else word
+            if piece and estimate_tokens(candidate) > max_tokens:
+                yield piece
+                piece = word
+            else:
+                piece = candidate
+        if piece:
+            yield piece
+
+def iter_chunks(source, max_tokens=1500, overlap_tokens=0, headings=None):
+    """
+    Split text into chunks of roughly `max_tokens` tokens at natural boundaries
+    
+    Lines are packed into chunks whole. A new chunk is preferably started at a
+    heading (a Markdown heading or a line matching one of `headings`), and a
+    line too long for one chunk is split at sentence, then word boundaries.
+    Works as a generator, so the input can itself be a stream of text pieces.
+    
+    Args:
+        source (str or iterable): Text, or an iterable of text pieces
+        max_tokens (int): Target chunk size in estimated tokens
+        overlap_tokens (int): Tokens of trailing context repeated at the start
+            of the next chunk
+        headings (iterable): Known heading texts, e.g. from the scraped data.
+            A list may keep growing while chunks are produced, as it does
+            when a streaming extractor records headings as it finds them
+    
+    Yields:
+        str: Chunks of text
+    """
+    max_tokens = max(1, int(max_tokens))
+    overlap_tokens = max(0, min(int(overlap_tokens), max_tokens // 2))
+    heading_list = headings if isinstance(headings, list) else list(headings or [])
+    heading_set = set()
+    indexed = 0
+    
+    units = []
+    size = 0
+    fresh = 0  # Tokens added since the last flush, excluding carried overlap
+    
+    def is_heading(line):
+        nonlocal indexed
+        # Pick up headings appended since the last check
+        for h in heading_list[indexed:]:
+            if isinstance(h, str) and h.strip():
+                heading_set.add(h.strip().lower())
+        indexed = len(heading_list)
+        stripped = line.strip()
+        return bool(MARKDOWN_HEADING.match(stripped)) or stripped.lower() in heading_set
+    
+    def flush():
+        nonlocal units, size, fresh
+        chunk = '\n'.join(text for text, _ in units)
+        carried = []
+        carried_size = 0
+        if overlap_tokens:
+            for text, tokens in reversed(units):
+                if carried_size + tokens > overlap_tokens:
+                    break
+                carried.insert(0, (text, tokens))
+                carried_size += tokens
+        units = carried
+        size = carried_size
+        fresh = 0
+        return chunk
+    
+    for line in iter_lines(source):
+        line = line.strip()
+        if not line:
+            continue
+        
+        # Start a fresh chunk at a heading once the current one is half full
+        if fresh and size > max_tokens // 2 and is_heading(line):
+            yield flush()
+        
+        pieces = [line] if estimate_tokens(line) <= max_tokens else _split_oversized(line, max_tokens)
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if fresh and size + tokens > max_tokens:
+                yield flush()
+            # Carried overlap must never push a chunk over the limit
+            while units and size + tokens > max_tokens:
+                size -= units.pop(0)[1]
+            units.append((piece, tokens))
+            size += tokens
+            fresh += tokens
+    
+    if fresh:
+        yield flush()
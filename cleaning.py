@@ -0,0 +1,115 @@
+import re
+from metrics import timed
+
+# Characters that render as nothing; removed before whitespace is collapsed
+_INVISIBLE = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u00ad'))
+
+# Whole lines of site chrome that carry no page content
+BOILERPLATE_PATTERN = re.compile(
+    r'(?:skip to (?:main )?content|skip navigation|jump to (?:navigation|search)|back to top|scroll to top'
+    r'|toggle navigation|(?:open|close) (?:menu|navigation)|loading\.*|advertisement'
+    r'|(?:accept|reject|allow)(?: all)? cookies|cookie (?:settings|preferences|policy)|manage cookies'
+    r'|we use cookies\b.{0,80}|this (?:website|site) uses cookies\b.{0,80}'
+    r'|share (?:this(?: page| article| post)?|on (?:facebook|twitter|x|linkedin|pinterest|whatsapp|reddit|email))'
+    r'|follow us(?: on \w+)?|print this page|please enable javascript\b.{0,80}'
+    r'|javascript (?:is )?(?:required|disabled)\b.{0,80})[.!:]?',
+    re.IGNORECASE
+)
+_BOILERPLATE_MAX_LENGTH = 160
+# First three letters of every phrase above; lines starting any other way
+# skip the regular expression entirely
+_BOILERPLATE_PREFIXES = {
+    'ski', 'jum', 'bac', 'scr', 'tog', 'ope', 'clo', 'loa', 'adv', 'acc', 'rej', 'all', 'coo',
+    'man', 'we ', 'thi', 'sha', 'fol', 'pri', 'ple', 'jav',
+}
+
+def iter_lines(source):
+    """
+    Yield the lines of a string or of an iterable of text pieces, split on
+    '\n' only, without building a list of the whole input
+    
+    A string and the same text in pieces give the same lines.
+    """
+    if isinstance(source, str):
+        source = (source,)
+    pending = ''
+    for piece in source:
+        start = 0
+        end = piece.find('\n')
+        while end != -1:
+            yield pending + piece[start:end]
+            pending = ''
+            start = end + 1
+            end = piece.find('\n', start)
+        pending += piece[start:]
+    if pending:
+        yield pending
+
+def new_text_stats():
+    """
+    Return empty statistics for iter_clean_lines to fill in
+    """
+    return {'characters': 0, 'words': 0, 'lines': 0, 'boilerplate_lines': 0}
+
+def iter_clean_lines(source, remove_boilerplate=True, stats=None):
+    """
+    Yield cleaned lines of text, adding their counts to `stats` once the
+    input is exhausted (or the generator is closed)
+    
+    Each line is stripped, unicode whitespace (tabs, non-breaking spaces, ...)
+    is collapsed to single spaces and invisible characters are removed. Empty
+    lines are skipped, and so are boilerplate lines such as "Skip to content"
+    or "Accept all cookies" unless `remove_boilerplate` is False.
+    
+    Args:
+        source (str or iterable): Text, or an iterable of text pieces
+        remove_boilerplate (bool): Drop lines matching BOILERPLATE_PATTERN
+        stats (dict): Counters from new_text_stats() to fill in; characters
+            includes the newlines that join the lines
+    
+    Yields:
+        str: Cleaned lines
+    """
+    if stats is None:
+        stats = new_text_stats()
+    characters = words = lines = boilerplate = 0
+    try:
+        for line in iter_lines(source):
+            line = line.strip()
+            if not line:
+                continue
+            # Fast path: plain ASCII spacing needs no further work
+            if '  ' in line or not line.isprintable():
+                line = ' '.join(line.translate(_INVISIBLE).split())
+                if not line:
+                    continue
+            if (remove_boilerplate and len(line) <= _BOILERPLATE_MAX_LENGTH
+                    and line[:3].lower() in _BOILERPLATE_PREFIXES and BOILERPLATE_PATTERN.fullmatch(line)):
+                boilerplate += 1
+                continue
+            characters += len(line)
+            words += line.count(' ') + 1
+            lines += 1
+            yield line
+    finally:
+        stats['characters'] += characters + max(lines - 1, 0)
+        stats['words'] += words
+        stats['lines'] += lines
+        stats['boilerplate_lines'] += boilerplate
+
+def clean_text(source, remove_boilerplate=True):
+    """
+    Clean text in a single pass and count it at the same time
+    
+    Args:
+        source (str or iterable): Text, or an iterable of text pieces
+        remove_boilerplate (bool): Drop boilerplate lines
+    
+    Returns:
+        tuple: (cleaned text, stats dict with characters, words, lines and
+            boilerplate_lines)
+    """
+    stats = new_text_stats()
+    with timed('clean'):
+        text = '\n'.join(iter_clean_lines(source, remove_boilerplate, stats))
+    return text, stats
@@ -0,0 +1,440 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import requests
+from scrape import (
+    scrape_and_process,
+    normalize_url,
+    get_session,
+    configure_session,
+    USER_AGENT,
+    SCRAPE_BACKEND,
+    SCRAPE_BACKENDS,
+    SESSION_CONFIG,
+    _request_timeout
+)
+
+# Links to files that are never worth scraping for text
+SKIPPED_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp', '.css', '.js', '.json', '.xml',
+    '.zip', '.gz', '.tar', '.rar', '.7z', '.exe', '.dmg', '.iso', '.mp3', '.mp4', '.avi', '.mov',
+    '.wav', '.woff', '.woff2', '.ttf', '.eot', '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+)
+
+class BloomFilter:
+    """
+    Compact set of strings with no false negatives and a bounded rate of
+    false positives
+    
+    Memory is fixed up front: about 1.8 MB per million items at a 0.1% error
+    rate, however long the URLs are.
+    
+    Args:
+        capacity (int): Number of items the filter is sized for
+        error_rate (float): False positive rate once `capacity` items are added
+    """
+    
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def _positions(self, item):
+        # Double hashing: position i is h1 + i * h2
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def add(self, item):
+        """
+        Add an item
+        
+        Returns:
+            bool: True if the item was not in the filter before
+        """
+        positions = self._positions(item)
+        with self._lock:
+            new = False
+            for position in positions:
+                byte, bit = divmod(position, 8)
+                if not self._bits[byte] & (1 << bit):
+                    self._bits[byte] |= 1 << bit
+                    new = True
+            if new:
+                self._count += 1
+            return new
+    
+    def __contains__(self, item):
+        return all(self._bits[p // 8] & (1 << (p % 8)) for p in self._positions(item))
+    
+    def __len__(self):
+        return self._count
+
+def _host(url):
+    return (urlsplit(url).hostname or '').lower()
+
+def _base_domain(host):
+    return host[4:] if host.startswith('www.') else host
+
+def default_priority(url, depth):
+    """
+    Crawl shallow pages first and, at the same depth, shorter URLs first
+    """
+    return -depth * 1000 - len(urlsplit(url).path)
+
+class CrawlFrontier:
+    """
+    Queue of URLs to crawl, with deduplication, depth and domain limits and
+    per-host politeness
+    
+    Each host has its own priority queue. A host is handed out to one
+    request at a time and becomes available again `delay` seconds after
+    that request finishes (see release); among available hosts, the one
+    whose best URL has the highest priority goes first. URLs already seen
+    are remembered in a Bloom filter, so the seen-set stays small however
+    large the crawl grows.
+    
+    Args:
+        max_depth (int): Links more than this many hops from a start URL are ignored
+        allowed_domains (iterable): Domains to stay within (subdomains included),
+            None for no restriction
+        delay (float): Seconds to wait between requests to the same host
+        priority_fn (callable): priority_fn(url, depth) -> number, higher first
+        max_queued (int): URLs held at most; further URLs are dropped until
+            the queue drains
+        capacity (int): Expected number of distinct URLs, sizes the seen-set
+        error_rate (float): Seen-set false positive rate at capacity
+    """
+    
+    def __init__(self, max_depth=2, allowed_domains=None, delay=1.0, priority_fn=None,
+                 max_queued=100_000, capacity=1_000_000, error_rate=0.001):
+        self.max_depth = max_depth
+        self.allowed_domains = {_base_domain(d.lower()) for d in allowed_domains} if allowed_domains else None
+        self.delay = delay
+        self.priority_fn = priority_fn or default_priority
+        self.max_queued = max_queued
+        self.seen = BloomFilter(capacity, error_rate)
+        self._queues = {}
+        self._state = {}       # host -> 'ready', 'busy' or 'waiting'
+        self._ready = []       # (-head priority, seq, host)
+        self._waiting = []     # (ready time, seq, host)
+        self._cooling = {}     # idle host -> ready time, oldest release first
+        self._counter = itertools.count()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._stats = {'queued': 0, 'duplicates': 0, 'filtered': 0, 'dropped': 0}
+    
+    def _allowed(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return False
+        if parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+            return False
+        if self.allowed_domains is None:
+            return True
+        host = parts.hostname.lower()
+        return any(host == d or host.endswith('.' + d) for d in self.allowed_domains)
+    
+    def add(self, url, depth=0):
+        """
+        Queue a URL unless it was seen before or is outside the crawl limits
+        
+        Returns:
+            bool: True if the URL was queued
+        """
+        if not isinstance(url, str) or depth > self.max_depth:
+            return False
+        url = normalize_url(url)
+        allowed = self._allowed(url)
+        
+        with self._lock:
+            if not allowed:
+                self._stats['filtered'] += 1
+                return False
+            if self._queued >= self.max_queued:
+                self._stats['dropped'] += 1
+                return False
+            if not self.seen.add(url):
+                self._stats['duplicates'] += 1
+                return False
+            
+            host = _host(url)
+            priority = self.priority_fn(url, depth)
+            queue = self._queues.setdefault(host, [])
+            heapq.heappush(queue, (-priority, next(self._counter), url, depth))
+            self._queued += 1
+            self._stats['queued'] += 1
+            
+            state = self._state.get(host)
+            if state is None:
+                # A host released moments ago still owes its politeness delay
+                ready_at = self._cooling.pop(host, None)
+                if ready_at is not None and ready_at > time.monotonic():
+                    self._state[host] = 'waiting'
+                    heapq.heappush(self._waiting, (ready_at, next(self._counter), host))
+                else:
+                    self._state[host] = 'ready'
+                    heapq.heappush(self._ready, (-priority, next(self._counter), host))
+            elif state == 'ready' and queue[0][2] == url:
+                # Better than what the host was ranked by; the old entry is skipped later
+                heapq.heappush(self._ready, (-priority, next(self._counter), host))
+            return True
+    
+    def pop(self):
+        """
+        Take the highest-priority URL whose host may be requested now
+        
+        The host stays busy until release() is called for the URL.
+        
+        Returns:
+            tuple or None: (url, depth), or None if no host is available yet
+        """
+        with self._lock:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, host = heapq.heappop(self._waiting)
+                self._state[host] = 'ready'
+                heapq.heappush(self._ready, (self._queues[host][0][0], next(self._counter), host))
+            
+            while self._ready:
+                neg_priority, _, host = heapq.heappop(self._ready)
+                queue = self._queues.get(host)
+                if self._state.get(host) != 'ready' or not queue or queue[0][0] != neg_priority:
+                    continue
+                _, _, url, depth = heapq.heappop(queue)
+                self._queued -= 1
+                self._state[host] = 'busy'
+                return url, depth
+            return None
+    
+    def release(self, url, delay=None):
+        """
+        Mark the request for `url` as finished so its host can be used again
+        after the politeness delay
+        
+        Args:
+            url (str): URL returned by pop()
+            delay (float): Delay for this host, e.g. from robots.txt, if
+                longer than the frontier's own
+        """
+        host = _host(url)
+        with self._lock:
+            now = time.monotonic()
+            ready_at = now + max(self.delay, delay or 0)
+            if self._queues.get(host):
+                self._state[host] = 'waiting'
+                heapq.heappush(self._waiting, (ready_at, next(self._counter), host))
+            else:
+                # Idle hosts keep only their ready time until the delay is
+                # over, so memory tracks only active and recently used hosts
+                self._queues.pop(host, None)
+                self._state.pop(host, None)
+                self._cooling.pop(host, None)
+                self._cooling[host] = ready_at
+            while self._cooling:
+                oldest = next(iter(self._cooling))
+                if self._cooling[oldest] > now:
+                    break
+                del self._cooling[oldest]
+    
+    def wait_time(self):
+        """
+        Seconds until a waiting host becomes available, None if none is waiting
+        """
+        with self._lock:
+            if self._ready:
+                return 0.0
+            if self._waiting:
+                return max(0.0, self._waiting[0][0] - time.monotonic())
+            return None
+    
+    def __len__(self):
+        return self._queued
+    
+    def stats(self):
+        """
+        Return counts of queued, duplicate, filtered and dropped URLs
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._queued
+            stats['hosts'] = len(self._queues)
+        stats['seen'] = len(self.seen)
+        return stats
+
+def page_links(data):
+    """
+    Return the link URLs of a scraped page (strings or dicts with href/url/link)
+    """
+    links = []
+    for link in (data or {}).get('links') or []:
+        if isinstance(link, dict):
+            link = link.get('href') or link.get('url') or link.get('link')
+        if isinstance(link, str) and link.strip():
+            links.append(link.strip())
+    return links
+
+class _RobotsRules:
+    """
+    robots.txt rules per host, fetched once per host and shared between threads
+    """
+    
+    def __init__(self, user_agent=USER_AGENT):
+        self.user_agent = user_agent
+        self._parsers = {}
+        self._lock = threading.Lock()
+    
+    def _parser(self, url):
+        parts = urlsplit(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if root in self._parsers:
+                return self._parsers[root]
+        
+        parser = RobotFileParser()
+        try:
+            response = get_session().get(root + '/robots.txt', headers={'User-Agent': self.user_agent}, timeout=_request_timeout())
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code == 200:
+                parser.parse(response.text.splitlines())
+            else:
+                parser.allow_all = True
+        except requests.exceptions.RequestException:
+            parser.allow_all = True
+        
+        with self._lock:
+            self._parsers.setdefault(root, parser)
+            return self._parsers[root]
+    
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.user_agent, url)
+    
+    def crawl_delay(self, url):
+        return self._parser(url).crawl_delay(self.user_agent)
+
+def crawl(start_urls, max_pages=100, max_depth=2, same_domain=True, allowed_domains=None, delay=1.0,
+          max_workers=4, backend=None, priority_fn=None, respect_robots=True, frontier=None):
+    """
+    Crawl from the start URLs, following the links found on each page
+    
+    Args:
+        start_urls (iterable): URLs to start from (depth 0)
+        max_pages (int): Pages to scrape at most, None for no limit
+        max_depth (int): Link hops to follow from a start URL
+        same_domain (bool): Stay on the start URLs' domains (and subdomains)
+        allowed_domains (iterable): Domains to stay on, overrides same_domain
+        delay (float): Seconds between requests to the same host
+        max_workers (int): Pages scraped at once (on different hosts)
+        backend (str): 'serper' or 'local', defaults to SCRAPE_BACKEND
+        priority_fn (callable): priority_fn(url, depth) -> number, higher first
+        respect_robots (bool): Skip URLs disallowed by robots.txt and honour
+            its Crawl-delay
+        frontier (CrawlFrontier): Frontier to use instead of a new one built
+            from the arguments above
+    
+    Yields:
+        tuple: (url, depth, structured page data or None) as each page finishes
+    """
+    start_urls = list(start_urls)
+    if frontier is None:
+        if allowed_domains is None and same_domain:
+            allowed_domains = [_host(normalize_url(url)) for url in start_urls]
+        frontier = CrawlFrontier(max_depth=max_depth, allowed_domains=allowed_domains, delay=delay, priority_fn=priority_fn)
+    for url in start_urls:
+        frontier.add(url, 0)
+    
+    robots = _RobotsRules() if respect_robots else None
+    
+    def fetch(url):
+        if robots is not None and not robots.allowed(url):
+            print(f"Skipping (disallowed by robots.txt): {url}")
+            return None
+        return scrape_and_process(url, return_format='json', backend=backend)
+    
+    started = 0
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while True:
+            while len(futures) < max_workers and (max_pages is None or started < max_pages):
+                item = frontier.pop()
+                if item is None:
+                    break
+                url, depth = item
+                futures[executor.submit(fetch, url)] = (url, depth)
+                started += 1
+            
+            if not futures:
+                wait_time = frontier.wait_time()
+                if wait_time is None or (max_pages is not None and started >= max_pages):
+                    break
+                time.sleep(wait_time)
+                continue
+            
+            # Wake up when a page finishes or, with a free worker, when a host becomes available
+            can_start = len(futures) < max_workers and (max_pages is None or started < max_pages)
+            timeout = frontier.wait_time() if can_start else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, depth = futures.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    print(f"Error crawling {url}: {e}")
+                    data = None
+                
+                if data and depth < frontier.max_depth:
+                    for link in page_links(data):
+                        frontier.add(link, depth + 1)
+                frontier.release(url, robots.crawl_delay(url) if robots is not None else None)
+                yield url, depth, data
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Crawl a site by following links from the start URLs")
+    arg_parser.add_argument("start_urls", nargs='+', help="URLs to start from")
+    arg_parser.add_argument("-o", "--output", default="crawl.jsonl", help="JSONL file to write pages to")
+    arg_parser.add_argument("-n", "--max-pages", type=int, default=100, help="Pages to scrape at most")
+    arg_parser.add_argument("-d", "--depth", type=int, default=2, help="Link hops to follow from a start URL")
+    arg_parser.add_argument("--delay", type=float, default=1.0, help="Seconds between requests to the same host")
+    arg_parser.add_argument("-w", "--workers", type=int, default=4, help="Pages scraped at once")
+    arg_parser.add_argument("--domain", action="append", help="Domain to stay on (repeatable; default: the start URLs' domains)")
+    arg_parser.add_argument("--any-domain", action="store_true", help="Follow links to any domain")
+    arg_parser.add_argument("--ignore-robots", action="store_true", help="Do not read robots.txt")
+    arg_parser.add_argument("-b", "--backend", choices=SCRAPE_BACKENDS, default=SCRAPE_BACKEND, help="Serper API or direct download")
+    args = arg_parser.parse_args()
+    
+    configure_session(pool_size=max(args.workers, SESSION_CONFIG['pool_size']))
+    
+    succeeded = failed = 0
+    with open(args.output, 'w', encoding='utf-8') as out:
+        for url, depth, data in crawl(
+            args.start_urls,
+            max_pages=args.max_pages,
+            max_depth=args.depth,
+            same_domain=not args.any_domain,
+            allowed_domains=args.domain,
+            delay=args.delay,
+            max_workers=args.workers,
+            backend=args.backend,
+            respect_robots=not args.ignore_robots
+        ):
+            if data is None:
+                failed += 1
+            else:
+                succeeded += 1
+            out.write(json.dumps({'url': url, 'depth': depth, 'result': data}, ensure_ascii=False) + '\n')
+    
+    print(f"Done: {succeeded} pages scraped, {failed} failed. Results written to {args.output}")
@@ -0,0 +1,124 @@
+import hashlib
+import re
+import struct
+import threading
+
+_WORD = re.compile(r'\w+')
+# Tokens carrying extractable values: numbers, prices, dates, emails, ...
+_VALUE_TOKEN = re.compile(r'\S*[\d@]\S*')
+
+def _normalized(text):
+    return ' '.join(text.lower().split())
+
+def _shingles(text, size):
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _value_fingerprint(text):
+    values = sorted(set(_VALUE_TOKEN.findall(text.lower())))
+    return hashlib.sha1('\n'.join(values).encode('utf-8')).hexdigest()
+
+class DuplicateIndex:
+    """
+    Find exact and near-duplicate texts seen earlier in a job and return the
+    result stored for them
+    
+    Exact duplicates are matched on whitespace- and case-normalized text.
+    Near duplicates are found with MinHash signatures over word shingles and
+    LSH banding, and must also contain exactly the same numbers, prices,
+    dates and email addresses, so two product pages that differ only in a
+    price are never treated as duplicates. Results are only shared within a
+    scope (e.g. one extraction request and output format). Thread-safe.
+    
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity of word
+            shingles for a near-duplicate match
+        num_perm (int): MinHash signature length
+        bands (int): LSH bands; num_perm must be divisible by bands
+        shingle_size (int): Words per shingle
+        seed (int): Seed for the MinHash hash functions
+    """
+    
+    def __init__(self, threshold=0.9, num_perm=64, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._seed = f'{seed}:'.encode('utf-8')
+        self._unpack = struct.Struct(f'<{num_perm}I').unpack
+        self._exact = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'near_hits': 0, 'misses': 0, 'entries': 0}
+    
+    def _signature(self, text):
+        # One SHAKE digest per shingle yields all num_perm 32-bit hash values;
+        # the signature is their column-wise minimum
+        rows = [
+            self._unpack(hashlib.shake_128(self._seed + shingle.encode('utf-8')).digest(4 * self.num_perm))
+            for shingle in _shingles(text, self.shingle_size)
+        ]
+        return tuple(map(min, zip(*rows)))
+    
+    def _band_keys(self, scope, signature):
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+    
+    def find(self, text, scope=''):
+        """
+        Look up a text
+        
+        Returns:
+            tuple: (stored value, 'exact' or 'near'), or (None, None) if no
+                earlier text in the scope matches
+        """
+        exact_key = (scope, hashlib.sha256(_normalized(text).encode('utf-8')).digest())
+        with self._lock:
+            if exact_key in self._exact:
+                self._stats['exact_hits'] += 1
+                return self._exact[exact_key], 'exact'
+        
+        signature = self._signature(text)
+        fingerprint = _value_fingerprint(text)
+        with self._lock:
+            best, best_similarity = None, self.threshold
+            for key in self._band_keys(scope, signature):
+                for entry in self._buckets.get(key, ()):
+                    if entry[1] != fingerprint:
+                        continue
+                    similarity = sum(x == y for x, y in zip(signature, entry[0])) / self.num_perm
+                    if similarity >= best_similarity:
+                        best, best_similarity = entry, similarity
+            if best is not None:
+                self._stats['near_hits'] += 1
+                return best[2], 'near'
+            self._stats['misses'] += 1
+        return None, None
+    
+    def add(self, text, value, scope=''):
+        """
+        Store the result for a text
+        """
+        exact_key = (scope, hashlib.sha256(_normalized(text).encode('utf-8')).digest())
+        entry = (self._signature(text), _value_fingerprint(text), value)
+        with self._lock:
+            if exact_key in self._exact:
+                return
+            self._exact[exact_key] = value
+            for key in self._band_keys(scope, entry[0]):
+                self._buckets.setdefault(key, []).append(entry)
+            self._stats['entries'] += 1
+    
+    def stats(self):
+        """
+        Return lookup counters and the share of lookups answered from the index
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['exact_hits'] + stats['near_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['exact_hits'] + stats['near_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,167 @@
+import json
+import re
+
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b')
+PHONE_PATTERN = re.compile(
+    r'(?<![\w/.-])(?:\+\d{1,3}[\s.-]?)?(?:\(\d{1,4}\)[\s.-]?)?\d{2,4}(?:[\s.-]\d{2,4}){1,3}(?![\w/-])'
+)
+# What sets a phone number apart from other digit groups: an international
+# prefix, a bracketed area code, a national trunk prefix (0...) or the
+# North American 555-123-4567 shape
+PHONE_SHAPE = re.compile(r'\+|\(\d{1,4}\)|0\d{1,4}[\s.-]|\d{3}([\s.-])\d{3}\1\d{4}$')
+# Opening hours such as 09.00-17.00, which otherwise look like a 0... number
+_TIME_RANGE = re.compile(r'\d{1,2}[.:]\d{2}\s?[-–]\s?\d{1,2}[.:]\d{2}')
+URL_PATTERN = re.compile(r'\b(?:https?://|www\.)[^\s<>"\'`]+', re.IGNORECASE)
+PRICE_PATTERN = re.compile(
+    r'(?:[$€£¥₹]\s?\d{1,3}(?:[,\s]\d{3})*(?:\.\d{1,2})?|[$€£¥₹]\s?\d+(?:\.\d{1,2})?)'
+    r'|\b\d+(?:[.,]\d{1,2})?\s?(?:USD|EUR|GBP|INR|JPY|dollars|euros|pounds)\b',
+    re.IGNORECASE
+)
+_MONTHS = r'(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)'
+DATE_PATTERN = re.compile(
+    r'\b\d{4}-\d{2}-\d{2}\b'
+    r'|\b\d{1,2}/\d{1,2}/\d{2,4}\b'
+    r'|\b\d{1,2}\.\d{1,2}\.\d{4}\b'
+    rf'|\b{_MONTHS}\.? \d{{1,2}}(?:st|nd|rd|th)?,? \d{{4}}\b'
+    rf'|\b\d{{1,2}}(?:st|nd|rd|th)? {_MONTHS}\.?,? \d{{4}}\b',
+    re.IGNORECASE
+)
+
+def _unique(matches):
+    seen = set()
+    unique = []
+    for match in matches:
+        key = match.lower()
+        if key not in seen:
+            seen.add(key)
+            unique.append(match)
+    return unique
+
+def extract_emails(text):
+    """
+    Return the distinct email addresses in text, in order of appearance
+    """
+    return _unique(EMAIL_PATTERN.findall(text))
+
+def extract_phone_numbers(text):
+    """
+    Return the distinct phone numbers in text (7 to 15 digits)
+    
+    Digit groups without a phone-like shape (see PHONE_SHAPE), such as order
+    numbers or lists of years, and opening hours and dates are left out.
+    """
+    numbers = []
+    for match in PHONE_PATTERN.findall(text):
+        digits = sum(c.isdigit() for c in match)
+        if not 7 <= digits <= 15 or DATE_PATTERN.fullmatch(match) or _TIME_RANGE.fullmatch(match):
+            continue
+        if PHONE_SHAPE.match(match):
+            numbers.append(match.strip())
+    return _unique(numbers)
+
+def extract_urls(text):
+    """
+    Return the distinct URLs in text, without trailing punctuation
+    """
+    return _unique(match.rstrip('.,;:!?)]}') for match in URL_PATTERN.findall(text))
+
+def extract_prices(text):
+    """
+    Return the distinct prices (currency symbol or code plus amount) in text
+    """
+    return _unique(match.strip() for match in PRICE_PATTERN.findall(text))
+
+def extract_dates(text):
+    """
+    Return the distinct dates in common numeric and written formats
+    """
+    return _unique(DATE_PATTERN.findall(text))
+
+# Extractor name -> (function, label used in formatted output)
+EXTRACTORS = {
+    'emails': (extract_emails, 'Email Addresses'),
+    'phone_numbers': (extract_phone_numbers, 'Phone Numbers'),
+    'urls': (extract_urls, 'URLs'),
+    'prices': (extract_prices, 'Prices'),
+    'dates': (extract_dates, 'Dates'),
+}
+
+# Request words that select extractors
+_TRIGGERS = {
+    'email': ['emails'], 'emails': ['emails'], 'e-mail': ['emails'], 'e-mails': ['emails'], 'mail': ['emails'],
+    'phone': ['phone_numbers'], 'phones': ['phone_numbers'], 'telephone': ['phone_numbers'],
+    'telephones': ['phone_numbers'], 'tel': ['phone_numbers'], 'mobile': ['phone_numbers'],
+    'url': ['urls'], 'urls': ['urls'], 'link': ['urls'], 'links': ['urls'], 'hyperlinks': ['urls'],
+    'price': ['prices'], 'prices': ['prices'], 'pricing': ['prices'], 'cost': ['prices'], 'costs': ['prices'],
+    'date': ['dates'], 'dates': ['dates'],
+    'contact': ['emails', 'phone_numbers'], 'contacts': ['emails', 'phone_numbers'],
+}
+
+# Words that may appear in a request without changing what is being asked for
+_FILLER = {
+    'a', 'all', 'an', 'and', 'any', 'address', 'addresses', 'as', 'available', 'details', 'each',
+    'every', 'extract', 'find', 'found', 'from', 'get', 'give', 'identify', 'in', 'info',
+    'information', 'list', 'me', 'mentioned', 'number', 'numbers', 'of', 'on', 'or', 'out', 'page',
+    'please', 'present', 'pull', 'return', 'show', 'site', 'the', 'their', 'this', 'unique', 'web',
+    'webpage', 'website', 'with',
+}
+
+def route_request(parse_description):
+    """
+    Decide whether a request can be answered by the local extractors alone
+    
+    A request qualifies when every word in it is either an extractor trigger
+    ("emails", "phone numbers", "prices", "contact information", ...) or
+    filler ("extract all", "from this page"). Anything else, such as
+    "product names with prices", needs the model.
+    
+    Returns:
+        list or None: Extractor names to run, or None to use the model
+    """
+    words = re.findall(r"[a-z]+(?:-[a-z]+)?", parse_description.lower())
+    selected = []
+    for word in words:
+        if word in _TRIGGERS:
+            for name in _TRIGGERS[word]:
+                if name not in selected:
+                    selected.append(name)
+        elif word not in _FILLER:
+            return None
+    return selected or None
+
+def run_extractors(text, names):
+    """
+    Run the named extractors over text
+    
+    Returns:
+        dict: Extractor name -> list of matches
+    """
+    return {name: EXTRACTORS[name][0](text) for name in names}
+
+def format_extraction(results, output_format="text"):
+    """
+    Render extractor results in one of the parser output formats
+    
+    Args:
+        results (dict): Extractor name -> list of matches
+        output_format (str): "text", "json", "markdown", or "list"
+    
+    Returns:
+        str: Formatted result
+    """
+    if output_format == "json":
+        return json.dumps(results, indent=2, ensure_ascii=False)
+    
+    sections = []
+    for name, matches in results.items():
+        label = EXTRACTORS[name][1]
+        if output_format == "markdown":
+            body = "\n".join(f"- {match}" for match in matches) or f"No {label.lower()} found."
+            sections.append(f"## {label}\n\n{body}")
+        elif output_format == "list":
+            body = "\n".join(f"- {match}" for match in matches) or f"- No {label.lower()} found"
+            sections.append(f"{label}:\n{body}")
+        else:
+            body = ", ".join(matches) if matches else f"No {label.lower()} found."
+            sections.append(f"{label}: {body}")
+    return "\n\n".join(sections)
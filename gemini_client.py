@@ -0,0 +1,398 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from types import SimpleNamespace
+import google.generativeai as genai
+from google.generativeai import caching
+from google.api_core import exceptions as google_exceptions
+from dotenv import load_dotenv
+from chunking import CHARS_PER_TOKEN, estimate_tokens
+from metrics import count, timed
+
+# Load environment variables
+load_dotenv()
+
+# Configure Gemini API
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+genai.configure(api_key=GEMINI_API_KEY)
+
+MODEL_NAME = 'gemini-2.0-flash-exp'
+
+# Default request budget; match these to your API quota
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 10))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", 1000000))
+
+# Gemini only caches contexts of at least this many tokens; smaller pages
+# are simply sent with every question
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 4096))
+
+# Errors worth retrying: quota exhaustion and transient server problems
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(model_name):
+    """
+    Return a shared GenerativeModel instance for the given model name
+    """
+    model = _models.get(model_name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                _models[model_name] = model
+    return model
+
+def register_model(model_name, model):
+    """
+    Use the given model object (e.g. a FakeModel) whenever model_name is requested
+    """
+    with _models_lock:
+        _models[model_name] = model
+
+def record_usage(prompt, text, response=None):
+    """
+    Count one model call with its prompt and response tokens
+    
+    Token counts come from the response's usage_metadata when the API
+    reports it, otherwise they are estimated from the text. Tokens served
+    from a context cache are counted as cached_prompt_tokens instead of
+    prompt_tokens.
+    
+    Returns:
+        tuple: (prompt tokens, response tokens) counted for the call
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    cached_tokens = getattr(usage, 'cached_content_token_count', None) or 0
+    prompt_tokens = (getattr(usage, 'prompt_token_count', None) or (estimate_tokens(prompt) + cached_tokens)) - cached_tokens
+    response_tokens = getattr(usage, 'candidates_token_count', None) or (estimate_tokens(text) if text else 0)
+    count('model_calls')
+    count('prompt_tokens', prompt_tokens)
+    count('cached_prompt_tokens', cached_tokens)
+    count('response_tokens', response_tokens)
+    return prompt_tokens, response_tokens
+
+def create_cached_model(model_name, system_instruction, contents, ttl=600):
+    """
+    Store an instruction preamble and page content in the provider's context
+    cache and return a model that answers prompts against it
+    
+    Registered fakes with a cache_context method (see FakeModel) are used
+    instead of the Gemini API.
+    
+    Args:
+        model_name (str): Gemini model to use
+        system_instruction (str): Instructions shared by every prompt
+        contents (str): Content shared by every prompt, e.g. a page
+        ttl (float): Seconds the provider keeps the cached context
+    
+    Returns:
+        tuple: (model, function releasing the cached context), or (None, None)
+            if context caching is unavailable for this model or the
+            context is below CONTEXT_CACHE_MIN_TOKENS
+    """
+    registered = _models.get(model_name)
+    if hasattr(registered, 'cache_context'):
+        return registered.cache_context(system_instruction, contents, ttl), lambda: None
+    if estimate_tokens(system_instruction) + estimate_tokens(contents) < CONTEXT_CACHE_MIN_TOKENS:
+        return None, None
+    
+    try:
+        cached_content = caching.CachedContent.create(
+            model=f"models/{model_name}",
+            system_instruction=system_instruction,
+            contents=[contents],
+            ttl=timedelta(seconds=ttl)
+        )
+    except Exception as e:
+        print(f"Context caching unavailable ({e.__class__.__name__}), sending the content with every prompt")
+        return None, None
+    
+    def release():
+        try:
+            cached_content.delete()
+        except Exception:
+            # It expires on its own after ttl
+            pass
+    return genai.GenerativeModel.from_cached_content(cached_content=cached_content), release
+
+class FakeResponse:
+    """
+    Minimal stand-in for a Gemini response object
+    """
+    
+    def __init__(self, text, usage_metadata=None, candidates=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.candidates = candidates or []
+
+class FakeModel:
+    """
+    Local stand-in for a Gemini GenerativeModel, for tests and benchmarks
+    
+    Responses longer than the generation config's max_output_tokens are
+    cut off and marked with finish_reason MAX_TOKENS, as Gemini does.
+    
+    Args:
+        responder (callable): Maps a prompt to the response text; defaults to
+            echoing the first line of the user request
+        latency (float): Seconds each call takes
+        error_rate (float): Fraction of calls that fail with a quota error
+        seed (int): Seed for the error decisions, for reproducible runs
+    """
+    
+    def __init__(self, responder=None, latency=0.0, error_rate=0.0, seed=None):
+        self.responder = responder or self._default_responder
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.context_caches = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _default_responder(prompt):
+        for line in prompt.splitlines():
+            if line.startswith("USER REQUEST:"):
+                return f"Fake result for: {line[len('USER REQUEST:'):].strip()}"
+        return "Fake result"
+    
+    def _capped_text(self, prompt, generation_config):
+        # Response text, cut at max_output_tokens, and whether it was cut
+        text = self.responder(prompt)
+        max_output_tokens = getattr(generation_config, 'max_output_tokens', None)
+        if max_output_tokens and estimate_tokens(text) > max_output_tokens:
+            return text[:max_output_tokens * CHARS_PER_TOKEN], True
+        return text, False
+    
+    def _respond(self, prompt, generation_config):
+        text, cut_off = self._capped_text(prompt, generation_config)
+        return FakeResponse(text, candidates=[SimpleNamespace(finish_reason='MAX_TOKENS')] if cut_off else None)
+    
+    def _next_call(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random() < self.error_rate
+    
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        fail = self._next_call()
+        if stream:
+            return self._stream(prompt, fail, generation_config)
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        return self._respond(prompt, generation_config)
+    
+    def _stream(self, prompt, fail, generation_config=None):
+        if fail:
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        text, cut_off = self._capped_text(prompt, generation_config)
+        # Spread the latency over the pieces, like a real token stream
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            if self.latency:
+                time.sleep(self.latency / len(words))
+            yield FakeResponse(word if i == 0 else ' ' + word)
+        # Gemini reports the finish reason on the last chunk
+        yield FakeResponse('', candidates=[SimpleNamespace(finish_reason='MAX_TOKENS' if cut_off else 'STOP')])
+    
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        fail = self._next_call()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if fail:
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        return self._respond(prompt, generation_config)
+    
+    def cache_context(self, system_instruction, contents, ttl=None):
+        """
+        Stand-in for Gemini context caching: return a model that answers as
+        if `system_instruction` and `contents` preceded every prompt
+        """
+        with self._lock:
+            self.context_caches += 1
+        return FakeCachedModel(self, system_instruction + "\n" + contents)
+
+class FakeCachedModel:
+    """
+    Model returned by FakeModel.cache_context; reports the cached tokens in
+    usage_metadata the way Gemini does
+    """
+    
+    def __init__(self, model, context):
+        self.model = model
+        self.context = context
+    
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        response = self.model.generate_content(self.context + prompt, generation_config=generation_config)
+        cached_tokens = estimate_tokens(self.context)
+        response.usage_metadata = SimpleNamespace(
+            prompt_token_count=cached_tokens + estimate_tokens(prompt),
+            cached_content_token_count=cached_tokens,
+            candidates_token_count=estimate_tokens(response.text) if response.text else 0
+        )
+        return response
+
+class RateLimiter:
+    """
+    Sliding one-minute window limiter for requests and tokens
+    
+    Args:
+        requests_per_minute (int): Maximum requests started in any 60 seconds
+        tokens_per_minute (int): Maximum estimated tokens in any 60 seconds
+    """
+    
+    def __init__(self, requests_per_minute=GEMINI_RPM, tokens_per_minute=GEMINI_TPM, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events = deque()
+        self._tokens_in_window = 0
+        self._lock = None
+        self._loop = None
+    
+    def _prune(self, now):
+        while self._events and self._events[0][0] <= now - self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+    
+    async def acquire(self, tokens=1):
+        """
+        Wait until a request using `tokens` tokens fits in the budget, then record it
+        """
+        # asyncio primitives belong to one event loop; recreate them for a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                
+                fits_requests = len(self._events) < self.requests_per_minute
+                # A single oversized request is let through once the window is empty
+                fits_tokens = (self._tokens_in_window + tokens <= self.tokens_per_minute) or not self._events
+                if fits_requests and fits_tokens:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                
+                await asyncio.sleep(max(self._events[0][0] + self.window - now, 0.01))
+
+class AsyncGeminiClient:
+    """
+    Asyncio Gemini client that runs many prompts concurrently within a quota
+    
+    Requests are throttled by a requests-per-minute and tokens-per-minute
+    budget, at most `max_concurrency` run at once, and quota or transient
+    server errors are retried with exponential backoff.
+    
+    Args:
+        model_name (str): Gemini model to use
+        model: Model object to use instead, e.g. a FakeModel
+        requests_per_minute (int): Request budget
+        tokens_per_minute (int): Token budget (prompt estimate plus output reserve)
+        max_concurrency (int): Maximum requests in flight
+        max_retries (int): Retries per prompt on retryable errors
+        backoff_base (float): First retry delay in seconds, doubled each retry
+        output_token_reserve (int): Tokens counted per request for the response
+    """
+    
+    def __init__(self, model_name=MODEL_NAME, model=None, requests_per_minute=GEMINI_RPM,
+                 tokens_per_minute=GEMINI_TPM, max_concurrency=8, max_retries=5, backoff_base=1.0,
+                 output_token_reserve=512):
+        self.model_name = model_name
+        self.model = model if model is not None else get_model(model_name)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.output_token_reserve = output_token_reserve
+        self._semaphore = None
+        self._loop = None
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'tokens_reserved': 0}
+    
+    async def generate(self, prompt, generation_config=None):
+        """
+        Send one prompt and return the stripped response text (None if empty)
+        """
+        response = await self.generate_response(prompt, generation_config)
+        record_usage(prompt, response.text, response)
+        return response.text.strip() if response.text else None
+    
+    async def generate_response(self, prompt, generation_config=None, model=None):
+        """
+        Send one prompt and return the model's response object, with its
+        finish reason and usage metadata; token usage is not recorded
+        
+        Args:
+            prompt (str): Prompt to send
+            generation_config: GenerationConfig or dict
+            model: Model to send the prompt to instead of the client's own,
+                sharing the client's rate limits
+        """
+        model = model if model is not None else self.model
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        
+        tokens = estimate_tokens(prompt) + self.output_token_reserve
+        if isinstance(generation_config, dict):
+            generation_config = genai.types.GenerationConfig(**generation_config)
+        
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens)
+            self._stats['requests'] += 1
+            self._stats['tokens_reserved'] += tokens
+            try:
+                async with self._semaphore:
+                    with timed('model'):
+                        return await model.generate_content_async(
+                            prompt,
+                            generation_config=generation_config
+                        )
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._stats['failures'] += 1
+                    raise
+                delay = self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+                attempt += 1
+                self._stats['retries'] += 1
+                count('retries', client='gemini')
+                print(f"Gemini request throttled ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+    
+    async def generate_many(self, prompts, generation_config=None):
+        """
+        Run several prompts concurrently
+        
+        Returns:
+            list: Response text or the raised exception, in prompt order
+        """
+        return await asyncio.gather(
+            *(self.generate(prompt, generation_config) for prompt in prompts),
+            return_exceptions=True
+        )
+    
+    def stats(self):
+        """
+        Return request, retry and failure counters
+        """
+        return dict(self._stats)
@@ -0,0 +1,228 @@
+import re
+from urllib.parse import urljoin
+import lxml.html
+from lxml import etree
+
+# Elements whose content is never page text
+_SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe'}
+
+# Elements that start a new line in the extracted text
+_BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr',
+    'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul',
+}
+
+_WHITESPACE = re.compile(r'\s+')
+
+_HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+def _unique(values):
+    seen = set()
+    return [value for value in values if not (value in seen or seen.add(value))]
+
+def _page_text(root):
+    """
+    Collect visible text, one line per block element
+    """
+    parts = []
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        block = element.tag in _BLOCK_TAGS
+        if event == 'start':
+            if block:
+                parts.append('\n')
+            if element.text:
+                parts.append(_WHITESPACE.sub(' ', element.text))
+        else:
+            if block:
+                parts.append('\n')
+            if element.tail and element is not root:
+                parts.append(_WHITESPACE.sub(' ', element.tail))
+    
+    lines = (line.strip() for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+def _meta_content(root, *names):
+    for meta in root.iter('meta'):
+        key = (meta.get('name') or meta.get('property') or '').lower()
+        if key in names and meta.get('content'):
+            return meta.get('content').strip()
+    return ''
+
+def extract_content_from_html(html, url='', encoding=None):
+    """
+    Extract relevant content from an HTML page
+    Returns structured data in the same shape as extract_content_from_json
+    
+    Args:
+        html (bytes or str): Page source
+        url (str): Page URL, used to resolve relative links and images
+        encoding (str): Character encoding of byte input, if known
+    
+    Returns:
+        dict: title, text, links, images, meta, headings and url
+    """
+    if not html:
+        return None
+    
+    parser = lxml.html.HTMLParser(encoding=encoding) if encoding and isinstance(html, bytes) else None
+    root = lxml.html.fromstring(html, parser=parser)
+    # Removing comments keeps the text around them joined
+    etree.strip_tags(root, etree.Comment, etree.ProcessingInstruction)
+    for element in root.xpath('|'.join(f'//{tag}' for tag in _SKIP_TAGS)):
+        element.drop_tree()
+    
+    base = root.xpath('string(//base/@href)') or url
+    
+    title = root.xpath('string(//title)').strip() or _meta_content(root, 'og:title')
+    
+    body = root.find('body')
+    text = _page_text(body if body is not None else root)
+    
+    links = []
+    for href in root.xpath('//a/@href'):
+        href = href.strip()
+        if not href or href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+            continue
+        links.append(urljoin(base, href))
+    
+    images = []
+    for src in root.xpath('//img/@src'):
+        src = src.strip()
+        if src and not src.startswith('data:'):
+            images.append(urljoin(base, src))
+    
+    headings = []
+    for element in root.iter(*_HEADING_TAGS):
+        heading = ' '.join(element.text_content().split())
+        if heading:
+            headings.append(heading)
+    
+    return {
+        'title': title,
+        'text': text,
+        'links': _unique(links),
+        'images': _unique(images),
+        'meta': {
+            'description': _meta_content(root, 'description', 'og:description'),
+            'keywords': _meta_content(root, 'keywords'),
+            'author': _meta_content(root, 'author', 'article:author')
+        },
+        'headings': headings,
+        'url': url
+    }
+
+def iter_html_events(pieces, url='', encoding=None):
+    """
+    Extract page content incrementally from HTML arriving in pieces
+    
+    The page is fed to lxml's pull parser piece by piece and every finished
+    element is dropped from the tree, so memory stays flat however large the
+    page is and the first text blocks come out before the download ends.
+    
+    Args:
+        pieces (iterable): HTML as bytes or str pieces, e.g. response.iter_content()
+        url (str): Page URL, used to resolve relative links and images
+        encoding (str): Character encoding of byte pieces, if known
+    
+    Yields:
+        tuple: (kind, value) with kind one of 'title', 'text', 'heading',
+            'link', 'image' or 'meta' (value is a (name, content) pair).
+            Headings are yielded just before their text line.
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding, remove_comments=True, remove_pis=True)
+    base = url
+    line = []
+    skip_depth = 0
+    head_depth = 0
+    seen_links = set()
+    seen_images = set()
+    
+    def add_text(text):
+        if text and not skip_depth and not head_depth:
+            line.append(_WHITESPACE.sub(' ', text))
+    
+    def end_line():
+        text = ''.join(line).strip()
+        line.clear()
+        return text
+    
+    def handle(event, element):
+        nonlocal base, skip_depth, head_depth
+        tag = element.tag
+        if event == 'start':
+            # Text between the previous sibling (or the parent's start) and here
+            parent = element.getparent()
+            previous = element.getprevious()
+            if previous is not None:
+                add_text(previous.tail)
+                # Earlier siblings are complete and their text has been used
+                while element.getprevious() is not None:
+                    del parent[0]
+            elif parent is not None:
+                add_text(parent.text)
+            
+            if tag in _SKIP_TAGS:
+                skip_depth += 1
+            elif tag == 'head':
+                head_depth += 1
+            if tag in _BLOCK_TAGS:
+                text = end_line()
+                if text:
+                    yield 'text', text
+            if tag == 'base' and element.get('href'):
+                base = urljoin(url, element.get('href').strip())
+            elif tag == 'meta':
+                key = (element.get('name') or element.get('property') or '').lower()
+                if key and element.get('content'):
+                    yield 'meta', (key, element.get('content').strip())
+            elif tag == 'a' and not skip_depth:
+                href = (element.get('href') or '').strip()
+                if href and not href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+                    link = urljoin(base, href)
+                    if link not in seen_links:
+                        seen_links.add(link)
+                        yield 'link', link
+            elif tag == 'img' and not skip_depth:
+                src = (element.get('src') or '').strip()
+                if src and not src.startswith('data:'):
+                    image = urljoin(base, src)
+                    if image not in seen_images:
+                        seen_images.add(image)
+                        yield 'image', image
+        else:
+            children = len(element)
+            add_text(element[-1].tail if children else element.text)
+            
+            if tag == 'title' and not skip_depth:
+                yield 'title', ' '.join(''.join(element.itertext()).split())
+            elif tag in _SKIP_TAGS:
+                skip_depth -= 1
+            elif tag == 'head':
+                head_depth -= 1
+            if tag in _BLOCK_TAGS:
+                text = end_line()
+                if text:
+                    if tag in _HEADING_TAGS:
+                        yield 'heading', text
+                    yield 'text', text
+            element.clear(keep_tail=True)
+    
+    for piece in pieces:
+        if not piece:
+            continue
+        parser.feed(piece)
+        for event, element in parser.read_events():
+            yield from handle(event, element)
+    
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        # Empty or truncated documents; whatever was parsed has been yielded
+        pass
+    for event, element in parser.read_events():
+        yield from handle(event, element)
+    
+    text = end_line()
+    if text:
+        yield 'text', text
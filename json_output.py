@@ -0,0 +1,280 @@
+import json
+import re
+
+# Schema keywords Gemini's response_schema understands
+_GEMINI_SCHEMA_KEYS = {'type', 'format', 'description', 'nullable', 'enum', 'items', 'properties', 'required'}
+
+_TYPES = {
+    'string': str,
+    'integer': int,
+    'number': (int, float),
+    'boolean': bool,
+    'array': list,
+    'object': dict,
+    'null': type(None),
+}
+
+def to_response_schema(schema):
+    """
+    Convert a JSON Schema into the subset Gemini accepts as response_schema
+    
+    Unsupported keywords (additionalProperties, minimum, pattern, ...) are
+    dropped; they are still enforced afterwards by validate_json. A type list
+    such as ["string", "null"] becomes a nullable type.
+    """
+    if not isinstance(schema, dict):
+        return schema
+    converted = {}
+    for key, value in schema.items():
+        if key not in _GEMINI_SCHEMA_KEYS:
+            continue
+        if key == 'type' and isinstance(value, list):
+            types = [t for t in value if t != 'null']
+            value = types[0] if types else 'string'
+            if 'null' in schema['type']:
+                converted['nullable'] = True
+        elif key == 'items':
+            value = to_response_schema(value)
+        elif key == 'properties':
+            value = {name: to_response_schema(sub) for name, sub in value.items()}
+        converted[key] = value
+    return converted
+
+def _type_matches(value, expected):
+    # bool is a subclass of int, but true is not a number in JSON
+    if isinstance(value, bool) and expected in ('integer', 'number'):
+        return False
+    return isinstance(value, _TYPES.get(expected, object))
+
+def validate_json(value, schema, path='$'):
+    """
+    Check a parsed JSON value against a JSON Schema
+    
+    Supports type, enum, const, properties, required, additionalProperties,
+    items, minItems, maxItems, minimum, maximum, minLength, maxLength and
+    pattern, which covers what extraction schemas use.
+    
+    Returns:
+        list: Error messages such as "$.items[2].price: expected number", empty if valid
+    """
+    if not isinstance(schema, dict):
+        return []
+    errors = []
+    
+    expected = schema.get('type')
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if schema.get('nullable'):
+            types = types + ['null']
+        if not any(_type_matches(value, t) for t in types):
+            return [f"{path}: expected {' or '.join(types)}, got {type(value).__name__}"]
+    
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if 'const' in schema and value != schema['const']:
+        errors.append(f"{path}: expected {schema['const']!r}")
+    
+    if isinstance(value, dict):
+        properties = schema.get('properties', {})
+        for name in schema.get('required', []):
+            if name not in value:
+                errors.append(f"{path}: missing required property '{name}'")
+        additional = schema.get('additionalProperties', True)
+        for name, item in value.items():
+            if name in properties:
+                errors.extend(validate_json(item, properties[name], f"{path}.{name}"))
+            elif additional is False:
+                errors.append(f"{path}: unexpected property '{name}'")
+            elif isinstance(additional, dict):
+                errors.extend(validate_json(item, additional, f"{path}.{name}"))
+    elif isinstance(value, list):
+        if 'minItems' in schema and len(value) < schema['minItems']:
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if 'items' in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate_json(item, schema['items'], f"{path}[{i}]"))
+    elif isinstance(value, str):
+        if 'minLength' in schema and len(value) < schema['minLength']:
+            errors.append(f"{path}: shorter than {schema['minLength']} characters")
+        if 'maxLength' in schema and len(value) > schema['maxLength']:
+            errors.append(f"{path}: longer than {schema['maxLength']} characters")
+        if 'pattern' in schema and not re.search(schema['pattern'], value):
+            errors.append(f"{path}: does not match pattern {schema['pattern']!r}")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f"{path}: less than {schema['minimum']}")
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f"{path}: greater than {schema['maximum']}")
+    return errors
+
+def coerce_json(value, schema):
+    """
+    Apply safe fixes for common near-misses: a single item where an array is
+    expected, numbers or booleans sent as strings, and unexpected properties
+    where additionalProperties is false
+    """
+    if not isinstance(schema, dict):
+        return value
+    expected = schema.get('type')
+    
+    if expected == 'array' and not isinstance(value, list) and value is not None:
+        value = [value]
+    elif expected in ('integer', 'number') and isinstance(value, str):
+        cleaned = re.sub(r'[^\d.eE+-]', '', value)
+        try:
+            number = float(cleaned)
+            value = int(number) if expected == 'integer' and number.is_integer() else number
+        except ValueError:
+            pass
+    elif expected == 'boolean' and isinstance(value, str) and value.strip().lower() in ('true', 'false', 'yes', 'no'):
+        value = value.strip().lower() in ('true', 'yes')
+    elif expected == 'string' and isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    
+    if isinstance(value, list) and 'items' in schema:
+        value = [coerce_json(item, schema['items']) for item in value]
+    elif isinstance(value, dict):
+        properties = schema.get('properties', {})
+        if schema.get('additionalProperties') is False:
+            value = {name: item for name, item in value.items() if name in properties}
+        value = {name: coerce_json(item, properties.get(name)) for name, item in value.items()}
+    return value
+
+def strip_code_fence(text):
+    """
+    Remove a surrounding ``` fence (e.g. ```json ... ```) from a model response
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+def _strip_trailing_commas(text):
+    """
+    Remove commas directly before a closing bracket, leaving string values
+    such as "a, ]" alone
+    """
+    drop = []
+    in_string = escaped = False
+    last_comma = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == ',':
+            last_comma = i
+        elif char in '}]':
+            if last_comma is not None:
+                drop.append(last_comma)
+            last_comma = None
+        elif not char.isspace():
+            last_comma = None
+            in_string = char == '"'
+    if not drop:
+        return text
+    pieces, start = [], 0
+    for i in drop:
+        pieces.append(text[start:i])
+        start = i + 1
+    pieces.append(text[start:])
+    return ''.join(pieces)
+
+def _close_truncated(text):
+    """
+    Yield candidate completions of a JSON document cut off part-way, longest
+    first. The last, possibly incomplete, item is always dropped.
+    """
+    stack = []
+    in_string = escaped = False
+    # Positions after which the document can be closed cleanly, with the
+    # brackets open at that point
+    safe_points = []
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if stack and stack[-1] == '[':
+                    safe_points.append((i + 1, list(stack)))
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append(char)
+            if len(stack) == 1:
+                safe_points.append((i + 1, list(stack)))
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            safe_points.append((i + 1, list(stack)))
+        elif char == ',':
+            safe_points.append((i, list(stack)))
+    
+    closers = {'{': '}', '[': ']'}
+    for end, open_brackets in reversed(safe_points):
+        yield text[:end].rstrip().rstrip(',') + ''.join(closers[c] for c in reversed(open_brackets))
+
+def repair_json(text):
+    """
+    Parse a model response as JSON, repairing common defects: a code fence
+    or prose around the JSON, trailing commas, and output cut off part-way
+    (e.g. at the token limit), which is closed after the last complete item
+    
+    Returns:
+        The parsed value
+    
+    Raises:
+        ValueError: If no JSON value can be recovered
+    """
+    text = strip_code_fence(text)
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object or array in the response")
+    text = text[min(starts):]
+    text = _strip_trailing_commas(text)
+    
+    decoder = json.JSONDecoder()
+    try:
+        # Complete value followed by prose
+        return decoder.raw_decode(text)[0]
+    except ValueError:
+        pass
+    for candidate in _close_truncated(text):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise ValueError("Response is not valid JSON and could not be repaired")
+
+def check_json(text, schema=None):
+    """
+    Parse, repair, coerce and validate a JSON response
+    
+    Returns:
+        tuple: (parsed value or None, list of problems; empty if the value is usable)
+    """
+    try:
+        value = repair_json(text)
+    except ValueError as e:
+        return None, [str(e)]
+    if schema:
+        value = coerce_json(value, schema)
+        return value, validate_json(value, schema)
+    return value, []
@@ -4,9 +4,129 @@ from datetime import datetime
 from scrape import (
     scrape_and_process,
     split_content,
-    clean_text_content
+    SCRAPE_CACHE_TTL
 )
-from parser import parse_with_gemini, parse_with_gemini_structured
+from cleaning import clean_text
+from metrics import Metrics, count, get_metrics, trace
+from parser import (
+    parse_with_gemini,
+    parse_with_gemini_map_reduce,
+    stream_with_gemini_structured,
+    prefilter_chunks,
+    check_json_result,
+    DocumentContext
+)
+
+# Estimated tokens sent to the AI when only relevant parts are used
+RELEVANCE_TOKEN_BUDGET = 6000
+
+# Rows per page in the Detailed Analysis link, image and heading lists
+LIST_PAGE_SIZE = 200
+
+class ScrapeFailed(Exception):
+    """
+    Raised inside the cached page loader so failed scrapes are not cached
+    """
+
+@st.cache_data(ttl=SCRAPE_CACHE_TTL, max_entries=128, show_spinner=False)
+def _load_page(url, scrape_format, _computed):
+    scraped_data = scrape_and_process(url, return_format=scrape_format)
+    if not scraped_data:
+        raise ScrapeFailed(url)
+    text_content = scraped_data.get('text', '') if scrape_format == "json" else scraped_data
+    cleaned_text, text_stats = clean_text(text_content)
+    _computed.append(True)
+    return scraped_data, cleaned_text, text_stats
+
+def load_page(url, scrape_format):
+    """
+    Scrape and clean a page, sharing the result with every session on this server
+    
+    Streamlit re-runs the script on every interaction and each browser has
+    its own session state, so pages are kept in a process-wide cache for
+    SCRAPE_CACHE_TTL seconds. Model responses are already shared through
+    the parser's result cache.
+    
+    Returns:
+        tuple: (scraped data or None if the scrape failed, cleaned text,
+            text stats, whether the page came from the shared cache)
+    """
+    computed = []
+    try:
+        scraped_data, cleaned_text, text_stats = _load_page(url, scrape_format, computed)
+    except ScrapeFailed:
+        return None, "", None, False
+    from_cache = not computed
+    count('cache_hits' if from_cache else 'cache_misses', cache='app')
+    return scraped_data, cleaned_text, text_stats, from_cache
+
+def show_parsed_result(placeholder, parsed_result, output_format, partial=False):
+    """
+    Render a (possibly still streaming) parse result into a placeholder
+    """
+    if output_format == "json":
+        if not partial:
+            try:
+                placeholder.json(json.loads(parsed_result))
+                return
+            except ValueError:
+                pass
+        placeholder.code(parsed_result, language='json')
+    elif output_format == "markdown":
+        placeholder.markdown(parsed_result)
+    else:
+        placeholder.write(parsed_result)
+
+def show_item_list(items, noun, key, links=False):
+    """
+    Render a long list as one scrollable table, a page at a time
+    
+    A single table element replaces one st.write per item, and only the
+    current page is sent to the browser on each rerun.
+    """
+    st.write(f"**Found {len(items):,} {noun}:**")
+    start = 0
+    if len(items) > LIST_PAGE_SIZE:
+        pages = -(-len(items) // LIST_PAGE_SIZE)
+        page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key=key)
+        start = (page - 1) * LIST_PAGE_SIZE
+    
+    rows = [str(item) for item in items[start:start + LIST_PAGE_SIZE]]
+    column = noun.capitalize()
+    st.dataframe(
+        {'#': list(range(start + 1, start + len(rows) + 1)), column: rows},
+        hide_index=True,
+        column_config={column: st.column_config.LinkColumn(column)} if links else None
+    )
+
+def show_pipeline_metrics(snapshot):
+    """
+    Render stage timings and counters from a metrics snapshot
+    """
+    if snapshot['stages']:
+        st.table([
+            {
+                'Stage': stage,
+                'Runs': entry['count'],
+                'Total (ms)': f"{entry['total_ms']:,.2f}",
+                'Max (ms)': f"{entry['max_ms']:,.2f}"
+            }
+            for stage, entry in snapshot['stages'].items()
+        ])
+    
+    counters = snapshot['counters']
+    cache_hits = sum(counters.get('cache_hits', {}).values())
+    cache_lookups = cache_hits + sum(counters.get('cache_misses', {}).values())
+    retries = sum(counters.get('retries', {}).values())
+    st.caption(f"⬇️ {counters.get('bytes_fetched', 0) / 1024:,.1f} KB fetched")
+    st.caption(
+        f"🔤 {counters.get('prompt_tokens', 0):,} prompt / {counters.get('response_tokens', 0):,} response tokens "
+        f"in {counters.get('model_calls', 0):,} AI calls"
+    )
+    st.caption(f"♻️ {cache_hits:,} of {cache_lookups:,} cache lookups hit · 🔁 {retries:,} retries")
+    if counters.get('route_calls'):
+        routes = ', '.join(f"{route} ×{calls}" for route, calls in counters['route_calls'].items())
+        st.caption(f"🧭 Model routes: {routes}")
 
 # Page configuration
 st.set_page_config(
@@ -134,12 +254,14 @@ with col1:
     # Scraping logic
     if scrape_button:
         if url:
-            with st.spinner("🔍 Scraping website..."):
+            # Timings and counters for this page, shown under Content Stats
+            st.session_state.page_metrics = Metrics()
+            with st.spinner("🔍 Scraping website..."), trace(st.session_state.page_metrics):
                 progress_bar = st.progress(0)
                 
                 try:
                     progress_bar.progress(25)
-                    scraped_data = scrape_and_process(url, return_format=scrape_format)
+                    scraped_data, cleaned_text, text_stats, from_cache = load_page(url, scrape_format)
                     progress_bar.progress(100)
                     
                     if scraped_data:
@@ -148,13 +270,15 @@ with col1:
                             ✅ <strong>Website scraped successfully!</strong>
                         </div>
                         """, unsafe_allow_html=True)
+                        if from_cache:
+                            st.caption("⚡ Served from the shared page cache")
                         
                         if scrape_format == "json":
                             st.session_state.scraped_data = scraped_data
                             st.session_state.content_format = "json"
                             
                             text_content = scraped_data.get('text', '')
-                            st.session_state.text_content = clean_text_content(text_content)
+                            st.session_state.text_content, st.session_state.text_stats = cleaned_text, text_stats
                             
                             # Display summary with metrics
                             st.markdown('<div class="step-header">📊 Content Summary</div>', unsafe_allow_html=True)
@@ -189,7 +313,7 @@ with col1:
                                 st.json(scraped_data)
                                 
                         elif scrape_format == "text":
-                            st.session_state.text_content = scraped_data
+                            st.session_state.text_content, st.session_state.text_stats = cleaned_text, text_stats
                             st.session_state.content_format = "text"
                             
                             st.metric("📝 Text Length", f"{len(scraped_data):,} characters")
@@ -235,31 +359,126 @@ with col1:
         with col2_2:
             st.write("")
             parse_button = st.button("🧠 Parse with AI", type="primary")
+        
+        chunk_mode = st.checkbox(
+            "⚡ Parse chunks in parallel",
+            value=False,
+            help="Extract from each part of the page separately and merge the results. Faster on large pages; not suited to summaries."
+        )
+        
+        relevance_mode = st.checkbox(
+            "🎯 Send only relevant parts",
+            value=False,
+            help="Score each part of the page against your request locally and send only the best matches to the AI. Much cheaper on long pages; skipped when nothing matches."
+        )
+
+        multi_question = st.checkbox(
+            "❓ Several questions (one per line)",
+            value=False,
+            help="Answer each line as a separate question. The page is sent once and kept in the AI's context cache, so follow-up questions are much cheaper."
+        )
+
+        json_schema = None
+        schema_error = None
+        # Several questions get several differently shaped answers, so no schema applies
+        if output_format == "json" and not multi_question:
+            with st.expander("📐 JSON Schema (optional)", expanded=False):
+                schema_text = st.text_area(
+                    "Schema the result must follow",
+                    placeholder='{"type": "object", "properties": {"emails": {"type": "array", "items": {"type": "string"}}}, "required": ["emails"]}',
+                    height=150,
+                    help="A JSON Schema. The AI is constrained to it, and the result is validated and repaired automatically."
+                )
+            if schema_text.strip():
+                try:
+                    json_schema = json.loads(schema_text)
+                except ValueError as e:
+                    schema_error = str(e)
 
         if parse_button:
-            if parse_description:
-                with st.spinner("🤖 AI is analyzing the content..."):
+            if schema_error:
+                st.error(f"❌ Invalid JSON schema: {schema_error}")
+            elif parse_description:
+                page_metrics = st.session_state.setdefault('page_metrics', Metrics())
+                with st.spinner("🤖 AI is analyzing the content..."), trace(page_metrics):
                     try:
-                        content_chunks = split_content(st.session_state.text_content)
+                        headings = None
+                        if st.session_state.get("content_format") == "json":
+                            headings = st.session_state.scraped_data.get('headings')
+                        content_chunks = split_content(st.session_state.text_content, headings=headings)
                         
-                        parsed_result = parse_with_gemini_structured(
-                            content_chunks, 
-                            parse_description, 
-                            output_format=output_format
-                        )
+                        filter_report = None
+                        if relevance_mode and len(content_chunks) > 1:
+                            content_chunks, filter_report = prefilter_chunks(
+                                content_chunks,
+                                parse_description,
+                                token_budget=RELEVANCE_TOKEN_BUDGET
+                            )
                         
                         st.markdown('<div class="step-header">✨ Parsing Results</div>', unsafe_allow_html=True)
                         
-                        if output_format == "json":
-                            try:
-                                json_result = json.loads(parsed_result)
-                                st.json(json_result)
-                            except:
-                                st.code(parsed_result, language='json')
-                        elif output_format == "markdown":
-                            st.markdown(parsed_result)
+                        if filter_report and filter_report['filtered']:
+                            total_chunks = len(filter_report['kept']) + len(filter_report['dropped'])
+                            st.caption(
+                                f"🎯 Sent {len(filter_report['kept'])} of {total_chunks} parts "
+                                f"(~{filter_report['tokens_after']:,} of {filter_report['tokens_before']:,} tokens)"
+                            )
+                            if filter_report['dropped']:
+                                with st.expander("View skipped parts", expanded=False):
+                                    for dropped in filter_report['dropped']:
+                                        st.write(f"`#{dropped['index'] + 1}` (score {dropped['score']}, ~{dropped['tokens']:,} tokens) {dropped['preview']}…")
+                        
+                        result_placeholder = st.empty()
+                        if multi_question:
+                            # Reuse the cached page context until the page or its parts change
+                            document_context = st.session_state.get('document_context')
+                            if document_context is None or document_context.content_chunks != content_chunks:
+                                if document_context is not None:
+                                    document_context.close()
+                                document_context = st.session_state.document_context = DocumentContext(content_chunks)
+                            questions = [line.strip() for line in parse_description.splitlines() if line.strip()]
+                            answers = document_context.ask_many(questions, output_format=output_format)
+                            sections = []
+                            for question, answer in zip(questions, answers):
+                                if output_format == "json" and not answer.startswith("Error occurred"):
+                                    answer, json_problems = check_json_result(answer)
+                                    if json_problems:
+                                        st.warning(f"⚠️ {question}: the result is not valid JSON: " + "; ".join(json_problems[:5]))
+                                st.markdown(f"**❓ {question}**")
+                                show_parsed_result(st.empty(), answer, output_format)
+                                sections.append(f"## {question}\n\n{answer}")
+                            parsed_result = "\n\n".join(sections)
+                            result_placeholder = None
+                            if document_context.stats['context_cached']:
+                                st.caption("⚡ Page kept in the AI's context cache for follow-up questions")
+                        elif chunk_mode and len(content_chunks) > 1:
+                            parsed_result = parse_with_gemini_map_reduce(
+                                content_chunks,
+                                parse_description,
+                                output_format=output_format,
+                                schema=json_schema
+                            )
                         else:
-                            st.write(parsed_result)
+                            # Show the response as it is generated
+                            parsed_result = ""
+                            for piece in stream_with_gemini_structured(
+                                content_chunks,
+                                parse_description,
+                                output_format=output_format,
+                                schema=json_schema
+                            ):
+                                parsed_result += piece
+                                show_parsed_result(result_placeholder, parsed_result + " ▌", output_format, partial=True)
+                            parsed_result = parsed_result.strip()
+                        
+                        if output_format == "json" and not multi_question and not parsed_result.startswith("Error occurred"):
+                            # Fix fences, stray prose and truncation instead of re-running the parse
+                            parsed_result, json_problems = check_json_result(parsed_result, json_schema)
+                            if json_problems:
+                                st.warning("⚠️ The result does not fully match the schema: " + "; ".join(json_problems[:5]))
+                        
+                        if result_placeholder is not None:
+                            show_parsed_result(result_placeholder, parsed_result, output_format)
                         
                         st.session_state.parsed_result = parsed_result
                         st.session_state.parse_description = parse_description
@@ -294,16 +513,37 @@ with col2:
     if "text_content" in st.session_state:
         st.markdown('<div class="step-header">📈 Content Stats</div>', unsafe_allow_html=True)
         
-        text_len = len(st.session_state.text_content)
-        word_count = len(st.session_state.text_content.split())
+        text_stats = st.session_state.text_stats
         
-        st.metric("📝 Characters", f"{text_len:,}")
-        st.metric("💬 Words", f"{word_count:,}")
+        st.metric("📝 Characters", f"{text_stats['characters']:,}")
+        st.metric("💬 Words", f"{text_stats['words']:,}")
+        st.metric("📄 Lines", f"{text_stats['lines']:,}")
+        if text_stats['boilerplate_lines']:
+            st.caption(f"🧹 {text_stats['boilerplate_lines']:,} boilerplate lines removed")
         
         if st.session_state.get("content_format") == "json":
             scraped_data = st.session_state.scraped_data
             st.metric("🔗 Links", f"{len(scraped_data.get('links', [])):,}")
             st.metric("🖼️ Images", f"{len(scraped_data.get('images', [])):,}")
+        
+        if "page_metrics" in st.session_state:
+            with st.expander("⏱️ Pipeline Metrics", expanded=False):
+                show_pipeline_metrics(st.session_state.page_metrics.snapshot())
+                
+                # Totals for every page scraped and parsed by this server
+                all_metrics = get_metrics()
+                st.download_button(
+                    "📥 Prometheus metrics",
+                    data=all_metrics.to_prometheus(),
+                    file_name="scraper_metrics.prom",
+                    mime="text/plain"
+                )
+                st.download_button(
+                    "📥 JSON metrics",
+                    data=all_metrics.to_json(),
+                    file_name="scraper_metrics.json",
+                    mime="application/json"
+                )
 
 # Download section (full width)
 if "parsed_result" in st.session_state:
@@ -355,37 +595,24 @@ if "scraped_data" in st.session_state and st.session_state.get("content_format")
     # Create tabs for better organization
     tab1, tab2, tab3, tab4 = st.tabs(["🔗 Links", "🖼️ Images", "📋 Headings", "📄 Meta Info"])
     
+    # Page numbers restart for every scraped page
+    list_key = f"{scraped_data.get('url', '')}:{len(scraped_data.get('links', []))}"
+    
     with tab1:
         if scraped_data.get('links') and len(scraped_data['links']) > 0:
-            st.write(f"**Found {len(scraped_data['links']):,} links:**")
-            
-            # Show links in a more organized way
-            for i, link in enumerate(scraped_data['links'][:50], 1):  # Show first 50
-                st.write(f"`{i:02d}.` {link}")
-            
-            if len(scraped_data['links']) > 50:
-                st.info(f"... and {len(scraped_data['links']) - 50:,} more links")
+            show_item_list(scraped_data['links'], "links", f"links_page:{list_key}", links=True)
         else:
             st.info("No links found in the scraped content.")
     
     with tab2:
         if scraped_data.get('images') and len(scraped_data['images']) > 0:
-            st.write(f"**Found {len(scraped_data['images']):,} images:**")
-            
-            for i, img in enumerate(scraped_data['images'][:20], 1):  # Show first 20
-                st.write(f"`{i:02d}.` {img}")
-            
-            if len(scraped_data['images']) > 20:
-                st.info(f"... and {len(scraped_data['images']) - 20:,} more images")
+            show_item_list(scraped_data['images'], "images", f"images_page:{list_key}", links=True)
         else:
             st.info("No images found in the scraped content.")
     
     with tab3:
         if scraped_data.get('headings') and len(scraped_data['headings']) > 0:
-            st.write(f"**Found {len(scraped_data['headings']):,} headings:**")
-            
-            for i, heading in enumerate(scraped_data['headings'], 1):
-                st.write(f"`{i:02d}.` {heading}")
+            show_item_list(scraped_data['headings'], "headings", f"headings_page:{list_key}")
         else:
             st.info("No headings found in the scraped content.")
     
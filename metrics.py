@@ -0,0 +1,204 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Pipeline stages timed by scrape.py, cleaning.py and parser.py, in order
+STAGES = ('fetch', 'extract', 'clean', 'chunk', 'prompt', 'model')
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Counters recorded by the pipeline, with their Prometheus help text
+COUNTERS = {
+    'bytes_fetched': "Response bytes downloaded",
+    'prompt_tokens': "Prompt tokens sent to the model",
+    'cached_prompt_tokens': "Prompt tokens served from the model's context cache",
+    'response_tokens': "Response tokens received from the model",
+    'model_calls': "Requests sent to the model",
+    'route_calls': "Requests sent to the model, by route",
+    'cache_hits': "Cache lookups answered from the cache",
+    'cache_misses': "Cache lookups that missed",
+    'retries': "Requests retried after a throttling or server error",
+}
+
+class Metrics:
+    """
+    Thread-safe registry of per-stage latencies and pipeline counters
+    
+    Stage latencies are kept as count, sum, maximum and a cumulative
+    histogram over `buckets`; counters are summed per label set.
+    
+    Args:
+        buckets (tuple): Histogram bucket upper bounds in seconds
+    """
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, stage, seconds):
+        """
+        Record one run of a stage that took `seconds`
+        """
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.buckets)}
+            entry['count'] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+    
+    def inc(self, name, value=1, **labels):
+        """
+        Add `value` to a counter, e.g. inc('cache_hits', cache='scrape')
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def reset(self):
+        """
+        Clear all recorded values
+        """
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+    
+    def snapshot(self):
+        """
+        Return the recorded values as plain data
+        
+        Returns:
+            dict: 'stages' maps each stage to count, total_ms, mean_ms and
+                max_ms; 'counters' maps each counter to its value, or to a
+                dict of values by label value for labelled counters
+        """
+        with self._lock:
+            stages = {stage: dict(entry) for stage, entry in self._stages.items()}
+            counters = dict(self._counters)
+        
+        ordered = sorted(stages, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s))
+        snapshot = {'stages': {}, 'counters': {}}
+        for stage in ordered:
+            entry = stages[stage]
+            snapshot['stages'][stage] = {
+                'count': entry['count'],
+                'total_ms': round(entry['sum'] * 1000, 3),
+                'mean_ms': round(entry['sum'] * 1000 / entry['count'], 3),
+                'max_ms': round(entry['max'] * 1000, 3),
+            }
+        for (name, labels), value in sorted(counters.items()):
+            if labels:
+                snapshot['counters'].setdefault(name, {})[','.join(str(v) for _, v in labels)] = value
+            else:
+                snapshot['counters'][name] = value
+        return snapshot
+    
+    def to_json(self):
+        """
+        Return the snapshot as a JSON string
+        """
+        return json.dumps(self.snapshot(), indent=2)
+    
+    def to_prometheus(self, prefix='scraper'):
+        """
+        Render the values in the Prometheus text exposition format
+        
+        Stage latencies become a `<prefix>_stage_seconds` histogram labelled
+        by stage, and each counter a `<prefix>_<name>_total` counter.
+        """
+        with self._lock:
+            stages = {stage: dict(entry) for stage, entry in self._stages.items()}
+            counters = dict(self._counters)
+        
+        lines = []
+        if stages:
+            name = f"{prefix}_stage_seconds"
+            lines.append(f"# HELP {name} Time spent in each pipeline stage")
+            lines.append(f"# TYPE {name} histogram")
+            for stage in sorted(stages):
+                entry = stages[stage]
+                for bound, count in zip(self.buckets, entry['buckets']):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {entry["count"]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {entry["sum"]:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {entry["count"]}')
+        
+        for counter in sorted({name for name, _ in counters}):
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# HELP {name} {COUNTERS.get(counter, counter.replace('_', ' ').capitalize())}")
+            lines.append(f"# TYPE {name} counter")
+            for (key, labels), value in sorted(counters.items()):
+                if key != counter:
+                    continue
+                label_text = ','.join(f'{label}="{label_value}"' for label, label_value in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+_metrics = Metrics()
+# Extra registries collecting the values recorded in the current context
+_traces = contextvars.ContextVar('metrics_traces', default=())
+
+def get_metrics():
+    """
+    Return the process-wide registry every recorded value goes to
+    """
+    return _metrics
+
+@contextmanager
+def trace(collector=None):
+    """
+    Collect the values recorded inside the block into `collector`, or into a
+    fresh Metrics if none is given
+    
+    Values still go to the process-wide registry as well. The trace follows
+    asyncio tasks started inside the block; worker threads only see it when
+    run with contextvars.copy_context().run.
+        
+        with trace() as page_metrics:
+            data = scrape_and_process(url)
+        print(page_metrics.snapshot())
+    """
+    if collector is None:
+        collector = Metrics()
+    token = _traces.set(_traces.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        _traces.reset(token)
+
+def observe(stage, seconds):
+    """
+    Record one run of a stage in the global registry and any active traces
+    """
+    _metrics.observe(stage, seconds)
+    for collector in _traces.get():
+        collector.observe(stage, seconds)
+
+def count(name, value=1, **labels):
+    """
+    Add to a counter in the global registry and any active traces
+    """
+    if not value:
+        return
+    _metrics.inc(name, value, **labels)
+    for collector in _traces.get():
+        collector.inc(name, value, **labels)
+
+@contextmanager
+def timed(stage):
+    """
+    Time the block as one run of `stage`, including when it raises
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
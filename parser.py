@@ -1,29 +1,217 @@
 import google.generativeai as genai
 import os
-from dotenv import load_dotenv
+import re
+import json
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache import DiskCache, MemoryCache, make_cache_key
+from gemini_client import MODEL_NAME, AsyncGeminiClient, create_cached_model, get_model, record_usage
+from relevance import select_relevant_chunks
+from extractors import format_extraction, route_request, run_extractors
+from json_output import check_json, repair_json, strip_code_fence, to_response_schema
+from chunking import MARKDOWN_HEADING, estimate_tokens
+from metrics import count, timed
+from routing import DEFAULT_ROUTE, choose_route, get_route_stats, record_route_call
 
-# Load environment variables
-load_dotenv()
+GENERATION_CONFIG = {
+    'candidate_count': 1,
+    'max_output_tokens': 8192,
+    'temperature': 0.2,  # Lower temperature for more precise extraction
+}
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+# Bump whenever a prompt template changes so cached results are not reused
+PROMPT_VERSION = 1
 
-def parse_with_gemini(content_chunks, parse_description):
+# Cache of model responses; set PARSE_CACHE_PATH to keep results on disk
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", "")
+PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", 24 * 3600))
+
+_result_cache = None
+_result_cache_configured = False
+
+def set_result_cache(cache):
+    """
+    Replace the cache used for model responses
+    
+    Args:
+        cache: A cache.MemoryCache, cache.DiskCache or any object with the same
+            get/set interface; None disables result caching
+    """
+    global _result_cache, _result_cache_configured
+    _result_cache = cache
+    _result_cache_configured = True
+
+def get_result_cache():
+    """
+    Return the model response cache, creating the default one on first use
+    """
+    if not _result_cache_configured:
+        if PARSE_CACHE_PATH:
+            set_result_cache(DiskCache(PARSE_CACHE_PATH, ttl=PARSE_CACHE_TTL, max_bytes=256 * 1024 * 1024))
+        else:
+            set_result_cache(MemoryCache(max_entries=256, ttl=PARSE_CACHE_TTL))
+    return _result_cache
+
+def _cache_lookup(prompt_kind, key_parts, use_cache, read=True, route=None):
+    """
+    Look up a cached response
+    
+    With read=False only the cache and key are returned, for writing a fresh
+    response over a cached one. The route's model and output token cap are
+    part of the key (the default route gives the same keys as before routing).
+    
+    Returns:
+        tuple: (cache or None, cache key, cached response or None)
+    """
+    cache = get_result_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    
+    route = route or DEFAULT_ROUTE
+    generation_config = dict(GENERATION_CONFIG, max_output_tokens=route['max_output_tokens'])
+    cache_key = make_cache_key(route['model'], prompt_kind, PROMPT_VERSION, generation_config, key_parts)
+    if not read:
+        return cache, cache_key, None
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print("Using cached Gemini response")
+        count('cache_hits', cache='parse')
+    else:
+        count('cache_misses', cache='parse')
+    return cache, cache_key, cached
+
+def _generation_config(schema=None, route=None):
+    """
+    Build the generation config with the route's output token cap, asking
+    for JSON that follows `schema` if given
+    """
+    generation_config = dict(GENERATION_CONFIG, max_output_tokens=(route or DEFAULT_ROUTE)['max_output_tokens'])
+    if schema is None:
+        return genai.types.GenerationConfig(**generation_config)
+    return genai.types.GenerationConfig(
+        **generation_config,
+        response_mime_type="application/json",
+        response_schema=to_response_schema(schema)
+    )
+
+def _hit_token_limit(response):
+    """
+    Whether a response stopped because it reached max_output_tokens
+    """
+    for candidate in getattr(response, 'candidates', None) or []:
+        finish_reason = getattr(candidate, 'finish_reason', None)
+        if getattr(finish_reason, 'name', finish_reason) in ('MAX_TOKENS', 2):
+            return True
+    return False
+
+def _generate_cached(prompt_kind, prompt, key_parts, use_cache=True, schema=None, refresh=False, model=None, route=None, cache_result=True):
+    """
+    Send a prompt to Gemini, reusing a cached response for identical inputs
+    
+    Args:
+        prompt_kind (str): Name of the prompt template, part of the cache key
+        prompt (str): Fully rendered prompt
+        key_parts (tuple): Inputs the prompt was rendered from
+        use_cache (bool): Whether to read and write the result cache
+        schema (dict): JSON schema the response must follow, if any
+        refresh (bool): Ignore a cached response but cache the new one
+        model: Model to send the prompt to, e.g. one with a cached context;
+            defaults to the route's model
+        route (dict): Model and output token cap from routing.choose_route;
+            defaults to routing.DEFAULT_ROUTE. A response cut off by a lower
+            cap is generated again on the default route.
+        cache_result (bool): Write the response to the cache; callers that
+            validate it first store it themselves (see _generate_json)
+    
+    Returns:
+        str or None: Response text, or None if the model returned nothing
+    """
+    route = route or DEFAULT_ROUTE
+    if schema is not None:
+        key_parts = tuple(key_parts) + (schema,)
+    cache, cache_key, cached = _cache_lookup(prompt_kind, key_parts, use_cache, read=not refresh, route=route)
+    if cached is not None:
+        return cached
+    
+    if model is None:
+        model = get_model(route['model'])
+    started = time.perf_counter()
+    with timed('model'):
+        response = model.generate_content(
+            prompt,
+            generation_config=_generation_config(schema, route)
+        )
+    tokens = record_usage(prompt, response.text, response)
+    record_route_call(route, time.perf_counter() - started, *tokens)
+    
+    if route['max_output_tokens'] < DEFAULT_ROUTE['max_output_tokens'] and _hit_token_limit(response):
+        print(f"Response reached the {route['max_output_tokens']}-token cap of route '{route['name']}', retrying on the default route")
+        get_route_stats().record_escalation(route)
+        result = _generate_cached(prompt_kind, prompt, key_parts[:-1] if schema is not None else key_parts,
+                                  use_cache=use_cache, schema=schema, refresh=refresh, cache_result=cache_result)
+        # Remember the full answer for this route too, so it is not cut off again
+        if result and cache is not None and cache_result:
+            cache.set(cache_key, result)
+        return result
+    
+    if not response.text:
+        return None
+    
+    result = response.text.strip()
+    if cache is not None and cache_result:
+        cache.set(cache_key, result)
+    return result
+
+async def _generate_cached_async(prompt_kind, prompt, key_parts, client, use_cache=True, route=None):
+    """
+    Async counterpart of _generate_cached: the prompt is sent through an
+    AsyncGeminiClient, to the route's model, and cached under the same key
+    
+    Returns:
+        str or None: Response text, or None if the model returned nothing
+    """
+    route = route or DEFAULT_ROUTE
+    cache, cache_key, cached = _cache_lookup(prompt_kind, key_parts, use_cache, route=route)
+    if cached is not None:
+        return cached
+    
+    model = client.model if route['model'] == client.model_name else get_model(route['model'])
+    started = time.perf_counter()
+    response = await client.generate_response(prompt, _generation_config(route=route), model=model)
+    tokens = record_usage(prompt, response.text, response)
+    record_route_call(route, time.perf_counter() - started, *tokens)
+    
+    if route['max_output_tokens'] < DEFAULT_ROUTE['max_output_tokens'] and _hit_token_limit(response):
+        print(f"Response reached the {route['max_output_tokens']}-token cap of route '{route['name']}', retrying on the default route")
+        get_route_stats().record_escalation(route)
+        result = await _generate_cached_async(prompt_kind, prompt, key_parts, client, use_cache=use_cache)
+        if result and cache is not None:
+            cache.set(cache_key, result)
+        return result
+    
+    if not response.text:
+        return None
+    
+    result = response.text.strip()
+    if cache is not None:
+        cache.set(cache_key, result)
+    return result
+
+def parse_with_gemini(content_chunks, parse_description, use_cache=True):
     """
     Parse content using Gemini 2.0 Flash
     
     Args:
         content_chunks (list): List of content chunks to parse
         parse_description (str): Description of what to parse/extract
+        use_cache (bool): Reuse a cached response for identical inputs
     
     Returns:
         str: Parsed result from Gemini
     """
     try:
-        # Initialize Gemini 2.0 Flash model
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
         # Combine all chunks into one text (Gemini can handle large contexts)
         combined_content = "\n\n".join(str(chunk) for chunk in content_chunks)
         
@@ -47,21 +235,20 @@ INSTRUCTIONS:
 
 Please provide your analysis and extracted information below:
 """
-
+        
         # Generate response
         print("Sending request to Gemini 2.0 Flash...")
-        response = model.generate_content(
+        result = _generate_cached(
+            'basic',
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                candidate_count=1,
-                max_output_tokens=8192,
-                temperature=0.2,  # Lower temperature for more precise extraction
-            )
+            (combined_content, parse_description),
+            use_cache=use_cache,
+            route=choose_route(parse_description, "text", estimate_tokens(combined_content))
         )
         
-        if response.text:
+        if result:
             print("Successfully parsed content with Gemini!")
-            return response.text.strip()
+            return result
         else:
             return "No response generated. Please try again with a different request."
             
@@ -69,46 +256,65 @@ Please provide your analysis and extracted information below:
         print(f"Error parsing with Gemini: {str(e)}")
         return f"Error occurred while parsing: {str(e)}"
 
-def parse_with_gemini_structured(content_chunks, parse_description, output_format="text"):
+# Format-specific instructions
+FORMAT_INSTRUCTIONS = {
+    "json": "Format your response as valid JSON with appropriate keys and values.",
+    "markdown": "Format your response using proper Markdown syntax with headers, lists, and emphasis.",
+    "list": "Format your response as a clean, numbered or bulleted list.",
+    "text": "Format your response as clear, readable text with proper paragraphs."
+}
+
+# Reply a map-step prompt asks for when a chunk holds nothing relevant
+NO_RESULTS_MARKER = "NO_RESULTS"
+
+# Packing of small pages into shared prompts (see parse_documents_packed)
+PACK_TOKEN_BUDGET = 8000        # Estimated content tokens per packed prompt
+PACK_MAX_DOCUMENT_TOKENS = 1500  # Larger pages are always parsed on their own
+PACK_MAX_DOCUMENTS = 10
+
+def _build_structured_prompt(combined_content, parse_description, output_format, part=None, schema=None):
     """
-    Parse content using Gemini 2.0 Flash with structured output options
+    Render the structured extraction prompt
     
     Args:
-        content_chunks (list): List of content chunks to parse
+        combined_content (str): Web content to analyze
         parse_description (str): Description of what to parse/extract
         output_format (str): "text", "json", "markdown", or "list"
+        part (tuple): Optional (index, total) when the content is one chunk of a larger page
+        schema (dict): JSON schema the response must follow, for "json" output
     
     Returns:
-        str: Parsed result in specified format
+        str: The prompt
     """
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        combined_content = "\n\n".join(str(chunk) for chunk in content_chunks)
-        
-        # Format-specific instructions
-        format_instructions = {
-            "json": "Format your response as valid JSON with appropriate keys and values.",
-            "markdown": "Format your response using proper Markdown syntax with headers, lists, and emphasis.",
-            "list": "Format your response as a clean, numbered or bulleted list.",
-            "text": "Format your response as clear, readable text with proper paragraphs."
-        }
-        
-        prompt = f"""
+    with timed('prompt'):
+        format_instruction = FORMAT_INSTRUCTIONS.get(output_format, FORMAT_INSTRUCTIONS["text"])
+        if schema is not None:
+            format_instruction = f"Format your response as JSON that follows this JSON schema exactly: {json.dumps(schema, ensure_ascii=False)}"
+    
+        part_text = ""
+        not_found_instruction = "If the requested information is not found, clearly state that in the specified format"
+        if part:
+            part_text = f"\nCONTENT PART: {part[0]} of {part[1]} (extract only what appears in this part)\n"
+            not_found_instruction = f"If the requested information is not found in this part, respond with exactly {NO_RESULTS_MARKER}"
+        if schema is not None:
+            not_found_instruction = "If the requested information is not found, return JSON that follows the schema with empty lists and null values"
+    
+        return f"""
 You are an expert content parser and data extractor. Your task is to analyze the provided web content and extract specific information based on the user's request.
 
 USER REQUEST: {parse_description}
 
 OUTPUT FORMAT: {output_format.upper()}
-FORMAT INSTRUCTIONS: {format_instructions.get(output_format, format_instructions["text"])}
-
+FORMAT INSTRUCTIONS: {format_instruction}
+{part_text}
 WEB CONTENT TO ANALYZE:
 {combined_content}
 
 INSTRUCTIONS:
 1. Carefully analyze the provided web content
 2. Extract the information requested by the user
-3. {format_instructions.get(output_format, format_instructions["text"])}
-4. If the requested information is not found, clearly state that in the specified format
+3. {format_instruction}
+4. {not_found_instruction}
 5. Be precise and accurate in your extraction
 6. Provide context when necessary to make the extracted information meaningful
 7. Ensure your response follows the requested output format exactly
@@ -116,24 +322,933 @@ INSTRUCTIONS:
 Please provide your analysis and extracted information below:
 """
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                candidate_count=1,
-                max_output_tokens=8192,
-                temperature=0.2,
-            )
+def _repair_json_with_model(raw_result, problems, schema, use_cache=True):
+    """
+    Ask Gemini to fix a JSON response that failed validation
+    
+    Only the faulty response and the validation errors are sent, not the page
+    content, so a repair costs a fraction of re-running the extraction.
+    """
+    prompt = f"""
+The following JSON was extracted from a web page but does not follow the required JSON schema.
+
+JSON SCHEMA:
+{json.dumps(schema, ensure_ascii=False)}
+
+PROBLEMS:
+{chr(10).join(f"- {problem}" for problem in problems[:20])}
+
+JSON TO FIX:
+{raw_result}
+
+Return the corrected JSON only. Keep every value that fits the schema, convert values to the required types where possible, and drop values that cannot be fixed. Do not invent new data.
+"""
+    key_parts = (raw_result, tuple(problems))
+    repaired = _generate_cached('json_repair', prompt, key_parts, use_cache=use_cache, schema=schema, cache_result=False)
+    # Cache only repairs that validate, like _generate_json
+    if repaired and not check_json(repaired, schema)[1]:
+        cache, cache_key, _ = _cache_lookup('json_repair', key_parts + (schema,), use_cache, read=False)
+        if cache is not None:
+            cache.set(cache_key, repaired)
+    return repaired
+
+def check_json_result(result, schema=None, use_cache=True, repair_with_model=True):
+    """
+    Parse and validate a JSON extraction result, repairing it if needed
+    
+    Code fences, surrounding prose, trailing commas and truncated output are
+    fixed locally. If the value still breaks the schema, Gemini is asked to
+    correct just the JSON (see _repair_json_with_model).
+    
+    Args:
+        result (str): Model response
+        schema (dict): JSON schema to validate against, None to only check syntax
+        use_cache (bool): Reuse cached repair responses
+        repair_with_model (bool): Allow the Gemini repair step
+    
+    Returns:
+        tuple: (pretty-printed JSON, or the original text if nothing could be
+            parsed, and a list of remaining problems, empty if valid)
+    """
+    value, problems = check_json(result, schema)
+    if problems and schema is not None and repair_with_model:
+        print(f"JSON result has {len(problems)} problem(s), asking Gemini to repair it")
+        try:
+            repaired = _repair_json_with_model(result, problems, schema, use_cache)
+        except Exception as e:
+            print(f"JSON repair failed: {str(e)}")
+            repaired = None
+        if repaired:
+            repaired_value, repaired_problems = check_json(repaired, schema)
+            if repaired_value is not None and (value is None or len(repaired_problems) < len(problems)):
+                value, problems = repaired_value, repaired_problems
+    
+    if value is None:
+        return result, problems
+    return json.dumps(value, indent=2, ensure_ascii=False), problems
+
+def _generate_json(prompt_kind, prompt, key_parts, schema, use_cache=True, route=None):
+    """
+    Generate a schema-constrained response and make sure it validates
+    
+    An invalid response is repaired (locally, then with a JSON-only repair
+    prompt) before the prompt itself is run again, once, without the cache.
+    Only a result that validates is cached.
+    
+    Returns:
+        tuple: (JSON text or None, list of remaining problems)
+    """
+    def store(checked):
+        cache, cache_key, _ = _cache_lookup(prompt_kind, tuple(key_parts) + (schema,), use_cache, read=False, route=route)
+        if cache is not None:
+            cache.set(cache_key, checked)
+    
+    result = _generate_cached(prompt_kind, prompt, key_parts, use_cache=use_cache, schema=schema, route=route, cache_result=False)
+    if not result:
+        return None, []
+    checked, problems = check_json_result(result, schema, use_cache=use_cache)
+    if not problems:
+        store(checked)
+        return checked, []
+    
+    print("Re-running the extraction for output that could not be repaired")
+    result = _generate_cached(prompt_kind, prompt, key_parts, use_cache=use_cache, schema=schema, refresh=True, route=route, cache_result=False)
+    if not result:
+        return checked, problems
+    checked, problems = check_json_result(result, schema, use_cache=use_cache)
+    if not problems:
+        store(checked)
+    return checked, problems
+
+def prefilter_chunks(content_chunks, parse_description, token_budget=None, top_k=None):
+    """
+    Drop chunks that are irrelevant to the request before they reach Gemini
+    
+    Args:
+        content_chunks (list): List of content chunks
+        parse_description (str): Description of what to parse/extract
+        token_budget (int): Maximum estimated tokens to send
+        top_k (int): Maximum number of chunks to send
+    
+    Returns:
+        tuple: (chunks to send, report of what was kept and dropped)
+    """
+    kept, report = select_relevant_chunks(content_chunks, parse_description, token_budget=token_budget, top_k=top_k)
+    if report['filtered']:
+        print(
+            f"Relevance filter kept {len(report['kept'])} of {len(report['kept']) + len(report['dropped'])} chunks "
+            f"(~{report['tokens_after']:,} of {report['tokens_before']:,} tokens)"
         )
+    return kept, report
+
+def try_local_extraction(content_chunks, parse_description, output_format="text"):
+    """
+    Answer simple requests (emails, phone numbers, URLs, prices, dates) with
+    local pattern extractors instead of the model
+    
+    Args:
+        content_chunks (list): List of content chunks to parse
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+    
+    Returns:
+        str or None: Formatted result, or None if the request needs the model
+            or nothing was found locally
+    """
+    names = route_request(parse_description)
+    if not names:
+        return None
+    
+    text = "\n".join(str(chunk) for chunk in content_chunks)
+    results = run_extractors(text, names)
+    if not any(results.values()):
+        # Let the model try; it may spot obfuscated forms like "name at domain dot com"
+        return None
+    
+    print(f"Answered locally with extractors: {', '.join(names)}")
+    return format_extraction(results, output_format)
+
+def parse_with_gemini_structured(content_chunks, parse_description, output_format="text", use_cache=True, token_budget=None, allow_local=True, dedup_index=None, schema=None):
+    """
+    Parse content using Gemini 2.0 Flash with structured output options
+    
+    Args:
+        content_chunks (list): List of content chunks to parse
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+        use_cache (bool): Reuse a cached response for identical inputs
+        token_budget (int): If set, only the most relevant chunks up to this
+            many estimated tokens are sent (see prefilter_chunks)
+        allow_local (bool): Answer simple requests with local extractors
+            when possible (see try_local_extraction)
+        dedup_index (DuplicateIndex): If set, reuse the result of an earlier
+            page in the same job whose content is an exact or near duplicate
+        schema (dict): JSON schema for the result; implies "json" output. The
+            model is constrained to the schema and the result is validated
+            and repaired (see check_json_result)
+    
+    Returns:
+        str: Parsed result in specified format
+    """
+    try:
+        if schema is not None:
+            # Local extractors know nothing about the caller's schema
+            output_format, allow_local = "json", False
+        if allow_local:
+            local_result = try_local_extraction(content_chunks, parse_description, output_format)
+            if local_result is not None:
+                return local_result
+        
+        if token_budget is not None:
+            content_chunks, _ = prefilter_chunks(content_chunks, parse_description, token_budget=token_budget)
+        
+        combined_content = "\n\n".join(str(chunk) for chunk in content_chunks)
+        
+        dedup_scope = ('structured', parse_description, output_format, json.dumps(schema, sort_keys=True))
+        if dedup_index is not None:
+            reused, match = dedup_index.find(combined_content, dedup_scope)
+            if reused is not None:
+                print(f"Reusing the result of a duplicate page ({match} match)")
+                return reused
         
-        if response.text:
-            return response.text.strip()
+        prompt = _build_structured_prompt(combined_content, parse_description, output_format, schema=schema)
+        key_parts = (combined_content, parse_description, output_format)
+        route = choose_route(parse_description, output_format, estimate_tokens(combined_content), schema)
+        
+        if schema is not None:
+            result, problems = _generate_json('structured', prompt, key_parts, schema, use_cache=use_cache, route=route)
+            if problems:
+                print(f"Result still breaks the schema: {'; '.join(problems[:3])}")
+        else:
+            result = _generate_cached('structured', prompt, key_parts, use_cache=use_cache, route=route)
+        
+        if result:
+            if dedup_index is not None:
+                dedup_index.add(combined_content, result, dedup_scope)
+            return result
         else:
             return "No response generated. Please try again with a different request."
             
     except Exception as e:
         return f"Error occurred while parsing: {str(e)}"
 
-def parse_with_gemini_examples(content_chunks, parse_description, examples=None):
+def stream_with_gemini_structured(content_chunks, parse_description, output_format="text", use_cache=True, token_budget=None, allow_local=True, schema=None):
+    """
+    Streaming version of parse_with_gemini_structured
+    
+    Yields the response text piece by piece as Gemini generates it, so callers
+    can show output long before the full response is ready. Cached and local
+    results are yielded in one piece. The full response is cached once the
+    stream finishes; with a schema, only if it validates, so callers should
+    pass the joined result through check_json_result.
+    
+    Args:
+        content_chunks (list): List of content chunks to parse
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+        use_cache (bool): Reuse a cached response for identical inputs
+        token_budget (int): If set, only the most relevant chunks up to this
+            many estimated tokens are sent (see prefilter_chunks)
+        allow_local (bool): Answer simple requests with local extractors
+            when possible (see try_local_extraction)
+        schema (dict): JSON schema the streamed JSON must follow; implies "json" output
+    
+    Yields:
+        str: Pieces of the parsed result
+    """
+    try:
+        if schema is not None:
+            output_format, allow_local = "json", False
+        if allow_local:
+            local_result = try_local_extraction(content_chunks, parse_description, output_format)
+            if local_result is not None:
+                yield local_result
+                return
+        
+        if token_budget is not None:
+            content_chunks, _ = prefilter_chunks(content_chunks, parse_description, token_budget=token_budget)
+        
+        combined_content = "\n\n".join(str(chunk) for chunk in content_chunks)
+        key_parts = (combined_content, parse_description, output_format)
+        if schema is not None:
+            key_parts += (schema,)
+        # Streamed text cannot be taken back and re-run on a larger cap, so
+        # streams use the routed model but always the default output cap
+        route = dict(
+            choose_route(parse_description, output_format, estimate_tokens(combined_content), schema),
+            max_output_tokens=DEFAULT_ROUTE['max_output_tokens']
+        )
+        cache, cache_key, cached = _cache_lookup('structured', key_parts, use_cache, route=route)
+        if cached is not None:
+            yield cached
+            return
+        
+        prompt = _build_structured_prompt(combined_content, parse_description, output_format, schema=schema)
+        started = time.perf_counter()
+        response = get_model(route['model']).generate_content(
+            prompt,
+            generation_config=_generation_config(schema, route),
+            stream=True
+        )
+        
+        pieces = []
+        chunk = None
+        # Includes the time the caller spends on each piece between reads
+        with timed('model'):
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the final finish-reason chunk)
+                    continue
+                if text:
+                    pieces.append(text)
+                    yield text
+        
+        result = "".join(pieces).strip()
+        # The last chunk carries the usage totals for the whole response
+        tokens = record_usage(prompt, result, chunk)
+        record_route_call(route, time.perf_counter() - started, *tokens)
+        cut_off = _hit_token_limit(chunk)
+        if cut_off:
+            print(f"Response reached the {route['max_output_tokens']}-token output cap; not caching it")
+        if not result:
+            yield "No response generated. Please try again with a different request."
+        elif cache is not None and not cut_off and (schema is None or not check_json(result, schema)[1]):
+            cache.set(cache_key, result)
+            
+    except Exception as e:
+        yield f"Error occurred while parsing: {str(e)}"
+
+def _merge_json_values(a, b):
+    """
+    Merge two parsed JSON values: lists are concatenated without duplicates,
+    objects are merged key by key, and the first non-empty scalar wins
+    """
+    if isinstance(a, dict) and isinstance(b, dict):
+        merged = dict(a)
+        for key, value in b.items():
+            merged[key] = _merge_json_values(merged[key], value) if key in merged else value
+        return merged
+    
+    if isinstance(a, list) or isinstance(b, list):
+        items = (a if isinstance(a, list) else [a]) + (b if isinstance(b, list) else [b])
+        seen = set()
+        unique = []
+        for item in items:
+            marker = json.dumps(item, sort_keys=True, default=str)
+            if marker not in seen:
+                seen.add(marker)
+                unique.append(item)
+        return unique
+    
+    return a if a not in (None, "") else b
+
+def _merge_json_partials(partials):
+    merged = None
+    unparsed = []
+    for partial in partials:
+        try:
+            value = json.loads(strip_code_fence(partial))
+        except ValueError:
+            unparsed.append(partial)
+            continue
+        merged = value if merged is None else _merge_json_values(merged, value)
+    
+    if unparsed:
+        if merged is None:
+            merged = {}
+        if not isinstance(merged, dict):
+            merged = {"results": merged}
+        merged["unparsed_parts"] = unparsed
+    return json.dumps(merged, indent=2, ensure_ascii=False)
+
+def _merge_list_partials(partials):
+    numbered = False
+    items = []
+    seen = set()
+    for partial in partials:
+        for line in partial.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = re.match(r'^(?:[-*+\u2022]|\d+[.)])\s+(.*)$', line)
+            if match:
+                numbered = numbered or line[0].isdigit()
+                line = match.group(1).strip()
+            if line.lower() not in seen:
+                seen.add(line.lower())
+                items.append(line)
+    
+    if numbered:
+        return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+    return "\n".join(f"- {item}" for item in items)
+
+def _merge_markdown_partials(partials):
+    # Group content under its heading so repeated sections from different chunks combine
+    sections = {}
+    for partial in partials:
+        heading = ""
+        block = []
+        for line in partial.splitlines() + ["# "]:
+            if MARKDOWN_HEADING.match(line.lstrip()):
+                blocks, seen = sections.setdefault(heading, ([], set()))
+                kept = [l for l in block if not l.strip() or l.strip() not in seen]
+                seen.update(l.strip() for l in kept if l.strip())
+                text = "\n".join(kept).strip()
+                if text:
+                    blocks.append(text)
+                heading = line.strip()
+                block = []
+            else:
+                block.append(line)
+    
+    output = []
+    for heading, (blocks, _) in sections.items():
+        body = ""
+        for text in blocks:
+            # Keep list items from different chunks in one list
+            joiner = "\n" if re.match(r'^(?:[-*+]|\d+[.)])\s', text) else "\n\n"
+            body = f"{body}{joiner}{text}" if body else text
+        if heading and heading != "#":
+            output.append(f"{heading}\n\n{body}" if body else heading)
+        elif body:
+            output.append(body)
+    return "\n\n".join(output)
+
+def _merge_text_partials(partials):
+    paragraphs = []
+    seen = set()
+    for partial in partials:
+        for paragraph in re.split(r'\n\s*\n', partial):
+            paragraph = paragraph.strip()
+            if paragraph and paragraph not in seen:
+                seen.add(paragraph)
+                paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+def merge_partial_results(partials, output_format="text"):
+    """
+    Combine per-chunk extraction results into one result
+    
+    Args:
+        partials (list): Model responses, one per chunk, in chunk order
+        output_format (str): "text", "json", "markdown", or "list"
+    
+    Returns:
+        str: Merged result, or None if no chunk produced anything
+    """
+    partials = [
+        partial.strip() for partial in partials
+        if partial and partial.strip() and partial.strip() != NO_RESULTS_MARKER
+    ]
+    if not partials:
+        return None
+    
+    if output_format == "json":
+        return _merge_json_partials(partials)
+    elif output_format == "list":
+        return _merge_list_partials(partials)
+    elif output_format == "markdown":
+        return _merge_markdown_partials(partials)
+    return _merge_text_partials(partials)
+
+def parse_with_gemini_map_reduce(content_chunks, parse_description, output_format="text", max_workers=4, use_cache=True, token_budget=None, allow_local=True, dedup_index=None, schema=None):
+    """
+    Parse each content chunk independently and in parallel, then merge the results
+    
+    Unlike parse_with_gemini_structured, the chunks are never joined into one
+    prompt, so pages larger than the model context can be processed and large
+    pages finish faster. Best suited to extraction requests; requests that need
+    the whole page at once (e.g. summaries) should use the single-prompt mode.
+    
+    Args:
+        content_chunks (list): List of content chunks to parse
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+        max_workers (int): Maximum number of chunks sent to Gemini at once
+        use_cache (bool): Reuse cached responses for identical chunks
+        token_budget (int): If set, only the most relevant chunks up to this
+            many estimated tokens are parsed (see prefilter_chunks)
+        allow_local (bool): Answer simple requests with local extractors
+            when possible (see try_local_extraction)
+        dedup_index (DuplicateIndex): If set, chunks that are exact or near
+            duplicates of chunks parsed earlier in the job reuse their result
+        schema (dict): JSON schema for the result; implies "json" output. Each
+            chunk's result is validated as it arrives, and only chunks whose
+            output cannot be repaired are sent to the model again
+    
+    Returns:
+        str: Merged parsed result in specified format
+    """
+    content_chunks = [str(chunk) for chunk in content_chunks if chunk]
+    if schema is not None:
+        output_format, allow_local = "json", False
+    if allow_local:
+        local_result = try_local_extraction(content_chunks, parse_description, output_format)
+        if local_result is not None:
+            return local_result
+    if token_budget is not None:
+        content_chunks, _ = prefilter_chunks(content_chunks, parse_description, token_budget=token_budget)
+    if len(content_chunks) <= 1:
+        return parse_with_gemini_structured(
+            content_chunks, parse_description, output_format,
+            use_cache=use_cache, allow_local=False, dedup_index=dedup_index, schema=schema
+        )
+    
+    total = len(content_chunks)
+    dedup_scope = ('structured_map', parse_description, output_format, json.dumps(schema, sort_keys=True))
+    reused = [0]
+    
+    def parse_chunk(index):
+        chunk = content_chunks[index]
+        if dedup_index is not None:
+            result, match = dedup_index.find(chunk, dedup_scope)
+            if match:
+                reused[0] += 1
+                return result
+        
+        prompt = _build_structured_prompt(chunk, parse_description, output_format, part=(index + 1, total), schema=schema)
+        key_parts = (chunk, parse_description, output_format, index + 1, total)
+        route = choose_route(parse_description, output_format, estimate_tokens(chunk), schema)
+        if schema is not None:
+            result, problems = _generate_json('structured_map', prompt, key_parts, schema, use_cache=use_cache, route=route)
+            if problems:
+                raise ValueError(f"output breaks the schema: {'; '.join(problems[:3])}")
+        else:
+            result = _generate_cached('structured_map', prompt, key_parts, use_cache=use_cache, route=route)
+        if dedup_index is not None and result is not None:
+            dedup_index.add(chunk, result, dedup_scope)
+        return result
+    
+    print(f"Parsing {total} chunks with Gemini 2.0 Flash...")
+    partials = [None] * total
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Run each chunk in a copy of this context so active metrics traces see it
+        futures = {executor.submit(contextvars.copy_context().run, parse_chunk, i): i for i in range(total)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                partials[index] = future.result()
+            except Exception as e:
+                print(f"Error parsing chunk {index + 1}: {str(e)}")
+                errors.append(str(e))
+    if reused[0]:
+        print(f"Reused results for {reused[0]} duplicate chunks")
+    
+    if len(errors) == total:
+        return f"Error occurred while parsing: {errors[0]}"
+    
+    merged = merge_partial_results(partials, output_format)
+    if merged is None:
+        return "No response generated. Please try again with a different request."
+    if schema is not None:
+        # Partials are valid on their own; merging can still break limits such as maxItems
+        merged, problems = check_json_result(merged, schema, use_cache=use_cache, repair_with_model=False)
+        if problems:
+            print(f"Merged result breaks the schema: {'; '.join(problems[:3])}")
+    return merged
+
+def _build_packed_prompt(documents, parse_description, output_format):
+    """
+    Render one prompt asking for a separate result for each of several documents
+    
+    Args:
+        documents (list): (url, content) pairs, numbered from 1 in the prompt
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+    
+    Returns:
+        str: The prompt
+    """
+    with timed('prompt'):
+        format_instruction = FORMAT_INSTRUCTIONS.get(output_format, FORMAT_INSTRUCTIONS["text"])
+        if output_format == "json":
+            value_instruction = "Each value is the JSON result for that document"
+        else:
+            value_instruction = f"Each value is a string holding the result for that document. {format_instruction}"
+        
+        document_text = "\n\n".join(
+            f"=== DOCUMENT {i} ===\nURL: {url}\n{content}\n=== END DOCUMENT {i} ==="
+            for i, (url, content) in enumerate(documents, 1)
+        )
+        
+        return f"""
+You are an expert content parser and data extractor. Your task is to analyze several web pages and extract specific information from each one separately, based on the user's request.
+
+USER REQUEST: {parse_description}
+
+OUTPUT FORMAT: {output_format.upper()}
+FORMAT INSTRUCTIONS: {format_instruction}
+
+WEB CONTENT TO ANALYZE ({len(documents)} documents):
+{document_text}
+
+INSTRUCTIONS:
+1. Analyze every document on its own and never mix information between documents
+2. Extract the information requested by the user from each document
+3. Respond with a single JSON object and nothing else, with one key per document number, "1" to "{len(documents)}"
+4. {value_instruction}
+5. If the requested information is not found in a document, its value must clearly state that in the specified format
+6. Be precise and accurate in your extraction
+"""
+
+def _split_packed_result(result, total, output_format):
+    """
+    Split a packed response into per-document results
+    
+    Returns:
+        list: Result text for documents 1 to `total`, None where the response
+            has no usable value for that document
+    """
+    try:
+        value = repair_json(result)
+    except ValueError:
+        return [None] * total
+    if not isinstance(value, dict):
+        return [None] * total
+    
+    results = []
+    for i in range(1, total + 1):
+        item = value.get(str(i))
+        if item is None or (isinstance(item, str) and not item.strip()):
+            results.append(None)
+        elif output_format == "json":
+            if isinstance(item, str):
+                try:
+                    item = repair_json(item)
+                except ValueError:
+                    pass
+            results.append(json.dumps(item, indent=2, ensure_ascii=False))
+        elif isinstance(item, str):
+            results.append(item.strip())
+        else:
+            results.append(json.dumps(item, ensure_ascii=False))
+    return results
+
+def _pack_documents(documents, token_budget, max_documents):
+    """
+    Group (index, url, content) documents into packs of at most
+    `token_budget` estimated tokens and `max_documents` documents
+    """
+    packs = []
+    current, current_tokens = [], 0
+    for document in documents:
+        tokens = estimate_tokens(document[2])
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_documents):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(document)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+def parse_documents_packed(documents, parse_description, output_format="text", use_cache=True, allow_local=True,
+                           token_budget=PACK_TOKEN_BUDGET, max_document_tokens=PACK_MAX_DOCUMENT_TOKENS,
+                           max_documents=PACK_MAX_DOCUMENTS, max_workers=4, dedup_index=None):
+    """
+    Parse many small pages with a few shared prompts instead of one call each
+    
+    Small documents are packed, each tagged with its URL, into prompts of up
+    to `token_budget` estimated tokens, and the model returns a JSON object
+    keyed by document number that is split back into per-URL results. This
+    spreads the instruction preamble and the round trip over many pages.
+    Documents over `max_document_tokens`, and every document the packed
+    response has no usable result for (malformed or truncated output, a
+    failed call), are parsed on their own with parse_with_gemini_structured.
+    
+    Args:
+        documents (dict or list): URL -> content chunks, or (url, content
+            chunks) pairs; URLs must be unique
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+        use_cache (bool): Reuse cached per-document results
+        allow_local (bool): Answer simple requests with local extractors
+            when possible (see try_local_extraction)
+        token_budget (int): Maximum estimated content tokens per packed prompt
+        max_document_tokens (int): Larger documents are never packed
+        max_documents (int): Maximum documents per packed prompt
+        max_workers (int): Packed prompts sent to Gemini at once
+        dedup_index (DuplicateIndex): If set, pages duplicating ones parsed
+            earlier in the job reuse their result, as in
+            parse_with_gemini_structured
+    
+    Returns:
+        dict: URL -> parsed result, in input order
+    """
+    if isinstance(documents, dict):
+        documents = list(documents.items())
+    results = {url: None for url, _ in documents}
+    dedup_scope = ('structured', parse_description, output_format, json.dumps(None))
+    
+    packable, single = [], []
+    for url, content_chunks in documents:
+        if allow_local:
+            local_result = try_local_extraction(content_chunks, parse_description, output_format)
+            if local_result is not None:
+                results[url] = local_result
+                continue
+        content = "\n\n".join(str(chunk) for chunk in content_chunks)
+        if dedup_index is not None:
+            reused, match = dedup_index.find(content, dedup_scope)
+            if reused is not None:
+                results[url] = reused
+                continue
+        _, _, cached = _cache_lookup('packed_document', (content, parse_description, output_format), use_cache)
+        if cached is not None:
+            results[url] = cached
+        elif estimate_tokens(content) > max_document_tokens:
+            single.append((url, content_chunks))
+        else:
+            packable.append((url, content_chunks, content))
+    
+    def parse_pack(pack):
+        prompt = _build_packed_prompt([(url, content) for url, _, content in pack], parse_description, output_format)
+        # The per-document results are cached below, not the packed response
+        result = _generate_cached('packed', prompt, (), use_cache=False)
+        return _split_packed_result(result or "", len(pack), output_format)
+    
+    packs = []
+    for pack in _pack_documents(packable, token_budget, max(1, max_documents)):
+        if len(pack) > 1:
+            packs.append(pack)
+        else:
+            # Nothing to share the prompt with
+            single.append(pack[0][:2])
+    if packs:
+        print(f"Packing {sum(len(pack) for pack in packs)} small pages into {len(packs)} prompts...")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, parse_pack, pack): pack for pack in packs}
+        for future in as_completed(futures):
+            pack = futures[future]
+            try:
+                pack_results = future.result()
+            except Exception as e:
+                print(f"Packed prompt failed, parsing its pages one by one: {str(e)}")
+                pack_results = [None] * len(pack)
+            for (url, content_chunks, content), result in zip(pack, pack_results):
+                if result is None:
+                    single.append((url, content_chunks))
+                    continue
+                results[url] = result
+                cache, cache_key, _ = _cache_lookup('packed_document', (content, parse_description, output_format), use_cache, read=False)
+                if cache is not None:
+                    cache.set(cache_key, result)
+                if dedup_index is not None:
+                    dedup_index.add(content, result, dedup_scope)
+    
+    if single:
+        print(f"Parsing {len(single)} pages on their own")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run, parse_with_gemini_structured, content_chunks, parse_description,
+                    output_format, use_cache=use_cache, allow_local=False, dedup_index=dedup_index
+                ): url
+                for url, content_chunks in single
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    return results
+
+# Seconds the provider keeps a DocumentContext's cached page
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 600))
+
+CONTEXT_INSTRUCTIONS = """
+You are an expert content parser and data extractor. Your task is to analyze the provided web content and extract specific information based on each of the user's requests.
+
+INSTRUCTIONS:
+1. Carefully analyze the provided web content
+2. Extract the information requested by the user
+3. Format your response exactly as the request's format instructions say
+4. If the requested information is not found, clearly state that in the specified format
+5. Be precise and accurate in your extraction
+6. Provide context when necessary to make the extracted information meaningful
+"""
+
+class DocumentContext:
+    """
+    A scraped page prepared once for several extraction questions
+    
+    The instruction preamble and page content are stored in Gemini's context
+    cache on the first question (see gemini_client.create_cached_model), so
+    follow-up questions only send the question itself. Where context caching
+    is unavailable (small pages, unsupported models), the page is sent with
+    every question as before. Answers are cached per question, and
+    ask_many() can answer several questions with a single request.
+    
+    Args:
+        content_chunks (list): List of content chunks of the page
+        ttl (int): Seconds the provider keeps the cached context
+        use_cache (bool): Reuse cached answers for identical questions
+        allow_local (bool): Answer simple requests with local extractors
+            when possible (see try_local_extraction)
+    
+        with DocumentContext(chunks) as page:
+            emails = page.ask("Extract all email addresses", "json")
+            summary, prices = page.ask_many(["Summarize the page", "List all prices"])
+    """
+    
+    def __init__(self, content_chunks, ttl=CONTEXT_CACHE_TTL, use_cache=True, allow_local=True):
+        self.content_chunks = list(content_chunks)
+        self.content = "\n\n".join(str(chunk) for chunk in self.content_chunks)
+        self.ttl = ttl
+        self.use_cache = use_cache
+        self.allow_local = allow_local
+        self._model = None
+        self._release = None
+        self._prepared = False
+        self.stats = {'questions': 0, 'model_calls': 0, 'context_cached': False}
+    
+    def _context_model(self):
+        # Create the cached context on first use; None means send the page every time
+        if not self._prepared:
+            self._prepared = True
+            self._model, self._release = create_cached_model(
+                MODEL_NAME, CONTEXT_INSTRUCTIONS, f"WEB CONTENT TO ANALYZE:\n{self.content}", self.ttl
+            )
+            self.stats['context_cached'] = self._model is not None
+            if self._model is not None:
+                print("Page stored in the Gemini context cache")
+        return self._model
+    
+    def _generate(self, prompt_kind, prompt, key_parts):
+        model = self._context_model()
+        if model is None:
+            prompt = f"{CONTEXT_INSTRUCTIONS}\nWEB CONTENT TO ANALYZE:\n{self.content}\n{prompt}"
+        self.stats['model_calls'] += 1
+        # Answers are cached per question by _store_answer, not per prompt form
+        return _generate_cached(prompt_kind, prompt, (self.content,) + key_parts, use_cache=False, model=model)
+    
+    def _cached_answer(self, parse_description, output_format):
+        if self.allow_local:
+            local_result = try_local_extraction(self.content_chunks, parse_description, output_format)
+            if local_result is not None:
+                return local_result
+        return _cache_lookup('context_question', (self.content, parse_description, output_format), self.use_cache)[2]
+    
+    def _store_answer(self, parse_description, output_format, result):
+        cache, cache_key, _ = _cache_lookup(
+            'context_question', (self.content, parse_description, output_format), self.use_cache, read=False
+        )
+        if cache is not None:
+            cache.set(cache_key, result)
+    
+    def ask(self, parse_description, output_format="text"):
+        """
+        Answer one extraction question about the page
+        
+        Args:
+            parse_description (str): Description of what to parse/extract
+            output_format (str): "text", "json", "markdown", or "list"
+        
+        Returns:
+            str: Parsed result in specified format
+        """
+        self.stats['questions'] += 1
+        return self._answer(parse_description, output_format)
+    
+    def _answer(self, parse_description, output_format):
+        try:
+            cached = self._cached_answer(parse_description, output_format)
+            if cached is not None:
+                return cached
+            
+            with timed('prompt'):
+                format_instruction = FORMAT_INSTRUCTIONS.get(output_format, FORMAT_INSTRUCTIONS["text"])
+                prompt = f"""
+USER REQUEST: {parse_description}
+
+OUTPUT FORMAT: {output_format.upper()}
+FORMAT INSTRUCTIONS: {format_instruction}
+
+Please provide your analysis and extracted information below:
+"""
+            result = self._generate('context_question', prompt, (parse_description, output_format))
+            if not result:
+                return "No response generated. Please try again with a different request."
+            self._store_answer(parse_description, output_format, result)
+            return result
+        except Exception as e:
+            return f"Error occurred while parsing: {str(e)}"
+    
+    def ask_many(self, questions, output_format="text", combine=True):
+        """
+        Answer several extraction questions about the page
+        
+        With `combine`, the questions not answered from the cache are sent in
+        one request asking for a JSON object keyed by question number, like
+        parse_documents_packed. Questions the combined answer has no usable
+        value for are asked again on their own.
+        
+        Args:
+            questions (list): Descriptions of what to parse/extract
+            output_format (str): "text", "json", "markdown", or "list"
+            combine (bool): Answer the questions with a single request
+        
+        Returns:
+            list: Parsed results, in question order
+        """
+        self.stats['questions'] += len(questions)
+        answers = [None] * len(questions)
+        pending = []
+        for i, question in enumerate(questions):
+            cached = self._cached_answer(question, output_format)
+            if cached is not None:
+                answers[i] = cached
+            else:
+                pending.append(i)
+        
+        if combine and len(pending) > 1:
+            with timed('prompt'):
+                format_instruction = FORMAT_INSTRUCTIONS.get(output_format, FORMAT_INSTRUCTIONS["text"])
+                if output_format == "json":
+                    value_instruction = "Each value is the JSON answer to that request"
+                else:
+                    value_instruction = f"Each value is a string holding the answer to that request. {format_instruction}"
+                request_text = "\n".join(f"{n}. {questions[i]}" for n, i in enumerate(pending, 1))
+                prompt = f"""
+USER REQUESTS ({len(pending)}):
+{request_text}
+
+OUTPUT FORMAT: {output_format.upper()}
+FORMAT INSTRUCTIONS: {format_instruction}
+
+Answer every request on its own. Respond with a single JSON object and nothing else, with one key per request number, "1" to "{len(pending)}". {value_instruction}. If the information for a request is not found, its value must clearly state that in the specified format.
+"""
+            try:
+                result = self._generate('context_questions', prompt, (tuple(questions[i] for i in pending), output_format))
+                combined = _split_packed_result(result or "", len(pending), output_format)
+            except Exception as e:
+                print(f"Combined request failed, asking one question at a time: {str(e)}")
+                combined = [None] * len(pending)
+            for i, answer in zip(pending, combined):
+                if answer is not None:
+                    answers[i] = answer
+                    self._store_answer(questions[i], output_format, answer)
+            pending = [i for i in pending if answers[i] is None]
+        
+        for i in pending:
+            answers[i] = self._answer(questions[i], output_format)
+        return answers
+    
+    def close(self):
+        """
+        Release the cached context at the provider
+        """
+        if self._release is not None:
+            self._release()
+        self._model, self._release, self._prepared = None, None, False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_with_gemini_examples(content_chunks, parse_description, examples=None, use_cache=True):
     """
     Parse content using Gemini 2.0 Flash with example-based prompting
     
@@ -141,12 +1256,12 @@ def parse_with_gemini_examples(content_chunks, parse_description, examples=None)
         content_chunks (list): List of content chunks to parse
         parse_description (str): Description of what to parse/extract
         examples (list): Optional list of example extractions to guide the model
+        use_cache (bool): Reuse a cached response for identical inputs
     
     Returns:
         str: Parsed result with example-guided extraction
     """
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
         combined_content = "\n\n".join(str(chunk) for chunk in content_chunks)
         
         example_text = ""
@@ -175,24 +1290,103 @@ INSTRUCTIONS:
 
 Please provide your analysis and extracted information below:
 """
+        
+        result = _generate_cached(
+            'examples',
+            prompt,
+            (combined_content, parse_description, example_text),
+            use_cache=use_cache,
+            route=choose_route(parse_description, "text", estimate_tokens(combined_content))
+        )
+        
+        if result:
+            return result
+        else:
+            return "No response generated. Please try again with a different request."
+            
+    except Exception as e:
+        return f"Error occurred while parsing: {str(e)}"
 
-        response = model.generate_content(
+_default_async_client = None
+
+def get_async_client():
+    """
+    Return the shared AsyncGeminiClient used when no client is passed in
+    """
+    global _default_async_client
+    if _default_async_client is None:
+        _default_async_client = AsyncGeminiClient(MODEL_NAME)
+    return _default_async_client
+
+async def parse_with_gemini_async(content_chunks, parse_description, output_format="text", client=None, use_cache=True, allow_local=True):
+    """
+    Async version of parse_with_gemini_structured
+    
+    Requests go through an AsyncGeminiClient, so many calls can run
+    concurrently while staying within the configured rate limits.
+    
+    Args:
+        content_chunks (list): List of content chunks to parse
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+        client (AsyncGeminiClient): Client to use, defaults to a shared one
+        use_cache (bool): Reuse a cached response for identical inputs
+        allow_local (bool): Answer simple requests with local extractors
+            when possible (see try_local_extraction)
+    
+    Returns:
+        str: Parsed result in specified format
+    """
+    client = client or get_async_client()
+    try:
+        if allow_local:
+            local_result = try_local_extraction(content_chunks, parse_description, output_format)
+            if local_result is not None:
+                return local_result
+        
+        combined_content = "\n\n".join(str(chunk) for chunk in content_chunks)
+        prompt = _build_structured_prompt(combined_content, parse_description, output_format)
+        result = await _generate_cached_async(
+            'structured',
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                candidate_count=1,
-                max_output_tokens=8192,
-                temperature=0.2,
-            )
+            (combined_content, parse_description, output_format),
+            client,
+            use_cache=use_cache,
+            route=choose_route(parse_description, output_format, estimate_tokens(combined_content))
         )
         
-        if response.text:
-            return response.text.strip()
+        if result:
+            return result
         else:
             return "No response generated. Please try again with a different request."
             
     except Exception as e:
         return f"Error occurred while parsing: {str(e)}"
 
+async def parse_many_async(jobs, client=None, use_cache=True):
+    """
+    Run many structured parse jobs concurrently
+    
+    Args:
+        jobs (iterable): (content_chunks, parse_description, output_format) tuples
+        client (AsyncGeminiClient): Client to use, defaults to a shared one
+        use_cache (bool): Reuse cached responses for identical inputs
+    
+    Returns:
+        list: Parsed results in job order
+    """
+    client = client or get_async_client()
+    return await asyncio.gather(*(
+        parse_with_gemini_async(chunks, description, output_format, client=client, use_cache=use_cache)
+        for chunks, description, output_format in jobs
+    ))
+
+def run_parse_batch(jobs, client=None, use_cache=True):
+    """
+    Blocking wrapper around parse_many_async for non-async callers
+    """
+    return asyncio.run(parse_many_async(jobs, client=client, use_cache=use_cache))
+
 # Alias for backward compatibility with existing code
 parse_with_ollama = parse_with_gemini
 
@@ -202,7 +1396,7 @@ def test_gemini_connection():
     Test if Gemini API is properly configured
     """
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        model = get_model(MODEL_NAME)
         response = model.generate_content("Say 'Hello, Gemini is working!'")
         return response.text.strip() if response.text else "Connection test failed"
     except Exception as e:
@@ -220,4 +1414,4 @@ if __name__ == "__main__":
     
     print("\nTesting content parsing...")
     parsed = parse_with_gemini(test_content, test_description)
-    print(f"Parsed result: {parsed}")
\ No newline at end of file
+    print(f"Parsed result: {parsed}")
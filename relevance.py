@@ -0,0 +1,165 @@
+import math
+import re
+from collections import Counter
+from chunking import estimate_tokens
+
+# Words that describe the extraction task rather than what to look for
+_STOPWORDS = {
+    'a', 'about', 'all', 'also', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can', 'do',
+    'each', 'every', 'extract', 'find', 'for', 'from', 'get', 'give', 'has', 'have', 'i', 'in',
+    'include', 'including', 'information', 'is', 'it', 'its', 'list', 'me', 'mentioned', 'of', 'on',
+    'or', 'out', 'page', 'please', 'pull', 'return', 'show', 'site', 'that', 'the', 'their', 'them',
+    'these', 'this', 'those', 'to', 'website', 'what', 'which', 'with', 'want', 'you', 'your',
+}
+
+# Request words expanded to terms likely to appear near the data
+_SYNONYMS = {
+    'email': ['email', 'mail', 'contact'],
+    'phone': ['phone', 'tel', 'telephone', 'mobile', 'call', 'contact'],
+    'contact': ['contact', 'email', 'phone', 'address'],
+    'price': ['price', 'cost', 'usd', 'eur', 'sale', 'buy'],
+    'address': ['address', 'street', 'location', 'contact'],
+}
+
+# Patterns whose matches add a synthetic term, so "emails" matches a chunk
+# that contains addresses but never the word "email"
+_PATTERN_TERMS = {
+    'email': re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'),
+    'phone': re.compile(r'\+?\d[\d\s().-]{7,}\d'),
+    'price': re.compile(r'[$€£¥]\s?\d|\d\s?(?:usd|eur|gbp)\b', re.IGNORECASE),
+}
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def _normalize_term(word):
+    # Very light stemming so "emails"/"email" and "prices"/"price" match
+    if len(word) > 3 and word.endswith('es') and word[:-2].endswith(('ss', 'sh', 'ch', 'x')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    """
+    Split text into normalized lowercase terms
+    """
+    return [_normalize_term(word) for word in _WORD.findall(text.lower())]
+
+def _chunk_terms(text):
+    terms = Counter(tokenize(text))
+    for term, pattern in _PATTERN_TERMS.items():
+        matches = len(pattern.findall(text))
+        if matches:
+            terms[term] += matches
+    return terms
+
+def query_terms(parse_description):
+    """
+    Turn an extraction request into the search terms used for scoring
+    """
+    terms = []
+    for word in tokenize(parse_description):
+        if word in _STOPWORDS:
+            continue
+        for term in _SYNONYMS.get(word, [word]):
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+def score_chunks(chunks, parse_description, k1=1.5, b=0.75):
+    """
+    Score each chunk's relevance to the request with BM25
+    
+    Args:
+        chunks (list): Content chunks
+        parse_description (str): Description of what to parse/extract
+    
+    Returns:
+        list: One float score per chunk, in chunk order
+    """
+    terms = query_terms(parse_description)
+    if not chunks or not terms:
+        return [0.0] * len(chunks)
+    
+    chunk_terms = [_chunk_terms(str(chunk)) for chunk in chunks]
+    lengths = [sum(counts.values()) for counts in chunk_terms]
+    average_length = (sum(lengths) / len(lengths)) or 1
+    
+    idf = {}
+    for term in terms:
+        documents_with_term = sum(1 for counts in chunk_terms if term in counts)
+        idf[term] = math.log(1 + (len(chunks) - documents_with_term + 0.5) / (documents_with_term + 0.5))
+    
+    scores = []
+    for counts, length in zip(chunk_terms, lengths):
+        score = 0.0
+        for term in terms:
+            frequency = counts.get(term, 0)
+            if frequency:
+                score += idf[term] * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+def select_relevant_chunks(chunks, parse_description, token_budget=None, top_k=None):
+    """
+    Keep only the chunks most relevant to the request
+    
+    Chunks are ranked by BM25 score and taken best-first until `top_k` chunks
+    or `token_budget` estimated tokens are reached; chunks that match none of
+    the request terms are dropped. If no chunk matches at all (e.g. for
+    "summarize this page"), nothing is filtered. Kept chunks stay in page order.
+    
+    Args:
+        chunks (list): Content chunks
+        parse_description (str): Description of what to parse/extract
+        token_budget (int): Maximum estimated tokens to keep, None for no limit
+        top_k (int): Maximum number of chunks to keep, None for no limit
+    
+    Returns:
+        tuple: (kept chunks, report dict with kept/dropped chunk details and token totals)
+    """
+    chunks = list(chunks)
+    tokens = [estimate_tokens(str(chunk)) for chunk in chunks]
+    scores = score_chunks(chunks, parse_description)
+    
+    report = {
+        'query_terms': query_terms(parse_description),
+        'filtered': False,
+        'tokens_before': sum(tokens),
+        'tokens_after': sum(tokens),
+        'kept': list(range(len(chunks))),
+        'dropped': [],
+    }
+    if not chunks or not any(scores):
+        return chunks, report
+    
+    ranked = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+    kept = []
+    used = 0
+    for index in ranked:
+        if scores[index] <= 0:
+            break
+        if top_k is not None and len(kept) >= top_k:
+            break
+        if token_budget is not None and kept and used + tokens[index] > token_budget:
+            continue
+        kept.append(index)
+        used += tokens[index]
+    
+    kept.sort()
+    kept_set = set(kept)
+    report.update({
+        'filtered': True,
+        'tokens_after': used,
+        'kept': kept,
+        'dropped': [
+            {
+                'index': i,
+                'score': round(scores[i], 3),
+                'tokens': tokens[i],
+                'preview': str(chunks[i])[:80],
+            }
+            for i in range(len(chunks)) if i not in kept_set
+        ],
+    })
+    return [chunks[i] for i in kept], report
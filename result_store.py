@@ -0,0 +1,306 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from cache import make_cache_key
+from scrape import normalize_url
+
+# Record fields kept in their own columns; everything else (result, link,
+# image and heading lists, errors) goes into one compressed blob per row
+COLUMNS = ('url', 'status', 'title', 'text_length', 'chunks', 'elapsed', 'processed_at')
+
+# Page lists batch records carry for the store; left out of JSONL results files
+LIST_FIELDS = ('links', 'images', 'headings')
+
+# Columns written by export_csv; list fields are written as their length
+CSV_COLUMNS = ('url', 'status', 'title', 'parse_description', 'output_format', 'result',
+               'text_length', 'chunks', 'links', 'images', 'elapsed', 'processed_at', 'error')
+
+def _schema_hash(schema):
+    """
+    Return the hash a JSON schema is stored under, '' for no schema
+    """
+    return make_cache_key(schema) if schema else ''
+
+class ResultStore:
+    """
+    Append-only SQLite store for batch results
+    
+    Each row holds one record as written by batch.run_job. Scalar fields are
+    columns, the extraction request, output format and a hash of the JSON
+    schema are stored once per distinct spec, and the bulky fields are
+    zlib-compressed compact JSON. Rows are deduplicated by a hash of the
+    normalized URL, extraction request, output format and schema: a
+    successful result is never overwritten, a failed one is replaced when
+    the URL is retried. Safe to share between threads.
+    
+    Args:
+        path (str): SQLite file to store results in (directories are created)
+        
+        with ResultStore('results.db') as store:
+            store.add(record)
+            store.export_csv('results.csv')
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._spec_ids = {}
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS specs (
+                id INTEGER PRIMARY KEY,
+                parse_description TEXT NOT NULL,
+                output_format TEXT NOT NULL,
+                schema_hash TEXT NOT NULL,
+                UNIQUE (parse_description, output_format, schema_hash)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                spec_id INTEGER NOT NULL REFERENCES specs (id),
+                normalized_url TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL,
+                title TEXT,
+                text_length INTEGER,
+                chunks INTEGER,
+                elapsed REAL,
+                processed_at TEXT,
+                data BLOB NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_spec_status ON results (spec_id, status)")
+    
+    def _spec_id(self, spec, new_spec_ids):
+        # Ids inserted in the open transaction go to new_spec_ids, so a
+        # rolled-back spec row is never remembered
+        spec_id = self._spec_ids.get(spec) or new_spec_ids.get(spec)
+        if spec_id is None:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO specs (parse_description, output_format, schema_hash) VALUES (?, ?, ?)", spec
+            )
+            spec_id = new_spec_ids[spec] = self._conn.execute(
+                "SELECT id FROM specs WHERE parse_description = ? AND output_format = ? AND schema_hash = ?", spec
+            ).fetchone()[0]
+        return spec_id
+    
+    def add(self, record, parse_description=None, output_format=None, schema=None):
+        """
+        Append a result record unless the store already has a successful
+        result for the same URL and request
+        
+        Args:
+            record (dict): Result record with at least url and status
+            parse_description (str): Extraction request, if not in the record
+            output_format (str): Output format, if not in the record
+            schema (dict): JSON schema the result was extracted with, if any
+        
+        Returns:
+            bool: Whether the record was written
+        """
+        return self.add_many([record], parse_description, output_format, schema) == 1
+    
+    def add_many(self, records, parse_description=None, output_format=None, schema=None):
+        """
+        Append several records in one transaction, see add
+        
+        Returns:
+            int: Number of records written
+        """
+        written = 0
+        new_spec_ids = {}
+        schema_hash = _schema_hash(schema)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for record in records:
+                    description = record.get('parse_description', parse_description) or ''
+                    fmt = record.get('output_format', output_format) or ''
+                    normalized_url = normalize_url(record['url'])
+                    key = make_cache_key(normalized_url, description, fmt, schema_hash)
+                    data = {name: value for name, value in record.items()
+                            if name not in COLUMNS and name not in ('parse_description', 'output_format')}
+                    blob = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                    # Replace failed results only; a row with status 'ok' stays
+                    written += self._conn.execute(
+                        "INSERT INTO results (key, spec_id, normalized_url, url, status, title, text_length, chunks, elapsed, processed_at, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET status = excluded.status, url = excluded.url, title = excluded.title, "
+                        "text_length = excluded.text_length, chunks = excluded.chunks, elapsed = excluded.elapsed, "
+                        "processed_at = excluded.processed_at, data = excluded.data "
+                        "WHERE results.status != 'ok'",
+                        (key, self._spec_id((description, fmt, schema_hash), new_spec_ids), normalized_url, record['url'], record['status'],
+                         record.get('title'), record.get('text_length'), record.get('chunks'),
+                         record.get('elapsed'), record.get('processed_at'), blob)
+                    ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._spec_ids.update(new_spec_ids)
+        return written
+    
+    def done_urls(self, parse_description, output_format, retry_failed=False, schema=None):
+        """
+        Return the normalized URLs that need no more work for a request
+        
+        Args:
+            parse_description (str): Extraction request
+            output_format (str): Output format
+            retry_failed (bool): Leave out failed URLs so they are retried
+            schema (dict): JSON schema of the request, if any
+        
+        Returns:
+            set: Normalized URLs
+        """
+        query = ("SELECT normalized_url FROM results JOIN specs ON specs.id = results.spec_id "
+                 "WHERE parse_description = ? AND output_format = ? AND schema_hash = ?")
+        if retry_failed:
+            query += " AND status = 'ok'"
+        with self._lock:
+            return {row[0] for row in self._conn.execute(query, (parse_description, output_format, _schema_hash(schema)))}
+    
+    def iter_records(self, status=None, parse_description=None, include_lists=True):
+        """
+        Yield stored records in insertion order, reading rows in batches
+        
+        Args:
+            status (str): Only records with this status, e.g. "ok"
+            parse_description (str): Only records for this extraction request
+            include_lists (bool): Include the link, image and heading lists
+        
+        Yields:
+            dict: Result record, with the same fields it was added with
+        """
+        query = ("SELECT results.id, url, status, title, text_length, chunks, elapsed, processed_at, "
+                 "parse_description, output_format, data FROM results JOIN specs ON specs.id = results.spec_id")
+        conditions, params = ["results.id > ?"], [0]
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if parse_description is not None:
+            conditions.append("parse_description = ?")
+            params.append(parse_description)
+        query += " WHERE " + " AND ".join(conditions) + " ORDER BY results.id LIMIT 1000"
+        
+        # Page by id so the lock is not held while the caller works
+        while True:
+            with self._lock:
+                rows = self._conn.execute(query, params).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                record = dict(zip(COLUMNS, row[1:8]))
+                record['parse_description'], record['output_format'] = row[8], row[9]
+                record.update(json.loads(zlib.decompress(row[10])))
+                if not include_lists:
+                    for name in LIST_FIELDS:
+                        record.pop(name, None)
+                yield {name: value for name, value in record.items() if value is not None}
+            params[0] = rows[-1][0]
+    
+    def export_jsonl(self, path, **filters):
+        """
+        Write stored records to a JSONL file, one compact JSON object per line
+        
+        Args:
+            path (str): File to write
+            **filters: status, parse_description and include_lists, see iter_records
+        
+        Returns:
+            int: Number of records written
+        """
+        written = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.iter_records(**filters):
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                written += 1
+        return written
+    
+    def export_csv(self, path, columns=CSV_COLUMNS, **filters):
+        """
+        Write stored records to a CSV file
+        
+        List fields (links, images, headings, schema_errors) are written as
+        their length; JSON results are written as their text.
+        
+        Args:
+            path (str): File to write
+            columns (tuple): Record fields to write, in order
+            **filters: status and parse_description, see iter_records
+        
+        Returns:
+            int: Number of records written
+        """
+        written = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for record in self.iter_records(**filters):
+                writer.writerow([
+                    len(record[name]) if isinstance(record.get(name), list) else record.get(name, '')
+                    for name in columns
+                ])
+                written += 1
+        return written
+    
+    def stats(self):
+        """
+        Return record counts by status and the database file size
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM results GROUP BY status").fetchall())
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return {'records': sum(counts.values()), 'by_status': counts, 'bytes': page_count * page_size}
+    
+    def close(self):
+        """
+        Close the underlying database connection
+        """
+        with self._lock:
+            self._conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Export results stored by batch.py")
+    arg_parser.add_argument("store", help="SQLite result store written by batch.py")
+    arg_parser.add_argument("-o", "--output", help="File to export to (.csv for CSV, otherwise JSONL); omit to show counts")
+    arg_parser.add_argument("--status", help="Only export records with this status, e.g. ok")
+    arg_parser.add_argument("-d", "--description", help="Only export records for this extraction request")
+    arg_parser.add_argument("--no-lists", action="store_true", help="Leave out link, image and heading lists (JSONL)")
+    args = arg_parser.parse_args()
+    
+    if not os.path.exists(args.store):
+        arg_parser.error(f"no result store at {args.store}")
+    
+    with ResultStore(args.store) as store:
+        if not args.output:
+            stats = store.stats()
+            by_status = ', '.join(f"{count} {status}" for status, count in sorted(stats['by_status'].items()))
+            print(f"{stats['records']} records ({by_status or 'none'}), {stats['bytes'] / 1e6:.1f} MB")
+        elif args.output.endswith('.csv'):
+            written = store.export_csv(args.output, status=args.status, parse_description=args.description)
+            print(f"Exported {written} records to {args.output}")
+        else:
+            written = store.export_jsonl(
+                args.output, status=args.status, parse_description=args.description, include_lists=not args.no_lists
+            )
+            print(f"Exported {written} records to {args.output}")
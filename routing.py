@@ -0,0 +1,233 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+from extractors import route_request
+from gemini_client import MODEL_NAME
+from metrics import count
+
+# Cheaper, lower-latency model for small, simple requests
+FAST_MODEL_NAME = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite")
+
+# Output token cap of the default route, as used before routing existed
+DEFAULT_MAX_OUTPUT_TOKENS = 8192
+
+# Estimated USD per million prompt and response tokens, for route cost stats.
+# Edit or extend to match your billing.
+MODEL_PRICES = {
+    MODEL_NAME: (0.10, 0.40),
+    FAST_MODEL_NAME: (0.075, 0.30),
+}
+
+DEFAULT_ROUTE = {'name': 'default', 'model': MODEL_NAME, 'max_output_tokens': DEFAULT_MAX_OUTPUT_TOKENS}
+
+# Rules are tried in order and the first match is used. A rule matches when
+# every condition it sets holds: task (one of TASKS, or a list of them),
+# output_formats, min_input_tokens and max_input_tokens. The last rule
+# should have no conditions.
+DEFAULT_POLICY = [
+    # Pattern requests (emails, prices, ...) only reach the model when the
+    # local extractors found nothing, so the answer is short
+    {'name': 'lookup', 'task': 'lookup', 'max_input_tokens': 32000,
+     'model': FAST_MODEL_NAME, 'max_output_tokens': 2048},
+    {'name': 'extract-small-json', 'task': 'extract', 'output_formats': ['json'], 'max_input_tokens': 8000,
+     'model': FAST_MODEL_NAME, 'max_output_tokens': 4096},
+    {'name': 'extract-small', 'task': 'extract', 'max_input_tokens': 8000,
+     'model': FAST_MODEL_NAME, 'max_output_tokens': 2048},
+    {'name': 'summary', 'task': 'summarize',
+     'model': MODEL_NAME, 'max_output_tokens': 2048},
+    DEFAULT_ROUTE,
+]
+
+TASKS = ('lookup', 'extract', 'summarize', 'general')
+
+_SUMMARY_WORDS = re.compile(r'\b(?:summar\w*|overview|tl;?dr|gist|main points|key points|key takeaways|outline)\b')
+_EXTRACT_WORDS = re.compile(r'\b(?:extract|list|find|get|collect|pull|identify|return|names?|titles?|all)\b')
+
+# Set MODEL_ROUTING_POLICY to a JSON file with a list of rules, or to "off"
+# to send every request to the default route
+MODEL_ROUTING_POLICY = os.getenv("MODEL_ROUTING_POLICY", "")
+
+_policy = None
+_policy_configured = False
+
+def set_routing_policy(policy):
+    """
+    Replace the routing policy; None sends every request to DEFAULT_ROUTE
+    """
+    global _policy, _policy_configured
+    _policy = list(policy) if policy is not None else None
+    _policy_configured = True
+
+def get_routing_policy():
+    """
+    Return the routing policy, loading it from MODEL_ROUTING_POLICY on first use
+    """
+    global _policy, _policy_configured
+    if not _policy_configured:
+        if MODEL_ROUTING_POLICY.lower() == 'off':
+            _policy = None
+        elif MODEL_ROUTING_POLICY:
+            with open(MODEL_ROUTING_POLICY, 'r', encoding='utf-8') as f:
+                _policy = json.load(f)
+        else:
+            _policy = list(DEFAULT_POLICY)
+        _policy_configured = True
+    return _policy
+
+def classify_task(parse_description):
+    """
+    Sort an extraction request into one of TASKS
+    
+    "lookup" requests ask only for patterns the local extractors know
+    (see extractors.route_request), "summarize" requests for a summary or
+    overview, "extract" requests for specific items; anything else is
+    "general".
+    """
+    if route_request(parse_description):
+        return 'lookup'
+    text = parse_description.lower()
+    if _SUMMARY_WORDS.search(text):
+        return 'summarize'
+    if _EXTRACT_WORDS.search(text):
+        return 'extract'
+    return 'general'
+
+def _rule_matches(rule, task, output_format, input_tokens):
+    tasks = rule.get('task')
+    if tasks is not None and task not in ([tasks] if isinstance(tasks, str) else tasks):
+        return False
+    if 'output_formats' in rule and output_format not in rule['output_formats']:
+        return False
+    if input_tokens < rule.get('min_input_tokens', 0):
+        return False
+    return 'max_input_tokens' not in rule or input_tokens <= rule['max_input_tokens']
+
+def choose_route(parse_description, output_format="text", input_tokens=0, schema=None):
+    """
+    Pick the model and output token cap for a request
+    
+    Args:
+        parse_description (str): Description of what to parse/extract
+        output_format (str): "text", "json", "markdown", or "list"
+        input_tokens (int): Estimated tokens of content sent with the request
+        schema (dict): JSON schema of the result, if any; such requests are
+            treated as "extract" tasks with JSON output
+    
+    Returns:
+        dict: Route with name, model and max_output_tokens
+    """
+    policy = get_routing_policy()
+    if not policy:
+        return DEFAULT_ROUTE
+    task = 'extract' if schema is not None else classify_task(parse_description)
+    if schema is not None:
+        output_format = 'json'
+    for rule in policy:
+        if _rule_matches(rule, task, output_format, input_tokens):
+            return {
+                'name': rule.get('name', rule.get('model', MODEL_NAME)),
+                'model': rule.get('model', MODEL_NAME),
+                'max_output_tokens': rule.get('max_output_tokens', DEFAULT_MAX_OUTPUT_TOKENS),
+            }
+    return DEFAULT_ROUTE
+
+def routed_models():
+    """
+    Return the names of every model the current policy can route to
+    """
+    return {DEFAULT_ROUTE['model']} | {rule.get('model', MODEL_NAME) for rule in get_routing_policy() or []}
+
+class RouteStats:
+    """
+    Thread-safe per-route call counts, latencies, tokens and estimated cost
+    
+    Args:
+        window (int): Recent latencies kept per route for the p95
+    """
+    
+    def __init__(self, window=1000):
+        self.window = window
+        self._routes = {}
+        self._lock = threading.Lock()
+    
+    def record(self, route, seconds, prompt_tokens, response_tokens):
+        """
+        Record one model call made on `route`
+        """
+        input_price, output_price = MODEL_PRICES.get(route['model'], (0.0, 0.0))
+        cost = (prompt_tokens * input_price + response_tokens * output_price) / 1e6
+        with self._lock:
+            entry = self._routes.get(route['name'])
+            if entry is None:
+                entry = self._routes[route['name']] = {
+                    'model': route['model'], 'calls': 0, 'escalations': 0, 'sum': 0.0, 'max': 0.0,
+                    'latencies': deque(maxlen=self.window), 'prompt_tokens': 0, 'response_tokens': 0, 'cost': 0.0,
+                }
+            entry['calls'] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['latencies'].append(seconds)
+            entry['prompt_tokens'] += prompt_tokens
+            entry['response_tokens'] += response_tokens
+            entry['cost'] += cost
+    
+    def record_escalation(self, route):
+        """
+        Record a call on `route` that hit its output token cap and was retried
+        on the default route
+        """
+        with self._lock:
+            if route['name'] in self._routes:
+                self._routes[route['name']]['escalations'] += 1
+    
+    def reset(self):
+        """
+        Clear all recorded values
+        """
+        with self._lock:
+            self._routes.clear()
+    
+    def snapshot(self):
+        """
+        Return the recorded values as plain data
+        
+        Returns:
+            dict: Route name -> model, calls, escalations, mean_ms, p95_ms,
+                max_ms, prompt_tokens, response_tokens and cost_usd
+        """
+        with self._lock:
+            routes = {name: dict(entry, latencies=sorted(entry['latencies'])) for name, entry in self._routes.items()}
+        
+        snapshot = {}
+        for name, entry in sorted(routes.items()):
+            latencies = entry['latencies']
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+            snapshot[name] = {
+                'model': entry['model'],
+                'calls': entry['calls'],
+                'escalations': entry['escalations'],
+                'mean_ms': round(entry['sum'] * 1000 / entry['calls'], 3),
+                'p95_ms': round(p95 * 1000, 3),
+                'max_ms': round(entry['max'] * 1000, 3),
+                'prompt_tokens': entry['prompt_tokens'],
+                'response_tokens': entry['response_tokens'],
+                'cost_usd': round(entry['cost'], 6),
+            }
+        return snapshot
+
+_route_stats = RouteStats()
+
+def get_route_stats():
+    """
+    Return the process-wide RouteStats every routed call is recorded in
+    """
+    return _route_stats
+
+def record_route_call(route, seconds, prompt_tokens, response_tokens):
+    """
+    Record one model call in the route stats and the route_calls counter
+    """
+    _route_stats.record(route, seconds, prompt_tokens, response_tokens)
+    count('route_calls', route=route['name'])
@@ -1,16 +1,257 @@
 import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from urllib3.util.retry import Retry
+import codecs
+import itertools
 import json
+import re
+import threading
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from dotenv import load_dotenv
 import os
+from cache import DiskCache
+from chunking import CHARS_PER_TOKEN, estimate_tokens, iter_chunks
+from html_extract import extract_content_from_html, iter_html_events
+from cleaning import clean_text, iter_clean_lines, iter_lines, new_text_stats
+from metrics import count, timed
 
 load_dotenv()
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
+# Overridable so batch jobs can be pointed at a local stand-in server
+SERPER_SCRAPE_URL = os.getenv("SERPER_SCRAPE_URL", "https://scrape.serper.dev")
 
-def scrape_website(url):
+# Where page content comes from: "serper" (Serper API) or "local" (direct
+# download, parsed with lxml); can also be chosen per call or per job
+SCRAPE_BACKEND = os.getenv("SCRAPE_BACKEND", "serper")
+SCRAPE_BACKENDS = ('serper', 'local')
+
+# Sent with direct downloads by the local backend
+USER_AGENT = os.getenv(
+    "SCRAPE_USER_AGENT",
+    "Mozilla/5.0 (compatible; AI-Web-Scraper/1.0; +https://github.com/naakaarafr/AI-Web-Scraper)"
+)
+
+# HTTP settings shared by every request made from this module
+SESSION_CONFIG = {
+    'pool_size': 16,          # Connections kept open per host
+    'keep_alive': True,
+    'max_retries': 3,         # Retries on connection errors, 429 and 5xx
+    'backoff_factor': 0.5,    # Sleep 0.5s, 1s, 2s, ... between retries
+    'retry_statuses': (429, 500, 502, 503, 504),
+    'connect_timeout': 5,
+    'read_timeout': 30,
+}
+
+# On-disk cache of Serper responses; set SCRAPE_CACHE_PATH to "" to disable
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", os.path.join(".cache", "scrape_cache.sqlite"))
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", 6 * 3600))
+SCRAPE_CACHE_MAX_MB = float(os.getenv("SCRAPE_CACHE_MAX_MB", 512))
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+# Bytes from the start of a page used to find or guess its encoding
+ENCODING_SNIFF_BYTES = 65536
+
+_session = None
+_session_lock = threading.Lock()
+_scrape_cache = None
+_scrape_cache_configured = False
+
+def _build_session(config):
+    """
+    Create a requests session with connection pooling and retry handling
+    """
+    retry = Retry(
+        total=config['max_retries'],
+        backoff_factor=config['backoff_factor'],
+        status_forcelist=config['retry_statuses'],
+        allowed_methods=frozenset(['GET', 'HEAD', 'POST']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config['pool_size'],
+        pool_maxsize=config['pool_size'],
+        max_retries=retry
+    )
+    
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not config['keep_alive']:
+        session.headers['Connection'] = 'close'
+    return session
+
+def get_session():
+    """
+    Return the shared HTTP session, creating it on first use
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(SESSION_CONFIG)
+    return _session
+
+def configure_session(**options):
+    """
+    Update HTTP session settings and rebuild the shared session
+    
+    Args:
+        **options: Any of the keys in SESSION_CONFIG, e.g. pool_size=32,
+            max_retries=5, connect_timeout=3, read_timeout=60
+    """
+    global _session
+    unknown = set(options) - set(SESSION_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown session options: {', '.join(sorted(unknown))}")
+    
+    with _session_lock:
+        SESSION_CONFIG.update(options)
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+def _request_timeout():
+    """
+    Return the (connect, read) timeout tuple for requests
+    """
+    return (SESSION_CONFIG['connect_timeout'], SESSION_CONFIG['read_timeout'])
+
+def normalize_url(url):
+    """
+    Normalize a URL so equivalent spellings map to the same string
+    
+    Lowercases scheme and host, drops default ports and fragments, and sorts
+    query parameters. A missing scheme defaults to http.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'http://' + url
+    
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        return url
+    
+    netloc = host
+    if port is not None and _DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{host}:{port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else '')
+        netloc = f"{userinfo}@{netloc}"
+    
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+def configure_scrape_cache(path=SCRAPE_CACHE_PATH, ttl=SCRAPE_CACHE_TTL, max_bytes=None):
+    """
+    Set up (or disable) the on-disk cache used by scrape_website
+    
+    Args:
+        path (str): SQLite file for the cache, None or "" to disable caching
+        ttl (float): Seconds a cached response is considered fresh
+        max_bytes (int): Size bound before least recently used entries are evicted
+    
+    Returns:
+        DiskCache or None: The active cache
+    """
+    global _scrape_cache, _scrape_cache_configured
+    if max_bytes is None:
+        max_bytes = int(SCRAPE_CACHE_MAX_MB * 1024 * 1024)
+    
+    with _session_lock:
+        old_cache = _scrape_cache
+        _scrape_cache = DiskCache(path, ttl=ttl, max_bytes=max_bytes) if path else None
+        _scrape_cache_configured = True
+    if old_cache is not None:
+        old_cache.close()
+    return _scrape_cache
+
+def get_scrape_cache():
+    """
+    Return the active scrape cache, creating it from the environment on first use
+    Call .stats() on it for hit/miss statistics
+    """
+    if not _scrape_cache_configured:
+        configure_scrape_cache()
+    return _scrape_cache
+
+def _scrape_cache_key(url, backend='serper'):
+    return backend + ':' + hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+def _cache_get(cache, cache_key):
+    """
+    Read a fresh scrape cache entry, counting the hit or miss
+    """
+    cached = cache.get(cache_key)
+    count('cache_hits' if cached is not None else 'cache_misses', cache='scrape')
+    return cached
+
+def _record_retries(response):
+    # urllib3 keeps the retries it made for this response on the raw response
+    retries = getattr(response.raw, 'retries', None)
+    if retries is not None and retries.history:
+        count('retries', len(retries.history), client='http')
+
+def _html_encoding(response, head):
+    """
+    Return the character encoding of an HTML response: the charset of the
+    Content-Type header, else the one declared in a <meta> tag, else one
+    detected from `head`, the first bytes of the body
+    
+    Both the downloading and the streaming path use this, so they decode a
+    page the same way. Returns None if no usable encoding is found.
+    """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        candidates = [response.encoding]
+    else:
+        head = head[:ENCODING_SNIFF_BYTES]
+        declared = _META_CHARSET.search(head)
+        candidates = [declared.group(1).decode('ascii') if declared else None, chardet.detect(head)['encoding']]
+    for encoding in candidates:
+        if not encoding:
+            continue
+        try:
+            encoding = codecs.lookup(encoding).name
+        except LookupError:
+            continue
+        # A head of plain ASCII says nothing about the bytes after it
+        return 'utf-8' if encoding == 'ascii' else encoding
+    return None
+
+def _count_bytes(pieces):
+    for piece in pieces:
+        count('bytes_fetched', len(piece))
+        yield piece
+
+def scrape_website(url, use_cache=True):
     """
     Scrape website content using Serper API
     Returns JSON response with extracted content
+    
+    Fresh responses are served from the on-disk scrape cache when available.
+    If the request fails, an expired cached response is returned instead.
     """
+    cache = get_scrape_cache() if use_cache else None
+    cache_key = _scrape_cache_key(url) if cache else None
+    
+    if cache:
+        cached = _cache_get(cache, cache_key)
+        if cached is not None:
+            print(f"Using cached content for: {url}")
+            return cached
+    
     print(f"Scraping website: {url}")
     
     headers = {
@@ -23,23 +264,105 @@ def scrape_website(url):
     }
     
     try:
-        response = requests.post(
-            'https://scrape.serper.dev',
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        with timed('fetch'):
+            response = get_session().post(
+                SERPER_SCRAPE_URL,
+                headers=headers,
+                json=payload,
+                timeout=_request_timeout()
+            )
+        count('bytes_fetched', len(response.content))
+        _record_retries(response)
         
         if response.status_code == 200:
             print("Successfully scraped content!")
-            return response.json()
+            with timed('extract'):
+                data = response.json()
+            if cache:
+                cache.set(cache_key, data)
+            return data
         else:
             print(f"Error: {response.status_code} - {response.text}")
-            return None
             
     except requests.exceptions.RequestException as e:
         print(f"Request failed: {e}")
-        return None
+    
+    if cache:
+        stale = cache.get(cache_key, allow_expired=True)
+        if stale is not None:
+            print("Falling back to expired cached content")
+            return stale
+    return None
+
+def fetch_and_extract_html(url, use_cache=True):
+    """
+    Download a page directly and extract its content locally
+    Returns structured data in the same shape as extract_content_from_json
+    
+    Results share the on-disk scrape cache with scrape_website. Once an entry
+    expires, the page is revalidated with If-None-Match / If-Modified-Since,
+    so an unchanged page costs a 304 response instead of a full download.
+    """
+    cache = get_scrape_cache() if use_cache else None
+    cache_key = _scrape_cache_key(url, 'local') if cache else None
+    
+    stale = None
+    if cache:
+        cached = _cache_get(cache, cache_key)
+        if cached is not None:
+            print(f"Using cached content for: {url}")
+            return cached['data']
+        stale = cache.get(cache_key, allow_expired=True)
+    
+    print(f"Fetching website: {url}")
+    
+    headers = {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8'
+    }
+    if stale:
+        if stale.get('etag'):
+            headers['If-None-Match'] = stale['etag']
+        if stale.get('last_modified'):
+            headers['If-Modified-Since'] = stale['last_modified']
+    
+    try:
+        with timed('fetch'):
+            response = get_session().get(url, headers=headers, timeout=_request_timeout())
+        count('bytes_fetched', len(response.content))
+        _record_retries(response)
+        
+        if response.status_code == 304 and stale:
+            print("Page not modified, reusing cached content")
+            cache.set(cache_key, stale)
+            return stale['data']
+        
+        if response.status_code == 200:
+            content_type = response.headers.get('Content-Type', '')
+            with timed('extract'):
+                if 'html' in content_type or 'xml' in content_type or not content_type:
+                    data = extract_content_from_html(response.content, response.url, _html_encoding(response, response.content))
+                else:
+                    data = extract_content_from_json({'text': response.text, 'url': response.url})
+            
+            print("Successfully fetched content!")
+            if cache and data:
+                cache.set(cache_key, {
+                    'data': data,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                })
+            return data
+        else:
+            print(f"Error: {response.status_code} - {response.reason}")
+            
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
+    
+    if stale:
+        print("Falling back to expired cached content")
+        return stale['data']
+    return None
 
 def extract_content_from_json(json_response):
     """
@@ -65,44 +388,255 @@ def extract_content_from_json(json_response):
     
     return extracted_data
 
-def clean_text_content(text_content):
+def clean_text_content(text_content, remove_boilerplate=True):
     """
     Clean and format text content
+    
+    Strips every line, normalizes unicode whitespace and drops empty and
+    boilerplate lines ("Skip to content", cookie banners, ...). Use
+    cleaning.clean_text to also get character, word and line counts.
     """
     if not text_content:
         return ""
     
-    # Remove extra whitespace and empty lines
-    cleaned_lines = [line.strip() for line in text_content.split('\n') if line.strip()]
-    return '\n'.join(cleaned_lines)
+    return clean_text(text_content, remove_boilerplate)[0]
 
-def split_content(content, max_length=6000):
+def split_content(content, max_length=6000, max_tokens=None, overlap_tokens=0, headings=None):
     """
     Split content into chunks if needed
+    
+    Text is split at line, heading and sentence boundaries rather than at fixed
+    offsets, so words and sentences are never cut in half.
+    
+    Args:
+        content (str or dict): Text, or structured data from extract_content_from_json
+        max_length (int): Approximate maximum chunk size in characters
+        max_tokens (int): Maximum chunk size in estimated tokens, overrides max_length
+        overlap_tokens (int): Tokens of context repeated between consecutive chunks
+        headings (list): Heading texts to prefer as chunk starts
+    
+    Returns:
+        list: Content chunks
     """
-    if isinstance(content, str):
-        return [content[i:i + max_length] for i in range(0, len(content), max_length)]
-    elif isinstance(content, dict):
-        # For JSON content, convert to string first if splitting is needed
-        content_str = json.dumps(content, indent=2)
-        if len(content_str) > max_length:
-            return [content_str[i:i + max_length] for i in range(0, len(content_str), max_length)]
+    with timed('chunk'):
+        if max_tokens is None:
+            max_tokens = max(1, max_length // CHARS_PER_TOKEN)
+        
+        if isinstance(content, str):
+            return list(iter_chunks(content, max_tokens, overlap_tokens, headings))
+        elif isinstance(content, dict):
+            content_str = json.dumps(content, separators=(',', ':'), ensure_ascii=False)
+            if estimate_tokens(content_str) <= max_tokens:
+                return [content]
+            
+            if headings is None:
+                headings = content.get('headings')
+            
+            def field_lines():
+                # One compact line per field; page text is passed through as-is
+                for key, value in content.items():
+                    if key != 'text':
+                        yield f"{key}: {json.dumps(value, separators=(',', ':'), ensure_ascii=False)}\n"
+                if content.get('text'):
+                    yield "text:\n"
+                    yield str(content['text'])
+            
+            return list(iter_chunks(field_lines(), max_tokens, overlap_tokens, headings))
         return [content]
-    return [content]
 
-def scrape_and_process(url, return_format='json'):
+def _iter_page_events(data):
+    # Replay already extracted page data as stream_page events
+    if data.get('title'):
+        yield 'title', data['title']
+    for name, value in (data.get('meta') or {}).items():
+        if value:
+            yield 'meta', (name, value)
+    for heading in data.get('headings') or []:
+        yield 'heading', heading
+    for link in data.get('links') or []:
+        yield 'link', link
+    for image in data.get('images') or []:
+        yield 'image', image
+    for line in iter_lines(data.get('text') or ''):
+        line = line.strip()
+        if line:
+            yield 'text', line
+
+def stream_page(url, backend=None, use_cache=True, chunk_size=65536):
+    """
+    Scrape a page and yield its content as it is extracted
+    
+    With the local backend the download is parsed while it arrives, so text
+    comes out before the page has finished downloading and the full page is
+    never held in memory. A Serper response is a single JSON document, so it
+    is decoded once and its text is then yielded line by line without further
+    copies. Cached pages are replayed from the cache; pages streamed from the
+    network are not written to it.
+    
+    Args:
+        url (str): Website URL to scrape
+        backend (str): 'serper' or 'local', defaults to SCRAPE_BACKEND
+        use_cache (bool): Serve fresh cached pages from the scrape cache
+        chunk_size (int): Bytes read from the network at a time
+    
+    Yields:
+        tuple: (kind, value) events, see html_extract.iter_html_events
+    """
+    backend = backend or SCRAPE_BACKEND
+    if backend not in SCRAPE_BACKENDS:
+        raise ValueError(f"Unknown scrape backend: {backend}")
+    
+    if backend != 'local':
+        data = extract_content_from_json(scrape_website(url, use_cache))
+        if data:
+            yield from _iter_page_events(data)
+        return
+    
+    cache = get_scrape_cache() if use_cache else None
+    cache_key = _scrape_cache_key(url, 'local') if cache else None
+    if cache:
+        cached = _cache_get(cache, cache_key)
+        if cached is not None:
+            print(f"Using cached content for: {url}")
+            yield from _iter_page_events(cached['data'])
+            return
+    
+    print(f"Streaming website: {url}")
+    
+    headers = {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8'
+    }
+    
+    try:
+        # Only the time to the response headers; the body is read while parsing
+        with timed('fetch'):
+            response = get_session().get(url, headers=headers, timeout=_request_timeout(), stream=True)
+        _record_retries(response)
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
+        response = None
+    
+    if response is None or response.status_code != 200:
+        if response is not None:
+            print(f"Error: {response.status_code} - {response.reason}")
+            response.close()
+        stale = cache.get(cache_key, allow_expired=True) if cache else None
+        if stale:
+            print("Falling back to expired cached content")
+            yield from _iter_page_events(stale['data'])
+        return
+    
+    with response:
+        try:
+            content_type = response.headers.get('Content-Type', '')
+            if 'html' in content_type or 'xml' in content_type or not content_type:
+                pieces = _count_bytes(response.iter_content(chunk_size))
+                head = next(pieces, b'')
+                encoding = _html_encoding(response, head)
+                yield from iter_html_events(itertools.chain([head], pieces), response.url, encoding)
+            else:
+                for line in response.iter_lines(chunk_size):
+                    count('bytes_fetched', len(line) + 1)
+                    line = line.decode(response.encoding or 'utf-8', errors='replace')
+                    line = line.strip()
+                    if line:
+                        yield 'text', line
+        except requests.exceptions.RequestException as e:
+            # Whatever arrived before the failure has already been yielded
+            print(f"Download interrupted: {e}")
+
+def stream_chunks(url, max_length=6000, max_tokens=None, overlap_tokens=0, backend=None, page=None, use_cache=True):
+    """
+    Scrape a page and yield content chunks as soon as each one is complete
+    
+    The streaming counterpart of scrape_and_process followed by split_content.
+    Page details other than the text are collected into `page` while the
+    chunks are produced, so they are complete once the generator is exhausted.
+    
+    Args:
+        url (str): Website URL to scrape
+        max_length (int): Approximate maximum chunk size in characters
+        max_tokens (int): Maximum chunk size in estimated tokens, overrides max_length
+        overlap_tokens (int): Tokens of context repeated between consecutive chunks
+        backend (str): 'serper' or 'local', defaults to SCRAPE_BACKEND
+        page (dict): Filled with title, links, images, meta, headings, url and
+            text_stats (see cleaning.clean_text)
+        use_cache (bool): Serve fresh cached pages from the scrape cache
+    
+    Yields:
+        str: Content chunks
+    """
+    if max_tokens is None:
+        max_tokens = max(1, max_length // CHARS_PER_TOKEN)
+    if page is None:
+        page = {}
+    page.update({
+        'title': '',
+        'links': [],
+        'images': [],
+        'meta': {'description': '', 'keywords': '', 'author': ''},
+        'headings': [],
+        'url': url,
+        'text_stats': new_text_stats()
+    })
+    meta_fields = {
+        'description': 'description', 'og:description': 'description',
+        'keywords': 'keywords', 'author': 'author', 'article:author': 'author'
+    }
+    
+    def page_lines():
+        for kind, value in stream_page(url, backend, use_cache):
+            if kind == 'text':
+                yield value + '\n'
+            elif kind == 'heading':
+                page['headings'].append(value)
+            elif kind == 'link':
+                page['links'].append(value)
+            elif kind == 'image':
+                page['images'].append(value)
+            elif kind == 'title':
+                page['title'] = page['title'] or value
+            elif kind == 'meta':
+                field = meta_fields.get(value[0])
+                if field and not page['meta'][field]:
+                    page['meta'][field] = value[1]
+    
+    # Cleaned exactly as clean_text_content would clean the whole text
+    text_pieces = (line + '\n' for line in iter_clean_lines(page_lines(), stats=page['text_stats']))
+    yield from iter_chunks(text_pieces, max_tokens, overlap_tokens, page['headings'])
+
+def scrape_and_process(url, return_format='json', backend=None):
     """
     Main function to scrape and process website content
     
     Args:
         url (str): Website URL to scrape
-        return_format (str): 'json' for structured data, 'text' for clean text only
+        return_format (str): 'json' for structured data, 'text' for clean text
+            only, 'chunks' for structured data whose text was cleaned and
+            chunked while downloading (see stream_chunks)
+        backend (str): 'serper' or 'local', defaults to SCRAPE_BACKEND
     
     Returns:
         dict or str: Processed content based on return_format
     """
+    backend = backend or SCRAPE_BACKEND
+    if backend not in SCRAPE_BACKENDS:
+        raise ValueError(f"Unknown scrape backend: {backend}")
+    
+    if return_format == 'chunks':
+        page = {}
+        chunks = list(stream_chunks(url, backend=backend, page=page))
+        if not chunks:
+            return None
+        page['chunks'] = chunks
+        return page
+    
     # Scrape the website
-    raw_data = scrape_website(url)
+    if backend == 'local':
+        raw_data = fetch_and_extract_html(url)
+    else:
+        raw_data = scrape_website(url)
     
     if not raw_data:
         return None
@@ -119,3 +653,132 @@ def scrape_and_process(url, return_format='json'):
         # Return raw response
         return raw_data
 
+
+
+def _url_host(url):
+    """
+    Return the lowercased host of a URL, used for per-host concurrency limits
+    """
+    return (urlsplit(url).hostname or '').lower()
+
+def scrape_many(urls, return_format='json', max_workers=8, per_host_limit=2, backend=None):
+    """
+    Scrape and process many URLs concurrently
+    
+    URLs are read lazily from the iterable, so very large URL lists are never
+    fully queued in memory. At most `max_workers` requests run at once and at
+    most `per_host_limit` of those target the same host; URLs for a busy host
+    are parked until one of its requests finishes.
+    
+    Args:
+        urls (iterable): Website URLs to scrape
+        return_format (str): Passed through to scrape_and_process
+        max_workers (int): Maximum number of concurrent requests
+        per_host_limit (int): Maximum concurrent requests per target host
+        backend (str): 'serper' or 'local', defaults to SCRAPE_BACKEND
+    
+    Yields:
+        tuple: (url, processed content or None) in completion order
+    """
+    max_workers = max(1, int(max_workers))
+    per_host_limit = max(1, int(per_host_limit))
+    max_parked = max_workers * 16
+    
+    url_iter = iter(urls)
+    exhausted = False
+    futures = {}
+    in_flight = {}
+    parked = {}
+    parked_count = 0
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(url, host):
+            future = executor.submit(scrape_and_process, url, return_format, backend)
+            futures[future] = (url, host)
+            in_flight[host] = in_flight.get(host, 0) + 1
+        
+        def fill():
+            nonlocal exhausted, parked_count
+            # Parked URLs go first so a busy host is not starved by new arrivals
+            for host in list(parked):
+                queue = parked[host]
+                while queue and in_flight.get(host, 0) < per_host_limit and len(futures) < max_workers:
+                    submit(queue.popleft(), host)
+                    parked_count -= 1
+                if not queue:
+                    del parked[host]
+            
+            while not exhausted and len(futures) < max_workers and parked_count < max_parked:
+                try:
+                    url = next(url_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                
+                url = url.strip() if isinstance(url, str) else url
+                if not url:
+                    continue
+                
+                host = _url_host(url)
+                if in_flight.get(host, 0) < per_host_limit:
+                    submit(url, host)
+                else:
+                    parked.setdefault(host, deque()).append(url)
+                    parked_count += 1
+        
+        fill()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, host = futures.pop(future)
+                in_flight[host] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to process {url}: {e}")
+                    result = None
+                yield url, result
+            fill()
+
+def read_url_list(path):
+    """
+    Lazily read URLs from a text file, one per line
+    Blank lines and lines starting with '#' are skipped
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+if __name__ == "__main__":
+    import argparse
+    
+    arg_parser = argparse.ArgumentParser(description="Scrape many URLs concurrently via the Serper API")
+    arg_parser.add_argument("url_file", help="Text file with one URL per line")
+    arg_parser.add_argument("-o", "--output", default="scraped.jsonl", help="JSONL file to write results to")
+    arg_parser.add_argument("-f", "--format", default="json", choices=["json", "text", "raw"], help="Result format per URL")
+    arg_parser.add_argument("-w", "--workers", type=int, default=8, help="Maximum concurrent requests")
+    arg_parser.add_argument("--per-host", type=int, default=2, help="Maximum concurrent requests per host")
+    arg_parser.add_argument("-b", "--backend", choices=SCRAPE_BACKENDS, default=SCRAPE_BACKEND, help="Serper API or direct download")
+    args = arg_parser.parse_args()
+    
+    # One pooled connection per worker so connections are reused, not discarded
+    configure_session(pool_size=max(args.workers, SESSION_CONFIG['pool_size']))
+    
+    succeeded = failed = 0
+    with open(args.output, 'w', encoding='utf-8') as out:
+        for url, result in scrape_many(
+            read_url_list(args.url_file),
+            return_format=args.format,
+            max_workers=args.workers,
+            per_host_limit=args.per_host,
+            backend=args.backend
+        ):
+            if result is None:
+                failed += 1
+            else:
+                succeeded += 1
+            out.write(json.dumps({'url': url, 'result': result}, ensure_ascii=False) + '\n')
+    
+    print(f"Done: {succeeded} succeeded, {failed} failed. Results written to {args.output}")
@@ -0,0 +1,32 @@
+"""
+Checks that text cleaned and chunked in one piece and in streamed pieces
+comes out the same
+    
+    python -m pytest tests
+"""
+import pytest
+from chunking import iter_chunks
+from cleaning import clean_text, iter_lines
+
+TEXTS = [
+    'Alpha\rBeta\nGamma',
+    'Form\x0cfeed\x85next line\nend',
+    'Windows\r\nline endings\r\n\r\nand a blank line\n',
+    '  Skip to content\n\n  Hello   world \t\n Café​ 12 €\n',
+]
+
+def pieces(text, size=3):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_string_and_stream_clean_alike(text):
+    assert clean_text(text) == clean_text(pieces(text))
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_lines_split_on_newline_only(text):
+    assert list(iter_lines(text)) == list(iter_lines(pieces(text)))
+    assert list(iter_lines(text)) == text.rstrip('\n').split('\n')
+
+def test_string_and_stream_chunk_alike():
+    text = '\n'.join(f'Line {i} \r of the page' for i in range(500))
+    assert list(iter_chunks(text, max_tokens=200)) == list(iter_chunks(pieces(text, 7), max_tokens=200))
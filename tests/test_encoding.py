@@ -0,0 +1,52 @@
+"""
+Offline checks that the downloading and the streaming scrape path decode
+non-ASCII pages the same way
+    
+    python -m pytest tests
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import scrape
+
+PAGE = "<html><head><title>Café</title></head><body><h1>Menü</h1><p>Price: 12 €</p></body></html>"
+
+# Path -> (Content-Type, body)
+PAGES = {
+    '/header': ("text/html; charset=utf-8", PAGE.encode('utf-8')),
+    '/no-charset': ("text/html", PAGE.encode('utf-8')),
+    '/meta': ("text/html", PAGE.replace("<head>", '<head><meta charset="windows-1252">').encode('cp1252')),
+}
+
+@pytest.fixture(scope='module')
+def server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            content_type, body = PAGES[self.path]
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.mark.parametrize('path', sorted(PAGES))
+def test_download_and_stream_decode_alike(server, path):
+    data = scrape.fetch_and_extract_html(server + path, use_cache=False)
+    assert data['title'] == "Café"
+    assert data['headings'] == ["Menü"]
+    assert "Price: 12 €" in data['text']
+    
+    page = {}
+    chunks = list(scrape.stream_chunks(server + path, backend='local', page=page, use_cache=False))
+    assert page['title'] == data['title']
+    assert page['headings'] == data['headings']
+    assert "".join(chunks).split() == scrape.clean_text_content(data['text']).split()
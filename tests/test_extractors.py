@@ -0,0 +1,36 @@
+"""
+Checks of the local pattern extractors on text that is easy to mistake for
+phone numbers
+    
+    python -m pytest tests
+"""
+from extractors import extract_dates, extract_phone_numbers, route_request, run_extractors
+
+CONTACT_PAGE = """Contact us
+Opening hours: Mon-Fri 09.00-17.00
+Last updated 12.05.2024
+Order no. 2023 4455 991
+Offices opened in 1999 2004 2015
+Phone: +49 30 1234 5678 or (030) 1234 5678
+Hotline 0800 123 456, US office 555-123-4567
+"""
+
+def test_phone_numbers_leave_out_lookalikes():
+    numbers = extract_phone_numbers(CONTACT_PAGE)
+    assert numbers == ['+49 30 1234 5678', '(030) 1234 5678', '0800 123 456', '555-123-4567']
+
+def test_opening_hours_are_not_phone_numbers():
+    assert extract_phone_numbers("Open 09.00-17.00 and 08:30 - 12:00") == []
+
+def test_dotted_dates_are_dates_not_phone_numbers():
+    assert extract_phone_numbers("Valid from 01.05.2024 to 12.05.2024") == []
+    assert extract_dates("Valid from 01.05.2024 to 12.05.2024") == ['01.05.2024', '12.05.2024']
+
+def test_order_numbers_and_years_are_not_phone_numbers():
+    assert extract_phone_numbers("Order 2023 4455 991, invoice 4711 0815 22") == []
+    assert extract_phone_numbers("Awards in 1999 2004 2015 2020") == []
+
+def test_contact_request_uses_the_filtered_phone_numbers():
+    names = route_request("Get contact information")
+    assert names == ['emails', 'phone_numbers']
+    assert '2023 4455 991' not in run_extractors(CONTACT_PAGE, names)['phone_numbers']
@@ -0,0 +1,17 @@
+"""
+Checks of the local JSON repair step
+    
+    python -m pytest tests
+"""
+from json_output import repair_json, strip_code_fence
+
+def test_trailing_commas_are_removed():
+    assert repair_json('{"items": [1, 2, ], "done": true, }') == {'items': [1, 2], 'done': True}
+
+def test_commas_inside_strings_are_kept():
+    assert repair_json('{"a": "x, ]", "b": "y,}", "c": [1, ], }') == {'a': 'x, ]', 'b': 'y,}', 'c': [1]}
+    assert repair_json('{"q": "say \\"hi\\", }", }') == {'q': 'say "hi", }'}
+
+def test_code_fence_is_stripped():
+    assert strip_code_fence('```json\n{"a": 1}\n```') == '{"a": 1}'
+    assert repair_json('```json\n["a",\n]\n```') == ['a']
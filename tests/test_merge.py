@@ -0,0 +1,17 @@
+"""
+Checks of how map-reduce partial results are merged
+    
+    python -m pytest tests
+"""
+from parser import merge_partial_results
+
+def test_markdown_sections_merge_by_heading():
+    merged = merge_partial_results(["## Prices\n- A: $1", "## Prices\n- B: $2\n\n## Notes\nNone"], "markdown")
+    assert merged == "## Prices\n\n- A: $1\n- B: $2\n\n## Notes\n\nNone"
+
+def test_hash_prefixed_content_is_not_a_heading():
+    merged = merge_partial_results([
+        "## Sellers\n#1 seller: Acme\n#hashtag deals",
+        "## Sellers\n#1 seller: Acme",
+    ], "markdown")
+    assert merged == "## Sellers\n\n#1 seller: Acme\n#hashtag deals"
@@ -0,0 +1,53 @@
+"""
+Offline checks that the async and example-guided parse paths are routed
+like the others
+    
+    python -m pytest tests
+"""
+import pytest
+import parser
+from cache import MemoryCache
+from gemini_client import AsyncGeminiClient, FakeModel, register_model
+from routing import DEFAULT_ROUTE, FAST_MODEL_NAME, choose_route, get_route_stats
+
+PAGE = ["Product catalogue page " * 100]
+REQUEST = "Find product names with prices"
+
+def install(words):
+    # One fake per model, so each test sees which model answered
+    models = {}
+    for model_name in {DEFAULT_ROUTE['model'], FAST_MODEL_NAME}:
+        models[model_name] = FakeModel(responder=lambda prompt: ' '.join(f"item{i}" for i in range(words)))
+        register_model(model_name, models[model_name])
+    return models
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    parser.set_result_cache(MemoryCache())
+    get_route_stats().reset()
+    yield
+    parser.set_result_cache(None)
+
+def test_async_parse_uses_the_routed_model():
+    route = choose_route(REQUEST, "text", 600)
+    assert route['model'] == FAST_MODEL_NAME
+    models = install(10)
+    client = AsyncGeminiClient(DEFAULT_ROUTE['model'], model=models[DEFAULT_ROUTE['model']])
+    results = parser.run_parse_batch([(PAGE, REQUEST, "text")], client=client)
+    assert results == [' '.join(f"item{i}" for i in range(10))]
+    assert (models[FAST_MODEL_NAME].calls, models[DEFAULT_ROUTE['model']].calls) == (1, 0)
+    assert get_route_stats().snapshot()[route['name']]['calls'] == 1
+
+def test_async_parse_escalates_when_the_routed_cap_is_hit():
+    # About 3,500 tokens: over the 2,048 cap of the route this request gets
+    models = install(2000)
+    client = AsyncGeminiClient(DEFAULT_ROUTE['model'], model=models[DEFAULT_ROUTE['model']])
+    result, = parser.run_parse_batch([(PAGE, REQUEST, "text")], client=client)
+    assert result.endswith("item1999")
+    assert (models[FAST_MODEL_NAME].calls, models[DEFAULT_ROUTE['model']].calls) == (1, 1)
+    assert get_route_stats().snapshot()[choose_route(REQUEST, "text", 600)['name']]['escalations'] == 1
+
+def test_example_parse_uses_the_routed_model():
+    models = install(10)
+    parser.parse_with_gemini_examples(PAGE, REQUEST, examples=["item: price"])
+    assert (models[FAST_MODEL_NAME].calls, models[DEFAULT_ROUTE['model']].calls) == (1, 0)
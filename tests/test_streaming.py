@@ -0,0 +1,41 @@
+"""
+Offline checks of the output token cap on the streamed parse path
+    
+    python -m pytest tests
+"""
+import pytest
+import parser
+from cache import MemoryCache
+from gemini_client import FakeModel, register_model
+from routing import DEFAULT_ROUTE, choose_route, routed_models
+
+PAGE = ["Product catalogue page " * 100]
+REQUEST = "Find product names with prices"
+
+def install(words):
+    model = FakeModel(responder=lambda prompt: ' '.join(f"item{i}" for i in range(words)))
+    for model_name in routed_models():
+        register_model(model_name, model)
+    return model
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    parser.set_result_cache(MemoryCache())
+    yield
+    parser.set_result_cache(None)
+
+def test_stream_is_not_cut_at_a_lower_routed_cap():
+    # About 3,500 tokens: over the 2,048 cap of the route this request gets
+    assert choose_route(REQUEST, "text", 600)['max_output_tokens'] < 3500
+    install(2000)
+    result = "".join(parser.stream_with_gemini_structured(PAGE, REQUEST, "text", allow_local=False))
+    assert result.endswith("item1999")
+
+def test_stream_cut_at_default_cap_is_not_cached():
+    model = install(DEFAULT_ROUTE['max_output_tokens'])
+    result = "".join(parser.stream_with_gemini_structured(PAGE, REQUEST, "text", allow_local=False))
+    assert len(result) <= DEFAULT_ROUTE['max_output_tokens'] * 4
+    assert not result.endswith(f"item{DEFAULT_ROUTE['max_output_tokens'] - 1}")
+    
+    "".join(parser.stream_with_gemini_structured(PAGE, REQUEST, "text", allow_local=False))
+    assert model.calls == 2